@@ -1,17 +1,172 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import database
+import ml_engine
+import models
 import schemas
-from services.event_ingestor import ingest_transaction_event
+from auth.dependencies import require_role
+from services.event_ingestor import (
+    ingest_transaction_event,
+    ingest_transaction_events_batch,
+    receive_transaction_event,
+    lookup_processed_event,
+)
+from services.ingestion_queue import ingestion_queue
+from services.idempotency_index import idempotency_index
+from services.retry_scheduler import retry_scheduler
+from services.stream_ingestor import stream_ingest_ndjson
 
 router = APIRouter(prefix="/ingest", tags=["Ingestion"])
 
+MAX_BATCH_SIZE = int(os.getenv("INGEST_MAX_BATCH_SIZE", "5000"))
+READINESS_RETRY_AFTER_SECONDS = "5"
 
 
+def require_models_ready():
+    """
+    Rejects ingestion with 503 while the scoring models load, and when they
+    failed to load and the rule-based fallback is off (ML_ALLOW_RULE_FALLBACK=0)
+    """
+    engine = ml_engine.ml_engine
+    if engine.ready:
+        return
+    if engine.status == ml_engine.LOADING:
+        detail = "Scoring models are still loading, retry later"
+    else:
+        detail = f"Scoring models are unavailable: {engine.load_error}"
+    raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": READINESS_RETRY_AFTER_SECONDS})
 
-@router.post("/transaction", response_model=schemas.IngestTransactionResponse)
+
+@router.post("/transaction", response_model=schemas.IngestTransactionResponse, dependencies=[Depends(require_models_ready)])
 def ingest_transaction(event: schemas.TransactionEvent, db: Session = Depends(database.get_db)):
     try:
         return ingest_transaction_event(db, event)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
+
+
+def _queue_full_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Ingestion queue is full, retry later",
+        headers={"Retry-After": str(ingestion_queue.retry_after_seconds)},
+    )
+
+
+@router.post("/transaction/async", response_model=schemas.IngestTransactionResponse, status_code=202, dependencies=[Depends(require_models_ready)])
+def ingest_transaction_async(event: schemas.TransactionEvent, db: Session = Depends(database.get_db)):
+    """
+    Record the event as RECEIVED and acknowledge it; a worker pool runs the pipeline
+    """
+    cached = lookup_processed_event(event.event_id)
+    if cached:
+        return cached
+    if not ingestion_queue.has_capacity(event.priority):
+        raise _queue_full_error()
+
+    event_record = receive_transaction_event(db, event)
+    if event_record.processed_transaction_id:
+        return schemas.IngestTransactionResponse(
+            event_id=event.event_id,
+            status=event_record.status,
+            transaction_id=event_record.processed_transaction_id,
+            message="Event already processed"
+        )
+    if not ingestion_queue.submit(event_record.id, event_record.priority):
+        raise _queue_full_error()
+
+    return schemas.IngestTransactionResponse(
+        event_id=event.event_id,
+        status=event_record.status,
+        message="Event accepted for processing"
+    )
+
+
+@router.get("/queue/stats")
+def get_queue_stats():
+    """
+    Queue depth, worker utilization, throughput counters and per-priority queueing delay
+    """
+    return ingestion_queue.stats()
+
+
+@router.get("/idempotency/stats")
+def get_idempotency_stats():
+    """
+    Hit and miss counters of the in-memory event_id deduplication index
+    """
+    return idempotency_index.stats()
+
+
+@router.get("/retries/stats")
+def get_retry_stats():
+    """
+    Retry scheduler counters: attempts, recoveries, reschedules and dead-lettered events
+    """
+    return retry_scheduler.stats()
+
+
+@router.get("/dead-letters", response_model=List[schemas.DeadLetterEventResponse])
+def list_dead_letters(
+    include_replayed: bool = False,
+    limit: int = Query(100, le=1000),
+    offset: int = 0,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(require_role(["ADMIN"])),
+):
+    """
+    Events that exhausted their retries, newest first
+    """
+    query = db.query(models.DeadLetterEvent)
+    if not include_replayed:
+        query = query.filter(models.DeadLetterEvent.replayed_at.is_(None))
+    return query.order_by(models.DeadLetterEvent.id.desc()).offset(offset).limit(limit).all()
+
+
+@router.post("/dead-letters/replay", dependencies=[Depends(require_models_ready)])
+def replay_dead_letters(
+    request: schemas.DeadLetterReplayRequest,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(require_role(["ADMIN"])),
+):
+    """
+    Re-run dead-lettered events, either the given ids or every event not yet recovered
+    """
+    return retry_scheduler.replay_dead_letters(db, ids=request.ids, limit=request.limit)
+
+
+@router.post("/transactions:batch", response_model=schemas.IngestTransactionBatchResponse, dependencies=[Depends(require_models_ready)])
+def ingest_transactions_batch(events: List[schemas.TransactionEvent], db: Session = Depends(database.get_db)):
+    """
+    Ingest a burst of events in one unit of work and return a status per event
+    """
+    if len(events) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} events")
+    try:
+        results = ingest_transaction_events_batch(db, events)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    failed = sum(1 for result in results if result.status == models.IngestedEventStatus.FAILED.value)
+    return schemas.IngestTransactionBatchResponse(
+        total=len(results),
+        processed=len(results) - failed,
+        failed=failed,
+        results=results,
+    )
+
+
+@router.post("/transactions:stream", dependencies=[Depends(require_models_ready)])
+async def ingest_transactions_stream(request: Request):
+    """
+    Ingest an NDJSON body (one TransactionEvent per line) incrementally and
+    stream back one NDJSON result per line, followed by a summary line
+    """
+    # Servers speaking ASGI 2.4 (uvicorn >= 0.30) report disconnects as send errors; under
+    # older specs starlette's disconnect listener would compete with request.stream() for the body.
+    return StreamingResponse(
+        stream_ingest_ndjson(request.stream(), is_disconnected=request.is_disconnected),
+        media_type="application/x-ndjson",
+    )
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, Query
+import logging
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+import ml_engine
 import models
-from auth.dependencies import get_current_user
+import schemas
+from auth.dependencies import get_current_user, require_role
 from database import get_db
 from services.ml_explainability import explain_prediction, get_global_feature_importance
+from services.model_registry import model_registry
+from services.scoring_batcher import scoring_batcher
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ml", tags=["Machine Learning"])
 
@@ -137,3 +144,143 @@ async def get_model_info(current_user: models.User = Depends(get_current_user)):
         "last_trained": "2025-01-20",
         "training_samples": 300000
     }
+
+@router.get("/batching/stats")
+async def get_batching_stats(current_user: models.User = Depends(get_current_user)):
+    """
+    Micro-batching settings and the histogram of achieved scoring batch sizes
+    """
+    return scoring_batcher.stats()
+
+@router.get("/cascade/stats")
+async def get_cascade_stats(
+    low: float | None = Query(None, ge=0.0, le=1.0, description="Evaluate the holdout cost of another band"),
+    high: float | None = Query(None, ge=0.0, le=1.0),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Cascade band, share of traffic that exited after stage one, and the
+    holdout AUC cost compared with the full ensemble
+    """
+    cascade = ml_engine.ml_engine.cascade
+    if cascade is None:
+        return {"available": False, "enabled": False}
+    return {"available": True, **cascade.stats(low, high)}
+
+def _activate_in_background(version: str):
+    try:
+        model_registry.activate(version)
+    except Exception:
+        logger.exception(f"Activation of model version {version} failed")
+
+@router.get("/models")
+async def list_model_versions(current_user: models.User = Depends(get_current_user)):
+    """
+    Registered model versions, the active and rollback versions, and what this worker serves
+    """
+    return {**model_registry.manifest(), "worker": model_registry.status()}
+
+@router.post("/models", status_code=201)
+def register_model_version(
+    request: schemas.ModelVersionCreate,
+    current_user: models.User = Depends(require_role(["ADMIN"]))
+):
+    """
+    Copy trained artifacts from a server-side directory into a new registry version.
+    A plain def: FastAPI runs it in the threadpool, so the copy does not block the event loop.
+    """
+    try:
+        return model_registry.register(request.source_dir, request.version, request.notes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/models/rollback", status_code=202)
+async def rollback_model_version(
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(require_role(["ADMIN"]))
+):
+    """
+    Re-activate the previous model version in the background
+    """
+    previous = model_registry.manifest()["previous"]
+    if not previous:
+        raise HTTPException(status_code=400, detail="No previous model version to roll back to")
+    background_tasks.add_task(_activate_in_background, previous)
+    return {"version": previous, "status": "LOADING"}
+
+@router.post("/models/{version}/activate", status_code=202)
+async def activate_model_version(
+    version: str,
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(require_role(["ADMIN"]))
+):
+    """
+    Load and warm a version in the background, then swap it in; other workers follow within one poll interval
+    """
+    try:
+        model_registry.version_dir(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Model version not found")
+    background_tasks.add_task(_activate_in_background, version)
+    return {"version": version, "status": "LOADING"}
+
+@router.get("/models/workers")
+async def get_model_workers(current_user: models.User = Depends(get_current_user)):
+    """
+    Model version served by each worker process, from their heartbeat files
+    """
+    return {"active": model_registry.manifest()["active"], "workers": model_registry.workers()}
+
+def _add_shadow_in_background(version: str):
+    try:
+        model_registry.add_shadow(version)
+    except Exception:
+        logger.exception(f"Loading shadow model version {version} failed")
+
+@router.get("/shadows")
+async def get_shadow_stats(current_user: models.User = Depends(get_current_user)):
+    """
+    Live agreement and divergence of each shadow model with the champion
+    """
+    return {"champion": ml_engine.ml_engine.version, **ml_engine.ml_engine.shadows.stats()}
+
+@router.post("/shadows", status_code=202)
+async def add_shadow_model(
+    request: schemas.ShadowModelCreate,
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(require_role(["ADMIN"]))
+):
+    """
+    Load a registered version in the background and score live traffic with it in shadow mode
+    """
+    try:
+        model_registry.version_dir(request.version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Model version not found")
+    background_tasks.add_task(_add_shadow_in_background, request.version)
+    return {"version": request.version, "status": "LOADING"}
+
+@router.delete("/shadows/{version}")
+async def remove_shadow_model(
+    version: str,
+    current_user: models.User = Depends(require_role(["ADMIN"]))
+):
+    """
+    Stop shadow scoring with a version
+    """
+    removed = model_registry.remove_shadow(version)
+    return {"version": version, "removed": removed}
+
+@router.get("/shadows/{version}/samples")
+async def get_shadow_samples(
+    version: str,
+    limit: int = Query(100, le=1000),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Most recent champion and shadow score pairs for one shadow model
+    """
+    try:
+        return {"version": version, "samples": ml_engine.ml_engine.shadows.samples(version, limit)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Shadow model not found")
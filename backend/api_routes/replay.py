@@ -0,0 +1,93 @@
+from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+import database
+import models
+import schemas
+from auth.dependencies import get_current_user, require_role
+from services.replay_service import run_replay, summarize_replay
+
+router = APIRouter(prefix="/replay", tags=["Replay"])
+
+
+def _get_run(db: Session, run_id: int) -> models.ReplayRun:
+    run = db.get(models.ReplayRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Replay run not found")
+    return run
+
+
+@router.post("/runs", response_model=schemas.ReplayRunResponse, status_code=202)
+def create_replay_run(
+    request: schemas.ReplayRunCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(require_role(["ADMIN"])),
+):
+    """
+    Re-score stored events in a time window against a candidate model directory
+    and/or ruleset. Results go to replay_results; production rows are untouched.
+    """
+    run = models.ReplayRun(
+        name=request.name,
+        window_start=request.window_start,
+        window_end=request.window_end,
+        model_dir=request.model_dir,
+        rules=request.rules,
+    )
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    background_tasks.add_task(run_replay, run.id)
+    return run
+
+
+@router.get("/runs", response_model=List[schemas.ReplayRunResponse])
+def list_replay_runs(
+    limit: int = Query(20, le=200),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return db.query(models.ReplayRun).order_by(models.ReplayRun.id.desc()).limit(limit).all()
+
+
+@router.get("/runs/{run_id}", response_model=schemas.ReplayRunResponse)
+def get_replay_run(
+    run_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return _get_run(db, run_id)
+
+
+@router.get("/runs/{run_id}/summary")
+def get_replay_summary(
+    run_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Status/action transition counts between production and replayed outcomes
+    """
+    _get_run(db, run_id)
+    return summarize_replay(db, run_id)
+
+
+@router.get("/runs/{run_id}/results", response_model=List[schemas.ReplayResultResponse])
+def get_replay_results(
+    run_id: int,
+    changed_only: bool = False,
+    limit: int = Query(100, le=1000),
+    offset: int = 0,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    _get_run(db, run_id)
+    query = db.query(models.ReplayResult).filter(models.ReplayResult.run_id == run_id)
+    if changed_only:
+        query = query.filter(or_(
+            models.ReplayResult.original_status != models.ReplayResult.replay_status,
+            models.ReplayResult.original_action != models.ReplayResult.replay_action,
+        ))
+    return query.order_by(models.ReplayResult.id).offset(offset).limit(limit).all()
@@ -0,0 +1,128 @@
+from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+import database
+import models
+import schemas
+from auth.dependencies import get_current_user, require_role
+from services.rule_backtest import execute_backtest_run
+from services.rule_compiler import validate_rules
+from services.rule_store import rule_store
+
+router = APIRouter(prefix="/rules", tags=["Rules"])
+
+
+@router.get("/active")
+def get_active_rules(current_user: models.User = Depends(get_current_user)):
+    """
+    Rule set version this worker evaluates, and any version that failed to load
+    """
+    return {**rule_store.status(), "rules": rule_store.current().rules}
+
+
+@router.get("/stats")
+def get_rule_stats(current_user: models.User = Depends(get_current_user)):
+    """
+    Sampled selectivity of every condition of the active rule set: how often it
+    rejects an event and what it costs, in the order rules currently evaluate them.
+    Only collected when RULES_PROFILE_EVERY is set.
+    """
+    return {"version": rule_store.version, **rule_store.current().stats()}
+
+
+@router.get("/sets", response_model=List[schemas.RuleSetResponse])
+def list_rule_sets(
+    limit: int = Query(20, le=200),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return db.query(models.RuleSet).order_by(models.RuleSet.version.desc()).limit(limit).all()
+
+
+@router.get("/sets/{version}", response_model=schemas.RuleSetResponse)
+def get_rule_set(
+    version: int,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    rule_set = db.get(models.RuleSet, version)
+    if not rule_set:
+        raise HTTPException(status_code=404, detail="Rule set not found")
+    return rule_set
+
+
+@router.post("/sets", response_model=schemas.RuleSetResponse, status_code=201)
+def create_rule_set(
+    request: schemas.RuleSetCreate,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(require_role(["ADMIN"])),
+):
+    """
+    Store a new rule set version, optionally activating it. Rules that do not
+    compile are rejected and nothing is stored.
+    """
+    try:
+        return rule_store.create(db, request.rules, request.notes, current_user.username, request.activate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/sets/{version}/activate", response_model=schemas.RuleSetResponse)
+def activate_rule_set(
+    version: int,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(require_role(["ADMIN"])),
+):
+    """
+    Make a version active; this worker swaps immediately, others within RULES_REFRESH_SECONDS.
+    Re-activating an older version is the rollback.
+    """
+    try:
+        return rule_store.activate(db, version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Rule set not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/backtest", response_model=schemas.RuleBacktestRunResponse, status_code=202)
+def backtest_rule_set(
+    request: schemas.RuleBacktestRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(require_role(["ADMIN"])),
+):
+    """
+    Evaluate a candidate rule set over the event snapshots of a time window in
+    the background: hits per rule, decision deltas against production, and rule
+    overlaps. Poll GET /rules/backtest/{run_id} for the summary; production rows
+    are untouched.
+    """
+    try:
+        validate_rules(request.rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    run = models.RuleBacktestRun(
+        window_start=request.window_start,
+        window_end=request.window_end,
+        rules=request.rules,
+        max_overlaps=request.max_overlaps,
+        created_by=current_user.username,
+    )
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    background_tasks.add_task(execute_backtest_run, run.id)
+    return run
+
+
+@router.get("/backtest/{run_id}", response_model=schemas.RuleBacktestRunResponse)
+def get_backtest_run(
+    run_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    run = db.get(models.RuleBacktestRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Backtest run not found")
+    return run
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 import models, schemas, database
+import ml_engine
 from services.transaction_service import create_transaction_record
 
 router = APIRouter()
@@ -8,6 +9,11 @@ router = APIRouter()
 
 @router.post("/transactions/", response_model=schemas.TransactionWithRisk)
 def create_transaction(transaction: schemas.TransactionCreate, db: Session = Depends(database.get_db)):
+    # Waits for a model load in progress; 503 only when ML_ALLOW_RULE_FALLBACK=0 rules out scoring.
+    engine = ml_engine.ml_engine
+    engine.wait_until_loaded()
+    if not engine.ready:
+        raise HTTPException(status_code=503, detail=f"Scoring models are unavailable: {engine.load_error}")
     return create_transaction_record(db, transaction)
 
 
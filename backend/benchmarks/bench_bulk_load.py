@@ -0,0 +1,80 @@
+"""
+Bulk load benchmark: fraudguard-load throughput against the 50k events/s target.
+
+Writes --events synthetic transaction events to a temporary JSONL file, loads
+them into a fresh SQLite database (or --database-url) with load_files, and
+reports rows loaded and events/sec; a second pass over the same file checks
+that every event is skipped as a duplicate.
+
+Usage (from backend/):
+    python benchmarks/bench_bulk_load.py --events 200000 --workers 8 --batch-size 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+
+import models  # noqa: E402
+from services.bulk_loader import load_files  # noqa: E402
+
+TARGET_EVENTS_PER_SECOND = 50_000
+LOCATIONS = ["Tashkent, Uzbekistan", "Samarkand, Uzbekistan", "Dubai, UAE", "Almaty, Kazakhstan", "Istanbul, Turkey"]
+MERCHANTS = ["Korzinka.uz", "Makro", "Evos", "Uzum Market", "Click"]
+
+
+def write_events(path: str, n: int, seed: int = 0):
+    rng = random.Random(seed)
+    with open(path, "w") as handle:
+        for index in range(n):
+            handle.write(json.dumps({
+                "event_id": f"bench-evt-{index}",
+                "transaction_id": f"bench-txn-{index}",
+                "user_id": f"user_{rng.randrange(5000):04d}",
+                "amount": round(rng.lognormvariate(5, 1.5), 2),
+                "merchant": rng.choice(MERCHANTS),
+                "ip_address": f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+                "location": rng.choice(LOCATIONS),
+                "device_id": f"device_{rng.randrange(20000)}",
+            }) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--database-url", help="Target database (default: a temporary SQLite file)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "events.jsonl")
+        write_events(source, args.events)
+        url = args.database_url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = create_engine(url)
+        models.Base.metadata.create_all(bind=engine)
+
+        summary = load_files(engine, [source], batch_size=args.batch_size, workers=args.workers)
+        rate = summary["events_per_second"]
+        print(
+            f"loaded {summary['loaded']:,} of {summary['read']:,} events in {summary['elapsed_seconds']}s "
+            f"with {args.workers} workers: {rate:,.0f} events/s "
+            f"({rate / TARGET_EVENTS_PER_SECOND:.0%} of the {TARGET_EVENTS_PER_SECOND:,}/s target)"
+        )
+        if summary["invalid"]:
+            sys.exit(f"{summary['invalid']} events were rejected: {summary['errors']}")
+
+        rerun = load_files(engine, [source], batch_size=args.batch_size, workers=args.workers)
+        if rerun["loaded"] or rerun["duplicates"] != args.events:
+            sys.exit(f"Second pass loaded {rerun['loaded']} events and skipped {rerun['duplicates']}")
+        print(f"second pass: {rerun['duplicates']:,} duplicates skipped in {rerun['elapsed_seconds']}s")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Float32 vs float64 scoring benchmark for the native tree engine.
+
+Compares throughput, peak memory and score deviation of the reduced-precision
+path (float32 features, scaler folded into thresholds) with the exact float64
+path and, when the model pickles are present, the original libraries.
+
+Usage (from backend/, after train_advanced_model.py and tree_engine.py):
+    python benchmarks/bench_float32.py --model-dir . --rows 20000
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ml_engine  # noqa: E402
+from feature_pipeline import FeaturePipeline  # noqa: E402
+from shadow_scoring import DECISION_THRESHOLDS  # noqa: E402
+
+
+def synthetic_transactions(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    locations = ["", "Tashkent", "Samarkand", "abroad", "international"]
+    return [
+        {
+            "amount": float(rng.lognormal(5, 2)),
+            "merchant": f"merchant-{rng.integers(0, 500)}",
+            "location": locations[rng.integers(0, len(locations))],
+            "hour_of_day": int(rng.integers(0, 24)),
+            "day_of_week": int(rng.integers(0, 7)),
+            "avg_transaction_amount": float(rng.lognormal(4, 1.5)),
+            "transaction_frequency": int(rng.poisson(5)),
+            "location_change_speed": float(rng.exponential(1)),
+            "device_change": int(rng.integers(0, 2)),
+            "ip_change": int(rng.integers(0, 2)),
+        }
+        for _ in range(n)
+    ]
+
+
+def run(score_batch, transactions, batch_size, repeat):
+    """Best-of-repeat rows/s, peak traced memory of one batch, and all ensemble probabilities"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proba = np.concatenate([
+            score_batch(transactions[i:i + batch_size]) for i in range(0, len(transactions), batch_size)
+        ])
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    score_batch(transactions[:batch_size])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(transactions) / best, peak, proba.astype(np.float64)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model-dir", default=".")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+    # sklearn warns on every call that the scaled arrays carry no feature names
+    warnings.filterwarnings("ignore")
+
+    engine = ml_engine.MLEngine(args.model_dir)
+    if engine.native_engine is None:
+        sys.exit("No native model in --model-dir; run train_advanced_model.py and tree_engine.py first")
+    native = engine.native_engine
+    pipeline64 = FeaturePipeline(engine.feature_columns, np.float64)
+    pipeline32 = FeaturePipeline(engine.feature_columns, np.float32)
+    transactions = synthetic_transactions(args.rows)
+
+    paths = {
+        "native float64": lambda batch: native.predict_proba(pipeline64.transform(batch))["ensemble"],
+        "native float32": lambda batch: native.predict_proba(pipeline32.transform(batch))["ensemble"],
+    }
+    os.environ["ML_NATIVE_TREES"] = "0"
+    libraries = ml_engine.MLEngine(args.model_dir)
+    if libraries.use_ensemble:
+        paths["libraries float64"] = lambda batch: np.array([
+            result["model_details"]["ensemble_probability"]
+            for result in libraries.predict_full_ensemble_batch(pipeline64.transform(batch))
+        ])
+
+    print(f"{args.rows:,} transactions, batch size {args.batch_size}")
+    print(f"{'path':<20}{'rows/s':>12}{'peak MB/batch':>16}")
+    results = {}
+    for name, score_batch in paths.items():
+        rows_per_second, peak, proba = run(score_batch, transactions, args.batch_size, args.repeat)
+        results[name] = proba
+        print(f"{name:<20}{rows_per_second:>12,.0f}{peak / 1e6:>16.2f}")
+
+    reference = results.get("libraries float64", results["native float64"])
+    deviation = np.abs(results["native float32"] - reference)
+    score_diff = np.abs((results["native float32"] * 1000).astype(int) - (reference * 1000).astype(int))
+    decision_flips = np.searchsorted(DECISION_THRESHOLDS, (results["native float32"] * 1000).astype(int)) != \
+        np.searchsorted(DECISION_THRESHOLDS, (reference * 1000).astype(int))
+    print("\nfloat32 deviation from", "libraries" if "libraries float64" in results else "native float64")
+    print("  probability |diff| percentiles 50/90/99/max: " + " / ".join(
+        f"{value:.2e}" for value in np.percentile(deviation, [50, 90, 99, 100])
+    ))
+    for label, mask in (("0", score_diff == 0), ("1", score_diff == 1), ("2-5", (score_diff >= 2) & (score_diff <= 5)), (">5", score_diff > 5)):
+        print(f"  score |diff| {label:>4}: {np.count_nonzero(mask):>8,} ({np.mean(mask):.4%})")
+    print(f"  decision flips: {np.count_nonzero(decision_flips):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+IP reputation benchmark: interval-array lookup over a large CIDR file.
+
+Writes --ranges random IPv4 (and a tenth as many IPv6) CIDR ranges, some
+nested in others, to a temporary IP_REPUTATION_FILE-style CSV, loads it,
+checks sampled lookups against a linear longest-prefix scan, and reports
+load time, single lookups/sec and batched lookups/sec.
+
+Usage (from backend/):
+    python benchmarks/bench_ip_reputation.py --ranges 1000000 --lookups 1000000
+"""
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ip_reputation import IPReputationTable, pack_ipv4  # noqa: E402
+
+REPUTATIONS = ["botnet", "anonymous_proxy", "high_chargeback", "suspicious_vpn", "tor_exit", "trusted_partner"]
+
+
+def write_ranges(path: str, n: int, seed: int = 0):
+    rng = random.Random(seed)
+    with open(path, "w") as handle:
+        handle.write("# cidr,reputation,risk_score\n")
+        for _ in range(n):
+            network = ipaddress.IPv4Network((rng.getrandbits(32), rng.randint(12, 32)), strict=False)
+            handle.write(f"{network},{rng.choice(REPUTATIONS)},{rng.random():.2f}\n")
+        for _ in range(n // 10):
+            network = ipaddress.IPv6Network((rng.getrandbits(128), rng.randint(24, 64)), strict=False)
+            handle.write(f"{network},{rng.choice(REPUTATIONS)},{rng.random():.2f}\n")
+
+
+def linear_lookup(networks, address: str):
+    address = ipaddress.ip_address(address)
+    best = None
+    for network, reputation in networks:
+        if address.version == network.version and address in network:
+            if best is None or network.prefixlen >= best[0].prefixlen:
+                best = (network, reputation)
+    return best[1] if best else "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ranges", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=1_000_000)
+    parser.add_argument("--check", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ip_reputation.csv")
+        write_ranges(path, args.ranges)
+        start = time.perf_counter()
+        table = IPReputationTable.from_file(path)
+        loaded = time.perf_counter() - start
+        print(f"Loaded {args.ranges + args.ranges // 10:,} ranges in {loaded:.1f}s: {table.stats()}")
+
+        rng = random.Random(1)
+        addresses = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(args.lookups)]
+
+        with open(path) as handle:
+            networks = [
+                (ipaddress.ip_network(line.split(",")[0]), line.split(",")[1])
+                for line in handle if not line.startswith("#")
+            ][:20_000]
+        check_table = IPReputationTable((str(network), reputation, 0.0) for network, reputation in networks)
+        for address in addresses[:args.check]:
+            if check_table.lookup(address)["reputation"] != linear_lookup(networks, address):
+                sys.exit(f"Interval lookup disagrees with the linear scan for {address}")
+
+    count = min(args.lookups, 200_000)
+    start = time.perf_counter()
+    for address in addresses[:count]:
+        table.lookup(address)
+    single = count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    packed = pack_ipv4(addresses)
+    packed_at = time.perf_counter()
+    table.lookup_batch(packed)
+    done = time.perf_counter()
+    print(f"single lookups/s: {single:,.0f}")
+    print(
+        f"batch of {args.lookups:,}: pack {packed_at - start:.2f}s, lookup {done - packed_at:.3f}s "
+        f"({args.lookups / (done - packed_at):,.0f} lookups/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
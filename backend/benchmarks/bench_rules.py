@@ -0,0 +1,157 @@
+"""
+Rule evaluation benchmark: compiled predicate closures vs the interpreter.
+
+Evaluates synthetic events against the production RULES (4 rules) and
+against generated rule sets of 100 and 1000 rules built from the same
+condition types, checks both paths return identical hits, and reports
+events/sec with and without the candidate-rule index. Then times the vectorized batch path (evaluate_rules_batch and
+decide_actions_batch) over --batch-events columnar events.
+
+Usage (from backend/):
+    python benchmarks/bench_rules.py --events 5000 --batch-events 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.rules_config import RULES  # noqa: E402
+from services.rule_compiler import CompiledRuleSet  # noqa: E402
+from services.rule_engine import decide_actions_batch, evaluate_rules_batch  # noqa: E402
+from tests.rule_interpreter import interpret_rules  # noqa: E402
+
+COUNTRIES = ["UZBEKISTAN", "UAE", "BRAZIL", "INDIA", "KAZAKHSTAN", "TURKEY", "RUSSIA", "USA"]
+REPUTATIONS = ["unknown", "trusted_partner", "tor_exit", "datacenter"]
+SEGMENTS = ["retail", "premium", "business", "student"]
+
+
+def synthetic_rules(n: int, seed: int = 0):
+    rng = random.Random(seed)
+
+    def condition():
+        kind = rng.choice([
+            "amount_greater_than", "amount_less_than", "amount_between", "country_in", "ip_risk_above",
+            "ip_reputation_equals", "velocity_flag_equals", "device_change_equals", "user_segment_in",
+        ])
+        if kind == "amount_between":
+            low = rng.uniform(0, 10000)
+            return {"type": kind, "min": low, "max": low + rng.uniform(100, 5000)}
+        if kind in ("amount_greater_than", "amount_less_than"):
+            return {"type": kind, "value": rng.uniform(0, 15000)}
+        if kind == "country_in":
+            return {"type": kind, "value": rng.sample(COUNTRIES, 3)}
+        if kind == "ip_risk_above":
+            return {"type": kind, "value": rng.uniform(0.2, 0.9)}
+        if kind == "ip_reputation_equals":
+            return {"type": kind, "value": rng.choice(REPUTATIONS)}
+        if kind == "user_segment_in":
+            return {"type": kind, "value": rng.sample(SEGMENTS, 2)}
+        return {"type": kind, "value": rng.randint(0, 1)}
+
+    return [
+        {
+            "id": f"rule_{i}",
+            "name": f"Rule {i}",
+            "severity": rng.choice(["low", "medium", "high"]),
+            "action": rng.choice(["ALLOW", "CHALLENGE", "BLOCK"]),
+            "conditions": [condition() for _ in range(rng.randint(1, 4))],
+            "reason": f"Synthetic rule {i}",
+        }
+        for i in range(n)
+    ]
+
+
+def synthetic_events(n: int, seed: int = 1):
+    rng = random.Random(seed)
+    events = []
+    for _ in range(n):
+        transaction = {"amount": rng.lognormvariate(6, 1.5), "velocity_flag": rng.randint(0, 1)}
+        enrichment = {
+            "geo_country": rng.choice(COUNTRIES).title(),
+            "ip_risk_score": rng.random(),
+            "ip_reputation": rng.choice(REPUTATIONS),
+            "user_segment": rng.choice(SEGMENTS),
+            "signals": {},
+            "derived_features": {"velocity_flag": rng.randint(0, 1), "device_change": rng.randint(0, 1)},
+        }
+        events.append((transaction, enrichment))
+    return events
+
+
+def synthetic_columns(n: int, seed: int = 2):
+    """Columnar events for evaluate_rules_batch, with the value distributions of synthetic_events"""
+    rng = np.random.default_rng(seed)
+    return {
+        "amount": rng.lognormal(6, 1.5, n),
+        "geo_country": rng.choice(np.array([country.title() for country in COUNTRIES], dtype=object), n),
+        "ip_risk_score": rng.random(n),
+        "ip_reputation": rng.choice(np.array(REPUTATIONS, dtype=object), n),
+        "velocity_flag": rng.integers(0, 2, n).astype(np.float64),
+        "device_change": rng.integers(0, 2, n).astype(np.float64),
+        "user_segment": rng.choice(np.array(SEGMENTS, dtype=object), n),
+    }
+
+
+def events_per_second(evaluate, events, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for transaction, enrichment in events:
+            evaluate(transaction, enrichment)
+        best = min(best, time.perf_counter() - start)
+    return len(events) / best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-events", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    events = synthetic_events(args.events)
+    print(f"{args.events:,} events, best of {args.repeat}")
+    print(
+        f"{'rules':>6}{'interpreter ev/s':>18}{'compiled ev/s':>15}{'indexed ev/s':>14}"
+        f"{'speedup':>9}{'candidates/ev':>15}{'hits/ev':>9}"
+    )
+    for rules in (RULES, synthetic_rules(100), synthetic_rules(1000)):
+        compiled = CompiledRuleSet(rules, use_index=False)
+        indexed = CompiledRuleSet(rules, use_index=True)
+        interpreted_hits = [interpret_rules(transaction, enrichment, rules) for transaction, enrichment in events]
+        for rule_set in (compiled, indexed):
+            if [rule_set.evaluate(transaction, enrichment) for transaction, enrichment in events] != interpreted_hits:
+                sys.exit(f"Compiled rules disagree with the interpreter for {len(rules)} rules")
+
+        interpreted = events_per_second(lambda t, e: interpret_rules(t, e, rules), events, args.repeat)
+        fast = events_per_second(compiled.evaluate, events, args.repeat)
+        fastest = events_per_second(indexed.evaluate, events, args.repeat)
+        candidates = sum(len(indexed.index.candidates(t, e)) for t, e in events) / len(events)
+        hits = sum(len(h) for h in interpreted_hits) / len(events)
+        print(
+            f"{len(rules):>6}{interpreted:>18,.0f}{fast:>15,.0f}{fastest:>14,.0f}"
+            f"{max(fast, fastest) / interpreted:>8.1f}x{candidates:>15.1f}{hits:>9.2f}"
+        )
+
+    columns = synthetic_columns(args.batch_events)
+    print(f"\nBatch path, {args.batch_events:,} columnar events")
+    print(f"{'rules':>6}{'evaluate s':>12}{'decide s':>10}{'events/s':>14}{'hits':>14}")
+    for rules in (RULES, synthetic_rules(100), synthetic_rules(1000)):
+        start = time.perf_counter()
+        hits = evaluate_rules_batch(columns, rules)
+        evaluated = time.perf_counter()
+        decide_actions_batch(hits, rules)
+        decided = time.perf_counter()
+        print(
+            f"{len(rules):>6}{evaluated - start:>12.2f}{decided - evaluated:>10.2f}"
+            f"{args.batch_events / (decided - start):>14,.0f}{hits.nnz:>14,}"
+        )
+
+
+if __name__ == "__main__":
+    main()
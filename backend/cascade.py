@@ -0,0 +1,127 @@
+"""
+Cascade scoring: a cheap first stage in front of the full ensemble.
+
+A shallow decision tree trained alongside the ensemble (train_advanced_model.py)
+scores every transaction. Only transactions whose stage-one probability
+falls inside the uncertain band [low, high] are sent to the XGBoost +
+LightGBM + RandomForest ensemble; the rest exit early with the stage-one
+score.
+
+The tree is fitted on raw (unscaled) features and stored as plain node
+arrays, so stage one is a few vectorized lookups and needs no scaler or
+sklearn at serving time. A holdout set of labels and both stages'
+probabilities is stored next to it, so the AUC cost of any band can be
+recomputed without retraining.
+"""
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+CASCADE_CONFIG_FILE = "cascade_config.pkl"
+DEFAULT_LOW_BAND = 0.1
+DEFAULT_HIGH_BAND = 0.9
+
+
+def export_stage_one(model) -> Dict[str, np.ndarray]:
+    """Node arrays of a fitted DecisionTreeClassifier; leaves point at themselves"""
+    tree = model.tree_
+    nodes = np.arange(tree.node_count)
+    leaf = tree.children_left < 0
+    proba = tree.value[:, 0, :] / tree.value[:, 0, :].sum(axis=1, keepdims=True)
+    return {
+        "feature": np.where(leaf, 0, tree.feature).astype(np.int32),
+        "threshold": tree.threshold.astype(np.float64),
+        "left": np.where(leaf, nodes, tree.children_left).astype(np.int32),
+        "right": np.where(leaf, nodes, tree.children_right).astype(np.int32),
+        "value": proba[:, list(model.classes_).index(1)],
+        "depth": int(tree.max_depth),
+    }
+
+
+def evaluate_cascade(
+    labels: np.ndarray,
+    stage_one_proba: np.ndarray,
+    ensemble_proba: np.ndarray,
+    low: float,
+    high: float,
+) -> Dict[str, float]:
+    """Early-exit rate and AUC of the cascade vs the full ensemble on labelled data"""
+    from sklearn.metrics import roc_auc_score
+
+    escalate = (stage_one_proba >= low) & (stage_one_proba <= high)
+    cascade_proba = np.where(escalate, ensemble_proba, stage_one_proba)
+    ensemble_auc = float(roc_auc_score(labels, ensemble_proba))
+    cascade_auc = float(roc_auc_score(labels, cascade_proba))
+    return {
+        "early_exit_fraction": round(float(1 - escalate.mean()), 4),
+        "ensemble_auc": round(ensemble_auc, 4),
+        "cascade_auc": round(cascade_auc, 4),
+        "auc_cost": round(ensemble_auc - cascade_auc, 4),
+        # Share of transactions whose 0.5-threshold decision matches the full ensemble
+        "decision_agreement": round(float(np.mean((cascade_proba > 0.5) == (ensemble_proba > 0.5))), 4),
+    }
+
+
+class CascadeStage:
+    """Stage-one model, band configuration and live early-exit counters"""
+
+    def __init__(self, config: Dict[str, Any]):
+        tree = config["tree"]
+        self.feature, self.threshold, self.left, self.right, self.value = (
+            np.asarray(tree[name]) for name in ("feature", "threshold", "left", "right", "value")
+        )
+        self.depth = int(tree["depth"])
+        self.low = float(os.getenv("ML_CASCADE_LOW", config.get("low", DEFAULT_LOW_BAND)))
+        self.high = float(os.getenv("ML_CASCADE_HIGH", config.get("high", DEFAULT_HIGH_BAND)))
+        if not 0.0 <= self.low <= self.high <= 1.0:
+            raise ValueError(f"Invalid cascade band [{self.low}, {self.high}]")
+        self.enabled = os.getenv("ML_CASCADE", "0") == "1"
+        self.holdout = config.get("holdout")
+
+        self._lock = threading.Lock()
+        self.scored = 0
+        self.exited_low = 0
+        self.exited_high = 0
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        # sklearn compares float32(x) <= threshold
+        features = np.asarray(features, dtype=np.float32).astype(np.float64)
+        rows = np.arange(features.shape[0])
+        nodes = np.zeros(features.shape[0], dtype=np.intp)
+        for _ in range(self.depth):
+            go_left = features[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes]
+
+    def split(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Stage-one probabilities and the mask of rows that must go to the full ensemble"""
+        proba = self.predict_proba(features)
+        escalate = (proba >= self.low) & (proba <= self.high)
+        with self._lock:
+            self.scored += len(proba)
+            self.exited_low += int(np.count_nonzero(proba < self.low))
+            self.exited_high += int(np.count_nonzero(proba > self.high))
+        return proba, escalate
+
+    def stats(self, low: float | None = None, high: float | None = None) -> Dict[str, Any]:
+        with self._lock:
+            exited = self.exited_low + self.exited_high
+            stats: Dict[str, Any] = {
+                "enabled": self.enabled,
+                "low": self.low,
+                "high": self.high,
+                "scored": self.scored,
+                "exited_low": self.exited_low,
+                "exited_high": self.exited_high,
+                "escalated": self.scored - exited,
+                "early_exit_fraction": round(exited / self.scored, 4) if self.scored else 0.0,
+            }
+        if self.holdout is not None:
+            low = self.low if low is None else low
+            high = self.high if high is None else high
+            stats["holdout"] = {"low": low, "high": high, **evaluate_cascade(
+                self.holdout["labels"], self.holdout["stage_one_proba"], self.holdout["ensemble_proba"], low, high
+            )}
+        return stats
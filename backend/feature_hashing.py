@@ -0,0 +1,42 @@
+"""
+Deterministic feature hashing shared by training and serving.
+
+Python's built-in hash() of a str is salted per process (PYTHONHASHSEED),
+so hash(merchant) % n put the same merchant in different buckets in
+different uvicorn workers and across restarts. CRC32 is computed in C,
+is cheap for short strings and does not depend on the process, so feature
+vectors and scores built from hashed columns can be cached and compared
+across workers and batch jobs.
+"""
+import zlib
+from typing import Iterable
+
+import numpy as np
+
+HASH_SCHEME = "crc32"
+# Number of merchant_category buckets, in training data and at serving
+MERCHANT_CATEGORY_BUCKETS = 11
+
+
+def stable_hash(value) -> int:
+    """Process-independent unsigned 32-bit hash of a value's string form (None hashes like "")"""
+    return zlib.crc32(("" if value is None else str(value)).encode("utf-8"))
+
+
+def hash_bucket(value, buckets: int) -> int:
+    return stable_hash(value) % buckets
+
+
+def check_hash_scheme(scheme: str | None):
+    """
+    Raises ValueError for model artifacts trained with another hashing scheme
+    (recorded as ensemble_config["hash_scheme"]); None is an artifact from
+    before the scheme was recorded
+    """
+    if scheme is not None and scheme != HASH_SCHEME:
+        raise ValueError(f"Model artifacts hash features with {scheme!r}, serving hashes with {HASH_SCHEME!r}")
+
+
+def hash_buckets(values: Iterable, buckets: int) -> np.ndarray:
+    """hash_bucket over a column of values"""
+    return np.fromiter((stable_hash(value) for value in values), dtype=np.int64) % buckets
@@ -0,0 +1,149 @@
+"""
+Feature pipeline shared by training and serving.
+
+Derived features (is_night, is_weekend, amount_deviation, velocity_flag)
+are defined once, as expressions that work on scalars, NumPy arrays and
+pandas Series alike. train_advanced_model.py applies them to whole columns
+of the synthetic dataset, and MLEngine applies them to columns built from a
+batch of transactions, or to one transaction's values on the single-row
+fast path. Training and serving therefore cannot drift apart.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from feature_hashing import MERCHANT_CATEGORY_BUCKETS, hash_bucket, hash_buckets
+
+# Model input columns, in training order
+FEATURE_COLUMNS = [
+    'amount',
+    'hour_of_day',
+    'day_of_week',
+    'location_risk',
+    'location_change_speed',
+    'merchant_category',
+    'merchant_risk_score',
+    'avg_transaction_amount',
+    'transaction_frequency',
+    'days_since_last_transaction',
+    'device_change',
+    'ip_change',
+    'is_night',
+    'is_weekend',
+    'amount_deviation',
+    'velocity_flag',
+]
+
+# Serving defaults for fields a transaction does not carry (production would use user history)
+DEFAULTS = {
+    'amount': 0,
+    'hour_of_day': 12,
+    'day_of_week': 3,
+    'location_change_speed': 0.5,
+    'avg_transaction_amount': 500,
+    'transaction_frequency': 5,
+    'days_since_last_transaction': 1,
+    'device_change': 0,
+    'ip_change': 0,
+}
+DEFAULT_MERCHANT_RISK_SCORE = 0.3
+
+# Location risk levels: 0 home, 1 domestic, 2 international
+LOCATION_HOME, LOCATION_DOMESTIC, LOCATION_INTERNATIONAL = 0, 1, 2
+
+
+def is_night(hour_of_day):
+    return ((hour_of_day < 6) | (hour_of_day > 22)) * 1
+
+
+def is_weekend(day_of_week):
+    return (day_of_week >= 5) * 1
+
+
+def amount_deviation(amount, avg_transaction_amount):
+    return abs(amount - avg_transaction_amount) / (avg_transaction_amount + 1)
+
+
+def velocity_flag(transaction_frequency):
+    return (transaction_frequency > 10) * 1
+
+
+def location_risk(location: str | None) -> int:
+    if not location:
+        return LOCATION_HOME
+    location = location.lower()
+    if "international" in location or "abroad" in location:
+        return LOCATION_INTERNATIONAL
+    return LOCATION_DOMESTIC
+
+
+def add_derived_features(columns):
+    """Adds the derived columns to a DataFrame or a dict of arrays, in place"""
+    columns['is_night'] = is_night(columns['hour_of_day'])
+    columns['is_weekend'] = is_weekend(columns['day_of_week'])
+    columns['amount_deviation'] = amount_deviation(columns['amount'], columns['avg_transaction_amount'])
+    columns['velocity_flag'] = velocity_flag(columns['transaction_frequency'])
+    return columns
+
+
+class FeaturePipeline:
+    """Turns API transactions into model input rows ordered by a model's feature columns"""
+
+    def __init__(self, feature_columns: Sequence[str] = FEATURE_COLUMNS, dtype=np.float64):
+        self.feature_columns = list(feature_columns)
+        self.dtype = np.dtype(dtype)
+        # Position of each model column in FEATURE_COLUMNS; None when the orders already match
+        order = [FEATURE_COLUMNS.index(column) for column in self.feature_columns]
+        self._order = None if order == list(range(len(FEATURE_COLUMNS))) else np.asarray(order)
+
+    def transform(self, transactions: List[dict]) -> np.ndarray:
+        """(N, n_features) matrix for a batch, built column by column"""
+        columns: Dict[str, np.ndarray] = {
+            name: np.array([t.get(name, default) for t in transactions], dtype=np.float64)
+            for name, default in DEFAULTS.items()
+        }
+        columns['location_risk'] = np.array([location_risk(t.get("location", "")) for t in transactions], dtype=np.float64)
+        columns['merchant_category'] = hash_buckets((t.get("merchant", "") for t in transactions), MERCHANT_CATEGORY_BUCKETS)
+        columns['merchant_risk_score'] = np.full(len(transactions), DEFAULT_MERCHANT_RISK_SCORE)
+        add_derived_features(columns)
+        # Columns are computed in float64 (as on the single-row path) and written straight into
+        # a C-contiguous matrix of the pipeline's dtype.
+        matrix = np.empty((len(transactions), len(self.feature_columns)), dtype=self.dtype)
+        for index, name in enumerate(self.feature_columns):
+            matrix[:, index] = columns[name]
+        return matrix
+
+    def transform_one(self, transaction: dict) -> np.ndarray:
+        """(1, n_features) row for one transaction, without intermediate dicts"""
+        get = transaction.get
+        defaults = DEFAULTS
+        amount = get('amount', defaults['amount'])
+        hour_of_day = get('hour_of_day', defaults['hour_of_day'])
+        day_of_week = get('day_of_week', defaults['day_of_week'])
+        avg_transaction_amount = get('avg_transaction_amount', defaults['avg_transaction_amount'])
+        transaction_frequency = get('transaction_frequency', defaults['transaction_frequency'])
+        row = np.array([
+            amount,
+            hour_of_day,
+            day_of_week,
+            location_risk(get('location', "")),
+            get('location_change_speed', defaults['location_change_speed']),
+            hash_bucket(get('merchant', ""), MERCHANT_CATEGORY_BUCKETS),
+            DEFAULT_MERCHANT_RISK_SCORE,
+            avg_transaction_amount,
+            transaction_frequency,
+            get('days_since_last_transaction', defaults['days_since_last_transaction']),
+            get('device_change', defaults['device_change']),
+            get('ip_change', defaults['ip_change']),
+            is_night(hour_of_day),
+            is_weekend(day_of_week),
+            amount_deviation(amount, avg_transaction_amount),
+            velocity_flag(transaction_frequency),
+        ], dtype=self.dtype)
+        if self._order is not None:
+            row = row[self._order]
+        return row[np.newaxis, :]
+
+    def as_dict(self, transaction: dict) -> Dict[str, float]:
+        """Features by name, for the rule-based fallback"""
+        return dict(zip(self.feature_columns, self.transform_one(transaction)[0].tolist()))
@@ -148,37 +148,38 @@ def create_transaction_batch(db: Session, batch_size=1000):
             status="PENDING"
         )
         
-        # Calculate risk using ML engine
-        try:
-            risk_result = ml_engine.ml_engine.predict(transaction_data)
-            
-            # Determine status based on risk score
-            if risk_result["score"] > 800:
-                db_transaction.status = "BLOCK"
-            elif risk_result["score"] > 500:
-                db_transaction.status = "CHALLENGE"
-            else:
-                db_transaction.status = "ALLOW"
-            
-            # Create risk score
-            db_risk = models.RiskScore(
-                transaction_id=None,  # Will be set after commit
-                score=risk_result["score"],
-                confidence=risk_result["confidence"],
-                reason=risk_result["reason"]
-            )
-            
-            transactions.append((db_transaction, db_risk))
-        except Exception as e:
-            # Fallback if ML engine fails
+        transactions.append((db_transaction, transaction_data))
+    
+    # Calculate risk for the whole batch with one vectorized ML engine call
+    try:
+        risk_results = ml_engine.ml_engine.predict_batch([data for _, data in transactions])
+    except Exception as e:
+        # Fallback if ML engine fails
+        risk_results = [
+            {"score": random.randint(0, 300), "confidence": 0.9, "reason": "Normal Activity (Fallback)"}
+            for _ in transactions
+        ]
+    
+    for i, (db_transaction, _) in enumerate(transactions):
+        risk_result = risk_results[i]
+        
+        # Determine status based on risk score
+        if risk_result["score"] > 800:
+            db_transaction.status = "BLOCK"
+        elif risk_result["score"] > 500:
+            db_transaction.status = "CHALLENGE"
+        else:
             db_transaction.status = "ALLOW"
-            db_risk = models.RiskScore(
-                transaction_id=None,
-                score=random.randint(0, 300),
-                confidence=0.9,
-                reason="Normal Activity (Fallback)"
-            )
-            transactions.append((db_transaction, db_risk))
+        
+        # Create risk score
+        db_risk = models.RiskScore(
+            transaction_id=None,  # Will be set after commit
+            score=risk_result["score"],
+            confidence=risk_result["confidence"],
+            reason=risk_result["reason"]
+        )
+        
+        transactions[i] = (db_transaction, db_risk)
     
     # Bulk insert transactions
     db.add_all([t[0] for t in transactions])
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
@@ -11,8 +11,12 @@ from slowapi.errors import RateLimitExceeded
 from limiter import limiter
 
 load_dotenv()
+import ml_engine
 import models, database
-from api_routes import transactions, dashboard, analytics, reports, ingestion, event_base, cockpit, event_analysis, monitoring, investigation, web_traffic, realtime, currency, auth, notifications, export as export_routes, ml
+from services.ingestion_queue import ingestion_queue
+from services.model_registry import model_registry
+from services.retry_scheduler import retry_scheduler
+from api_routes import transactions, dashboard, analytics, reports, ingestion, event_base, cockpit, event_analysis, monitoring, investigation, web_traffic, realtime, currency, auth, notifications, export as export_routes, ml, replay, rules
 import logging
 
 # Configure logging
@@ -62,6 +66,7 @@ app = FastAPI(
         {"name": "Notifications", "description": "Email and Telegram alert system"},
         {"name": "Export", "description": "PDF and Excel export functionality"},
         {"name": "Machine Learning", "description": "ML model insights and SHAP explanations"},
+        {"name": "Rules", "description": "Versioned fraud rule sets with hot reload"},
         {"name": "Currency", "description": "Real-time currency exchange rates"},
         {"name": "Real-time", "description": "WebSocket streaming endpoints"},
     ]
@@ -95,7 +100,43 @@ app.include_router(auth.router)
 app.include_router(notifications.router)
 app.include_router(export_routes.router)
 app.include_router(ml.router)
+app.include_router(replay.router)
+app.include_router(rules.router)
+
+@app.on_event("startup")
+def start_ingestion_workers():
+    ingestion_queue.start()
+    db = database.SessionLocal()
+    try:
+        ingestion_queue.recover_pending(db)
+    finally:
+        db.close()
+    retry_scheduler.start()
+    model_registry.start()
+
+
+@app.on_event("shutdown")
+def stop_ingestion_workers():
+    model_registry.stop()
+    retry_scheduler.stop()
+    ingestion_queue.stop()
+
 
 @app.get("/")
 def read_root():
     return {"message": "AI Anti-Fraud Platform API is running"}
+
+
+@app.get("/health")
+def health():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    """Readiness: 503 until the scoring models are loaded and ingestion is accepted"""
+    status = ml_engine.ml_engine.readiness()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
@@ -5,110 +5,242 @@ Supports ensemble predictions from XGBoost, LightGBM, and Random Forest
 import joblib
 import numpy as np
 import os
-from typing import Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 import logging
 
+from cascade import CASCADE_CONFIG_FILE, CascadeStage
+from feature_hashing import check_hash_scheme
+from feature_pipeline import FeaturePipeline
+from shadow_scoring import ShadowScorer
+from tree_engine import NATIVE_MODEL_FILE, TreeEnsemble, source_fingerprint
+
 logger = logging.getLogger(__name__)
 
+# Engine attribute -> artifact written by train_advanced_model.py
+MODEL_ARTIFACTS = {
+    "xgb_model": "model_xgboost.pkl",
+    "lgb_model": "model_lightgbm.pkl",
+    "rf_model": "model_rf.pkl",
+    "scaler": "scaler.pkl",
+    "feature_columns": "feature_columns.pkl",
+    "ensemble_config": "ensemble_config.pkl",
+}
+
+# Load states: scoring is only meaningful once the engine is READY
+LOADING, READY, RULE_BASED = "loading", "ready", "rule_based"
+
+
+def rule_fallback_allowed() -> bool:
+    """
+    Whether rule-based scores may stand in when models fail to load (the
+    default; /health/ready reports RULE_BASED). ML_ALLOW_RULE_FALLBACK=0 makes
+    scoring fail instead, and ingestion is rejected until models load.
+    """
+    return os.getenv("ML_ALLOW_RULE_FALLBACK", "1") == "1"
+
+
+class ModelsNotReadyError(RuntimeError):
+    """Raised instead of scoring with the rule-based fallback when it is not allowed"""
+
+
 class MLEngine:
-    def __init__(self):
+    def __init__(self, model_dir: str | None = None, background: bool = False):
         self.models_loaded = False
         self.use_ensemble = False
-        
-        # Try to load ensemble models
+        self.native_engine = None
+        self.cascade = None
+        self.version = None  # set by the model registry
+        self.shadows = ShadowScorer()
+        self.pipeline = FeaturePipeline()
+        self.model_dir = model_dir or os.path.dirname(__file__)
+        self.status = LOADING
+        self.load_error = None
+        self.load_seconds = None
+        self._loaded = threading.Event()
+
+        # background=True returns immediately; predict() and predict_batch() wait for the load.
+        if background:
+            threading.Thread(target=self._load, name="ml-engine-load", daemon=True).start()
+        else:
+            self._load()
+
+    def _load(self):
+        started = time.perf_counter()
         try:
-            model_dir = os.path.dirname(__file__)
-            self.xgb_model = joblib.load(os.path.join(model_dir, "model_xgboost.pkl"))
-            self.lgb_model = joblib.load(os.path.join(model_dir, "model_lightgbm.pkl"))
-            self.rf_model = joblib.load(os.path.join(model_dir, "model_rf.pkl"))
-            self.scaler = joblib.load(os.path.join(model_dir, "scaler.pkl"))
-            self.feature_columns = joblib.load(os.path.join(model_dir, "feature_columns.pkl"))
-            self.ensemble_config = joblib.load(os.path.join(model_dir, "ensemble_config.pkl"))
-            
-            self.models_loaded = True
-            self.use_ensemble = True
-            self.models_loaded = True
-            self.use_ensemble = True
-            logger.info("✓ Ensemble models loaded successfully!")
+            # Artifacts are read in parallel threads: unpickling and file reads release the GIL for long stretches.
+            with ThreadPoolExecutor(max_workers=len(MODEL_ARTIFACTS) + 1, thread_name_prefix="ml-engine-load") as pool:
+                cascade = pool.submit(self._load_cascade, self.model_dir)
+                if not self._load_native(self.model_dir):
+                    self._load_pickles(self.model_dir, pool)
+                self.cascade = cascade.result()
+            if self.use_ensemble:
+                self._check_hash_scheme()
+            self.status = READY if self.use_ensemble else RULE_BASED
+        except Exception as e:
+            logger.error(f"⚠ Model loading failed: {e}")
+            self.load_error = str(e)
+            self.status = RULE_BASED
+        finally:
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            self._loaded.set()
+
+    def _load_native(self, model_dir: str) -> bool:
+        """Prefers the compiled tree arrays (see tree_engine.py) over the three libraries"""
+        native_path = os.path.join(model_dir, NATIVE_MODEL_FILE)
+        if os.getenv("ML_NATIVE_TREES", "1") == "0" or not os.path.exists(native_path):
+            return False
+        try:
+            self.native_engine = TreeEnsemble.load(native_path)
+        except Exception as e:
+            logger.warning(f"⚠ Native tree ensemble could not be loaded, falling back to model pickles: {e}")
+            self.native_engine = None
+            return False
+        # Without the pickles there is nothing to compare with, and nothing else to serve.
+        expected = source_fingerprint(model_dir)
+        if expected is not None and self.native_engine.source_fingerprint != expected:
+            logger.warning(
+                f"⚠ {NATIVE_MODEL_FILE} was not exported from the current model pickles, serving the pickles; "
+                "re-export it with tree_engine.py"
+            )
+            self.native_engine = None
+            return False
+        self.feature_columns = self.native_engine.feature_columns
+        self.ensemble_config = self.native_engine.ensemble_config
+        # ML_FLOAT32=1: float32 feature rows and the folded-scaler path of the native engine
+        dtype = np.float32 if os.getenv("ML_FLOAT32", "0") == "1" else np.float64
+        self.pipeline = FeaturePipeline(self.feature_columns, dtype)
+        self.models_loaded = True
+        self.use_ensemble = True
+        logger.info("✓ Native tree ensemble loaded successfully!")
+        return True
+
+    def _load_pickles(self, model_dir: str, pool: ThreadPoolExecutor):
+        # ML_MMAP_MODELS=1: NumPy arrays inside the pickles are memory-mapped read-only, so
+        # worker processes on one host share their pages through the OS page cache.
+        mmap_mode = "r" if os.getenv("ML_MMAP_MODELS", "0") == "1" else None
+        futures = {
+            name: pool.submit(joblib.load, os.path.join(model_dir, filename), mmap_mode=mmap_mode)
+            for name, filename in MODEL_ARTIFACTS.items()
+        }
+        try:
+            artifacts = {name: future.result() for name, future in futures.items()}
         except Exception as e:
             logger.warning(f"⚠ Ensemble models not found, using rule-based fallback: {e}")
+            self.load_error = str(e)
+            return
+        for name, artifact in artifacts.items():
+            setattr(self, name, artifact)
+        self.pipeline = FeaturePipeline(self.feature_columns)
+        self.models_loaded = True
+        self.use_ensemble = True
+        logger.info("✓ Ensemble models loaded successfully!")
+
+    def _check_hash_scheme(self):
+        """Falls back to rules when the models were trained on differently hashed features"""
+        scheme = self.ensemble_config.get("hash_scheme")
+        if scheme is None:
+            logger.warning("⚠ Model artifacts do not record their feature hashing scheme; retrain to record it")
+        try:
+            check_hash_scheme(scheme)
+        except ValueError as e:
+            logger.error(f"⚠ {e}; using rule-based fallback")
+            self.load_error = str(e)
+            self.native_engine = None
+            self.models_loaded = False
             self.use_ensemble = False
 
-    def extract_features(self, transaction_data: dict) -> np.ndarray:
-        """Extract and engineer features from transaction data"""
-        # Base features
-        amount = transaction_data.get("amount", 0)
-        
-        # Time features (if available, otherwise use defaults)
-        hour_of_day = transaction_data.get("hour_of_day", 12)
-        day_of_week = transaction_data.get("day_of_week", 3)
-        
-        # Location features
-        location = transaction_data.get("location", "")
-        location_risk = 0  # Default: Home
-        if "international" in location.lower() or "abroad" in location.lower():
-            location_risk = 2
-        elif location:
-            location_risk = 1
-            
-        # Merchant features
-        merchant = transaction_data.get("merchant", "")
-        merchant_category = hash(merchant) % 11  # Simple hash to category
-        merchant_risk_score = 0.3  # Default medium risk
-        
-        # User behavior (use defaults for now, in production these would come from user history)
-        avg_transaction_amount = transaction_data.get("avg_transaction_amount", 500)
-        transaction_frequency = transaction_data.get("transaction_frequency", 5)
-        days_since_last_transaction = transaction_data.get("days_since_last_transaction", 1)
-        
-        # Device features
-        device_id = transaction_data.get("device_id", "")
-        device_change = transaction_data.get("device_change", 0)
-        ip_address = transaction_data.get("ip_address", "")
-        ip_change = transaction_data.get("ip_change", 0)
-        
-        # Derived features
-        location_change_speed = transaction_data.get("location_change_speed", 0.5)
-        is_night = 1 if hour_of_day < 6 or hour_of_day > 22 else 0
-        is_weekend = 1 if day_of_week >= 5 else 0
-        amount_deviation = abs(amount - avg_transaction_amount) / (avg_transaction_amount + 1)
-        velocity_flag = 1 if transaction_frequency > 10 else 0
-        
-        # Create feature vector in the same order as training
-        features = {
-            'amount': amount,
-            'hour_of_day': hour_of_day,
-            'day_of_week': day_of_week,
-            'location_risk': location_risk,
-            'location_change_speed': location_change_speed,
-            'merchant_category': merchant_category,
-            'merchant_risk_score': merchant_risk_score,
-            'avg_transaction_amount': avg_transaction_amount,
-            'transaction_frequency': transaction_frequency,
-            'days_since_last_transaction': days_since_last_transaction,
-            'device_change': device_change,
-            'ip_change': ip_change,
-            'is_night': is_night,
-            'is_weekend': is_weekend,
-            'amount_deviation': amount_deviation,
-            'velocity_flag': velocity_flag
+    def wait_until_loaded(self, timeout: float | None = None) -> bool:
+        return self._loaded.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        """Whether ingestion may score with this engine: models loaded, or rule fallback allowed"""
+        return self.status == READY or (self.status == RULE_BASED and rule_fallback_allowed())
+
+    def _require_ready(self):
+        self._loaded.wait()
+        if not self.ready:
+            raise ModelsNotReadyError(f"Scoring models are unavailable: {self.load_error or 'model artifacts not found'}")
+
+    def readiness(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "status": self.status,
+            "version": self.version,
+            "engine": "native" if self.native_engine is not None else "libraries" if self.use_ensemble else "rules",
+            "load_seconds": self.load_seconds,
+            "error": self.load_error,
+            "rule_fallback_allowed": rule_fallback_allowed(),
         }
-        
-        # Return as array in correct order
+
+    def _load_cascade(self, model_dir: str) -> CascadeStage | None:
+        """Optional cheap first stage (see cascade.py); used only when ML_CASCADE=1"""
+        path = os.path.join(model_dir, CASCADE_CONFIG_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            cascade = CascadeStage(joblib.load(path))
+            if cascade.enabled:
+                logger.info(f"✓ Cascade stage one loaded, band [{cascade.low}, {cascade.high}]")
+            return cascade
+        except Exception as e:
+            logger.warning(f"⚠ Cascade stage could not be loaded, scoring with the full ensemble: {e}")
+            return None
+
+    def extract_features(self, transaction_data: dict) -> np.ndarray:
+        """Model input row for one transaction (see feature_pipeline.py)"""
         if self.use_ensemble:
-            return np.array([[features[col] for col in self.feature_columns]])
+            return self.pipeline.transform_one(transaction_data)
         else:
-            return features
+            return self.pipeline.as_dict(transaction_data)
 
     def predict_ensemble(self, features: np.ndarray) -> Dict:
         """Make ensemble prediction"""
+        return self.predict_ensemble_batch(features)[0]
+
+    def predict_ensemble_batch(self, features: np.ndarray) -> List[Dict]:
+        """Ensemble prediction for an (N, n_features) matrix: one scaler and one model call each"""
+        if self.cascade is not None and self.cascade.enabled:
+            results = self.predict_cascade_batch(features)
+        else:
+            results = self.predict_full_ensemble_batch(features)
+        if self.shadows.active:
+            # Off the critical path: shadows score the same matrix on a background thread
+            self.shadows.observe(features, self.feature_columns, results)
+        return results
+
+    def predict_cascade_batch(self, features: np.ndarray) -> List[Dict]:
+        """Stage one scores every row; only rows inside the uncertain band reach the full ensemble"""
+        stage_one_proba, escalate = self.cascade.split(features)
+        results: List[Dict] = [None] * len(stage_one_proba)
+        escalated = np.flatnonzero(escalate)
+        if len(escalated):
+            for index, result in zip(escalated, self.predict_full_ensemble_batch(features[escalated])):
+                result["model_details"]["cascade_probability"] = float(stage_one_proba[index])
+                result["model_details"]["cascade_stage"] = "ensemble"
+                results[index] = result
+        for index in np.flatnonzero(~escalate):
+            results[index] = self._cascade_result(stage_one_proba[index])
+        return results
+
+    def predict_full_ensemble_batch(self, features: np.ndarray) -> List[Dict]:
+        if self.native_engine is not None:
+            proba = self.native_engine.predict_proba(features)
+            return [
+                self._ensemble_result(proba["xgb"][i], proba["lgb"][i], proba["rf"][i], proba["ensemble"][i])
+                for i in range(len(proba["ensemble"]))
+            ]
+        
         # Scale features
         features_scaled = self.scaler.transform(features)
         
         # Get predictions from each model
-        xgb_proba = self.xgb_model.predict_proba(features_scaled)[0, 1]
-        lgb_proba = self.lgb_model.predict_proba(features_scaled)[0, 1]
-        rf_proba = self.rf_model.predict_proba(features_scaled)[0, 1]
+        xgb_proba = self.xgb_model.predict_proba(features_scaled)[:, 1]
+        lgb_proba = self.lgb_model.predict_proba(features_scaled)[:, 1]
+        rf_proba = self.rf_model.predict_proba(features_scaled)[:, 1]
         
         # Weighted ensemble
         ensemble_proba = (
@@ -117,6 +249,12 @@ class MLEngine:
             self.ensemble_config['rf_weight'] * rf_proba
         )
         
+        return [
+            self._ensemble_result(xgb_proba[i], lgb_proba[i], rf_proba[i], ensemble_proba[i])
+            for i in range(len(ensemble_proba))
+        ]
+
+    def _ensemble_result(self, xgb_proba: float, lgb_proba: float, rf_proba: float, ensemble_proba: float) -> Dict:
         # Convert to score (0-1000)
         score = int(ensemble_proba * 1000)
         confidence = max(xgb_proba, lgb_proba, rf_proba)  # Use max as confidence
@@ -141,6 +279,22 @@ class MLEngine:
             }
         }
 
+    def _cascade_result(self, stage_one_proba: float) -> Dict:
+        score = int(stage_one_proba * 1000)
+        if score > 500:
+            reason = "High fraud probability (Cascade early exit)"
+        else:
+            reason = "Low fraud probability (Cascade early exit)"
+        return {
+            "score": score,
+            "confidence": float(max(stage_one_proba, 1 - stage_one_proba)),
+            "reason": reason,
+            "model_details": {
+                "cascade_probability": float(stage_one_proba),
+                "cascade_stage": "early_exit"
+            }
+        }
+
     def predict_rule_based(self, features: dict) -> Dict:
         """Fallback rule-based prediction"""
         amount = features.get("amount", 0)
@@ -155,8 +309,11 @@ class MLEngine:
     def predict(self, transaction_data: dict) -> dict:
         """
         Main prediction method
-        Returns a risk score (0-1000) and confidence (0.0-1.0)
+        Returns a risk score (0-1000) and confidence (0.0-1.0). Raises
+        ModelsNotReadyError when models failed to load and the rule-based
+        fallback is not allowed, so callers leave the event FAILED for retry.
         """
+        self._require_ready()
         features = self.extract_features(transaction_data)
         
         if self.use_ensemble:
@@ -164,5 +321,17 @@ class MLEngine:
         else:
             return self.predict_rule_based(features)
 
-# Global instance
-ml_engine = MLEngine()
+    def predict_batch(self, transactions: List[dict]) -> List[dict]:
+        """
+        Vectorized predict: builds one feature matrix and runs each model once
+        over it. Returns one result per transaction, identical to predict().
+        """
+        if not transactions:
+            return []
+        self._require_ready()
+        if not self.use_ensemble:
+            return [self.predict_rule_based(self.extract_features(t)) for t in transactions]
+        return self.predict_ensemble_batch(self.pipeline.transform(transactions))
+
+# Global instance; loads in the background so importing this module (and app startup) does not block
+ml_engine = MLEngine(background=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, JSON, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, JSON, Text, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -50,6 +50,7 @@ class IngestedEventStatus(str, enum.Enum):
     PROCESSING = "PROCESSING"
     PROCESSED = "PROCESSED"
     FAILED = "FAILED"
+    DEAD_LETTER = "DEAD_LETTER"
 
 class IngestedEvent(Base):
     __tablename__ = "ingested_events"
@@ -74,6 +75,35 @@ class IngestedEvent(Base):
     event_snapshot = relationship("EventSnapshot", back_populates="event", uselist=False)
 
 
+class EventRetry(Base):
+    __tablename__ = "event_retries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ingested_event_id = Column(Integer, ForeignKey("ingested_events.id"), unique=True, nullable=False)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, index=True, nullable=True)
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    event = relationship("IngestedEvent")
+
+
+class DeadLetterEvent(Base):
+    __tablename__ = "dead_letter_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ingested_event_id = Column(Integer, ForeignKey("ingested_events.id"), unique=True, nullable=False)
+    event_id = Column(String, index=True, nullable=False)
+    source_system = Column(String)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    dead_lettered_at = Column(DateTime, default=datetime.datetime.utcnow)
+    replayed_at = Column(DateTime, nullable=True)
+    replay_status = Column(String, nullable=True)
+
+    event = relationship("IngestedEvent")
+
+
 class EnrichedEventContext(Base):
     __tablename__ = "enriched_event_contexts"
 
@@ -227,3 +257,88 @@ class User(Base):
     mfa_secret = Column(String, nullable=True)  # For 2FA
     mfa_enabled = Column(Integer, default=0)
 
+
+
+class ReplayRunStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+
+class ReplayRun(Base):
+    __tablename__ = "replay_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=True)
+    status = Column(String, default=ReplayRunStatus.PENDING.value)
+    window_start = Column(DateTime, nullable=True)
+    window_end = Column(DateTime, nullable=True)
+    model_dir = Column(String, nullable=True)
+    rules = Column(JSON, nullable=True)
+    total_events = Column(Integer, default=0)
+    changed_status = Column(Integer, default=0)
+    changed_action = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    results = relationship("ReplayResult", back_populates="run")
+
+
+class ReplayResult(Base):
+    __tablename__ = "replay_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("replay_runs.id"), index=True, nullable=False)
+    ingested_event_id = Column(Integer, ForeignKey("ingested_events.id"), nullable=False)
+    event_id = Column(String, index=True)
+    original_status = Column(String)
+    original_score = Column(Float)
+    original_action = Column(String)
+    replay_status = Column(String)
+    replay_score = Column(Float)
+    replay_action = Column(String)
+    rule_ids = Column(JSON)
+    error = Column(Text, nullable=True)
+
+    run = relationship("ReplayRun", back_populates="results")
+
+
+class RuleSet(Base):
+    """A versioned rule list; the one row with is_active=1 is served by every worker"""
+    __tablename__ = "rule_sets"
+    # At most one active row, even when two activations race
+    __table_args__ = (
+        Index(
+            "ix_rule_sets_single_active", "is_active", unique=True,
+            sqlite_where=text("is_active = 1"), postgresql_where=text("is_active = 1"),
+        ),
+    )
+
+    version = Column(Integer, primary_key=True, index=True)
+    rules = Column(JSON, nullable=False)
+    notes = Column(Text, nullable=True)
+    is_active = Column(Integer, default=0, index=True)
+    created_by = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    activated_at = Column(DateTime, nullable=True)
+
+
+class RuleBacktestRun(Base):
+    """A candidate rule set evaluated over a snapshot window; statuses follow ReplayRunStatus"""
+    __tablename__ = "rule_backtest_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, default=ReplayRunStatus.PENDING.value)
+    window_start = Column(DateTime, nullable=True)
+    window_end = Column(DateTime, nullable=True)
+    rules = Column(JSON, nullable=False)
+    max_overlaps = Column(Integer, default=50)
+    summary = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_by = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
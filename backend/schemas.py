@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 
 class TransactionBase(BaseModel):
@@ -59,6 +59,33 @@ class IngestTransactionResponse(BaseModel):
     message: str
 
 
+class IngestTransactionBatchResponse(BaseModel):
+    total: int
+    processed: int
+    failed: int
+    results: List[IngestTransactionResponse]
+
+
+class DeadLetterEventResponse(BaseModel):
+    id: int
+    ingested_event_id: int
+    event_id: str
+    source_system: Optional[str]
+    attempts: int
+    last_error: Optional[str]
+    dead_lettered_at: datetime
+    replayed_at: Optional[datetime]
+    replay_status: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+
+class DeadLetterReplayRequest(BaseModel):
+    ids: Optional[List[int]] = None
+    limit: int = 500
+
+
 class EnrichedContextResponse(BaseModel):
     geo_country: Optional[str]
     geo_city: Optional[str]
@@ -70,3 +97,99 @@ class EnrichedContextResponse(BaseModel):
     signals: dict
     derived_features: dict
     explanations: dict
+
+
+class ModelVersionCreate(BaseModel):
+    source_dir: str
+    version: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class ShadowModelCreate(BaseModel):
+    version: str
+
+
+class RuleSetCreate(BaseModel):
+    rules: List[dict]
+    notes: Optional[str] = None
+    activate: bool = False
+
+
+class RuleSetResponse(BaseModel):
+    version: int
+    notes: Optional[str]
+    is_active: bool
+    created_by: Optional[str]
+    created_at: datetime
+    activated_at: Optional[datetime]
+    rules: List[dict]
+
+    class Config:
+        from_attributes = True
+
+
+class RuleBacktestRequest(BaseModel):
+    rules: List[dict]
+    window_start: Optional[datetime] = None
+    window_end: Optional[datetime] = None
+    max_overlaps: int = Field(50, ge=0, le=1000)
+
+
+class RuleBacktestRunResponse(BaseModel):
+    id: int
+    status: str
+    window_start: Optional[datetime]
+    window_end: Optional[datetime]
+    max_overlaps: int
+    summary: Optional[dict]
+    error: Optional[str]
+    created_by: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class ReplayRunCreate(BaseModel):
+    name: Optional[str] = None
+    window_start: Optional[datetime] = None
+    window_end: Optional[datetime] = None
+    model_dir: Optional[str] = None
+    rules: Optional[List[dict]] = None
+
+
+class ReplayRunResponse(BaseModel):
+    id: int
+    name: Optional[str]
+    status: str
+    window_start: Optional[datetime]
+    window_end: Optional[datetime]
+    model_dir: Optional[str]
+    total_events: int
+    changed_status: int
+    changed_action: int
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class ReplayResultResponse(BaseModel):
+    ingested_event_id: int
+    event_id: str
+    original_status: Optional[str]
+    original_score: Optional[float]
+    original_action: Optional[str]
+    replay_status: Optional[str]
+    replay_score: Optional[float]
+    replay_action: Optional[str]
+    rule_ids: Optional[List[str]]
+    error: Optional[str]
+
+    class Config:
+        from_attributes = True
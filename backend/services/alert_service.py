@@ -3,11 +3,11 @@ from sqlalchemy.orm import Session
 import models
 
 
-def create_alert_from_event(db: Session, event: models.IngestedEvent, transaction: models.Transaction, rule_hits: list):
+def build_alert_from_event(event: models.IngestedEvent, transaction: models.Transaction, rule_hits: list):
     if not rule_hits:
         return None
     top_hit = rule_hits[0]
-    alert = models.Alert(
+    return models.Alert(
         ingested_event_id=event.id,
         transaction_id=transaction.id,
         severity=top_hit["severity"],
@@ -15,6 +15,12 @@ def create_alert_from_event(db: Session, event: models.IngestedEvent, transactio
         notes=top_hit.get("reason"),
         created_at=datetime.datetime.utcnow()
     )
+
+
+def create_alert_from_event(db: Session, event: models.IngestedEvent, transaction: models.Transaction, rule_hits: list):
+    alert = build_alert_from_event(event, transaction, rule_hits)
+    if not alert:
+        return None
     db.add(alert)
     db.commit()
     db.refresh(alert)
@@ -0,0 +1,339 @@
+"""
+Offline bulk loading of historical transaction events.
+
+Input files (JSONL, CSV or Parquet) are read in batches, scored in a process
+pool with the same enrichment/rules/ML code as live ingestion, and written
+with Core executemany inserts (COPY on PostgreSQL). Primary keys for events
+and transactions are allocated up front from the current table maxima, so the
+loader must be the only writer to those tables while it runs.
+"""
+import collections
+import csv
+import datetime
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from services.event_ingestor import build_dependent_rows, build_event_record, score_transaction_events
+from services.event_repository import add_to_metric_totals, apply_metric_totals, metric_day, new_metric_totals
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_FIELDS = tuple(schemas.TransactionCreate.model_fields)
+EVENT_FIELDS = ("event_id", "source_system", "channel", "priority", "ingestion_timestamp")
+DEFAULT_SOURCE_SYSTEM = "backfill"
+
+# Insert order respects foreign keys.
+TABLE_ORDER = (
+    "transactions",
+    "risk_scores",
+    "ingested_events",
+    "enriched_event_contexts",
+    "rule_evaluations",
+    "automated_actions",
+    "alerts",
+    "event_snapshots",
+)
+_TABLES = {table.name: table for table in models.Base.metadata.sorted_tables}
+
+
+# --- Reading --------------------------------------------------------------------
+
+def detect_format(path: str) -> str:
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if suffix in (".csv", ".tsv"):
+        return "csv"
+    if suffix in (".parquet", ".pq"):
+        return "parquet"
+    raise ValueError(f"Cannot infer input format from '{path}', pass --format")
+
+
+def _row_to_event(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Accepts nested TransactionEvent dicts or flat rows with transaction columns"""
+    if "transaction" in row and row["transaction"] not in (None, ""):
+        transaction = row["transaction"]
+        if isinstance(transaction, str):
+            transaction = json.loads(transaction)
+    else:
+        transaction = {k: row[k] for k in TRANSACTION_FIELDS if row.get(k) not in (None, "")}
+
+    event = {k: row[k] for k in EVENT_FIELDS if row.get(k) not in (None, "")}
+    event.setdefault("source_system", DEFAULT_SOURCE_SYSTEM)
+    event["transaction"] = transaction
+    return event
+
+
+def read_rows(path: str, fmt: str | None = None) -> Iterator[Dict[str, Any]]:
+    """Streams raw event dicts from a JSONL, CSV or Parquet file"""
+    fmt = fmt or detect_format(path)
+    if fmt == "jsonl":
+        with open(path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    yield _row_to_event(json.loads(line))
+    elif fmt == "csv":
+        with open(path, "r", encoding="utf-8", newline="") as handle:
+            delimiter = "\t" if path.lower().endswith(".tsv") else ","
+            for row in csv.DictReader(handle, delimiter=delimiter):
+                yield _row_to_event(row)
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError("Parquet input requires pyarrow (pip install pyarrow)") from exc
+        for batch in pq.ParquetFile(path).iter_batches():
+            for row in batch.to_pylist():
+                yield _row_to_event(row)
+    else:
+        raise ValueError(f"Unsupported input format: {fmt}")
+
+
+def iter_batches(rows: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- Scoring (runs in worker processes) ------------------------------------------
+
+def _column_values(obj) -> Dict[str, Any]:
+    values = {}
+    for column in obj.__table__.columns:
+        value = getattr(obj, column.key)
+        # Leave unset defaults and unallocated primary keys to the database.
+        if value is None and (column.primary_key or column.default is not None):
+            continue
+        values[column.key] = value
+    return values
+
+
+def score_batch(rows: List[Dict[str, Any]], first_event_pk: int, first_transaction_pk: int) -> Dict[str, Any]:
+    """
+    Validates and scores a batch of raw events. Row i gets primary keys
+    first_event_pk + i and first_transaction_pk + i; invalid rows leave gaps.
+    Returns table rows ready for insertion plus per-day metric totals.
+    """
+    tables: Dict[str, List[Dict[str, Any]]] = collections.defaultdict(list)
+    metric_totals: Dict[datetime.datetime, Dict[str, Any]] = {}
+    errors: List[str] = []
+
+    valid = []
+    for offset, row in enumerate(rows):
+        try:
+            valid.append((offset, schemas.TransactionEvent.model_validate(row)))
+        except ValidationError as exc:
+            errors.append(f"{row.get('event_id')}: {exc}")
+
+    for (offset, event), scored in zip(valid, score_transaction_events([event for _, event in valid])):
+        if isinstance(scored, Exception):
+            errors.append(f"{event.event_id}: {scored}")
+            continue
+
+        transaction = scored["transaction"]
+        transaction.id = first_transaction_pk + offset
+        risk = transaction.risk_score
+        risk.transaction_id = transaction.id
+
+        event_record = build_event_record(event, scored)
+        event_record.id = first_event_pk + offset
+        event_record.processed_transaction_id = transaction.id
+
+        tables["transactions"].append(_column_values(transaction))
+        tables["risk_scores"].append(_column_values(risk))
+        tables["ingested_events"].append(_column_values(event_record))
+        for dependent in build_dependent_rows(event_record, transaction, scored):
+            tables[dependent.__tablename__].append(_column_values(dependent))
+
+        totals = metric_totals.setdefault(metric_day(transaction.timestamp), new_metric_totals())
+        add_to_metric_totals(totals, transaction.status, transaction.amount, risk.score)
+
+    return {"tables": dict(tables), "metric_totals": metric_totals, "errors": errors}
+
+
+# --- Writing ---------------------------------------------------------------------
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    elif isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy_rows(connection, table_name: str, rows: List[Dict[str, Any]]):
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row.get(column)) for column in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def write_batch(engine: Engine, scored: Dict[str, Any]):
+    """Writes one scored batch and its metric totals in a single transaction"""
+    use_copy = engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+    with engine.begin() as connection:
+        for table_name in TABLE_ORDER:
+            rows = scored["tables"].get(table_name)
+            if not rows:
+                continue
+            if use_copy:
+                _copy_rows(connection, table_name, rows)
+            else:
+                connection.execute(insert(_TABLES[table_name]), rows)
+        with Session(bind=connection) as session:
+            apply_metric_totals(session, scored["metric_totals"])
+            session.flush()
+
+
+def _max_id(engine: Engine, model) -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.max(model.id))).scalar() or 0
+
+
+def _sync_sequences(engine: Engine):
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as connection:
+        for table_name in TABLE_ORDER:
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table_name}), 1))"
+            ))
+
+
+def _filter_known(engine: Engine, rows: List[Dict[str, Any]], seen_events: set, seen_transactions: set) -> tuple:
+    """Drops events whose event_id or transaction_id already exist in the database or this run"""
+    event_ids = [row.get("event_id") for row in rows]
+    transaction_ids = [(row.get("transaction") or {}).get("transaction_id") for row in rows]
+    with engine.connect() as connection:
+        known_events = set(connection.execute(
+            select(models.IngestedEvent.event_id).where(models.IngestedEvent.event_id.in_([e for e in event_ids if e]))
+        ).scalars())
+        known_transactions = set(connection.execute(
+            select(models.Transaction.transaction_id).where(models.Transaction.transaction_id.in_([t for t in transaction_ids if t]))
+        ).scalars())
+
+    fresh = []
+    for row, event_id, transaction_id in zip(rows, event_ids, transaction_ids):
+        if event_id in known_events or event_id in seen_events or transaction_id in known_transactions or transaction_id in seen_transactions:
+            continue
+        seen_events.add(event_id)
+        seen_transactions.add(transaction_id)
+        fresh.append(row)
+    return fresh, len(rows) - len(fresh)
+
+
+# --- Checkpointing -----------------------------------------------------------------
+
+def load_checkpoint(path: str | None) -> Dict[str, int]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle).get("rows_committed", {})
+
+
+def save_checkpoint(path: str | None, rows_committed: Dict[str, int]):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump({"rows_committed": rows_committed, "updated_at": datetime.datetime.utcnow().isoformat()}, handle)
+    os.replace(tmp_path, path)
+
+
+# --- Driver --------------------------------------------------------------------------
+
+def load_files(
+    engine: Engine,
+    paths: List[str],
+    fmt: str | None = None,
+    batch_size: int = 5000,
+    workers: int | None = None,
+    checkpoint_path: str | None = None,
+) -> Dict[str, Any]:
+    """
+    Loads every file in order. Batches are scored concurrently but committed in
+    input order, and the checkpoint records how many source rows of each file
+    have been committed, so an interrupted run resumes where it stopped.
+    """
+    workers = workers or os.cpu_count() or 1
+    rows_committed = load_checkpoint(checkpoint_path)
+    next_event_pk = _max_id(engine, models.IngestedEvent) + 1
+    next_transaction_pk = _max_id(engine, models.Transaction) + 1
+    seen_events: set = set()
+    seen_transactions: set = set()
+    summary = {"read": 0, "loaded": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    started = time.monotonic()
+
+    # Spawned, not forked: ml_engine's background loader thread is already running in this process.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for path in paths:
+            key = os.path.abspath(path)
+            skip = rows_committed.get(key, 0)
+            if skip:
+                logger.info(f"Resuming {path} after {skip:,} committed rows")
+            consumed = skip
+            in_flight: collections.deque = collections.deque()
+
+            def drain(limit: int):
+                nonlocal consumed
+                while len(in_flight) > limit:
+                    future, source_rows = in_flight.popleft()
+                    scored = future.result()
+                    write_batch(engine, scored)
+                    written = len(scored["tables"].get("ingested_events", []))
+                    summary["loaded"] += written
+                    summary["invalid"] += len(scored["errors"])
+                    summary["errors"].extend(scored["errors"][:10 - len(summary["errors"])])
+                    consumed += source_rows
+                    rows_committed[key] = consumed
+                    save_checkpoint(checkpoint_path, rows_committed)
+
+            rows = read_rows(path, fmt)
+            for _ in range(skip):
+                next(rows, None)
+
+            for batch in iter_batches(rows, batch_size):
+                summary["read"] += len(batch)
+                fresh, duplicates = _filter_known(engine, batch, seen_events, seen_transactions)
+                summary["duplicates"] += duplicates
+                future = pool.submit(score_batch, fresh, next_event_pk, next_transaction_pk)
+                next_event_pk += len(fresh)
+                next_transaction_pk += len(fresh)
+                in_flight.append((future, len(batch)))
+                drain(workers * 2)
+            drain(0)
+            logger.info(f"Finished {path}: {consumed:,} rows committed")
+
+    _sync_sequences(engine)
+    elapsed = time.monotonic() - started
+    summary["elapsed_seconds"] = round(elapsed, 2)
+    summary["events_per_second"] = round(summary["loaded"] / elapsed, 1) if elapsed else 0.0
+    return summary
@@ -6,25 +6,17 @@ import models
 from sqlalchemy.orm import Session
 
 from data.reference_data import (
-    HIGH_RISK_IP_RANGES,
-    KNOWN_SAFE_IP_RANGES,
     DEVICE_RISK_PROFILES,
     COUNTRY_LAT_LON,
     USER_SEGMENTS,
     infer_segment_from_user,
 )
 import schemas
+from services.ip_reputation import lookup_ip_reputation
 
 
 def _lookup_ip_reputation(ip_address: str) -> Dict[str, Any]:
-    prefix = ip_address.split(".", 1)[0] + "."
-    if ip_address.startswith(tuple(HIGH_RISK_IP_RANGES.keys())):
-        data = HIGH_RISK_IP_RANGES[prefix]
-        return {"reputation": data["reputation"], "risk_score": data["risk_score"]}
-    if ip_address.startswith(tuple(KNOWN_SAFE_IP_RANGES.keys())):
-        data = KNOWN_SAFE_IP_RANGES[prefix]
-        return {"reputation": data["reputation"], "risk_score": data["risk_score"]}
-    return {"reputation": "unknown", "risk_score": 0.35}
+    return lookup_ip_reputation(ip_address)
 
 
 def _detect_device_profile(device_id: str) -> Dict[str, str]:
@@ -105,8 +97,8 @@ def enrich_transaction_event(event: schemas.TransactionEvent) -> Dict[str, Any]:
     }
 
 
-def store_enriched_context(db: Session, ingested_event_id: int, context: Dict[str, Any]) -> models.EnrichedEventContext:
-    record = models.EnrichedEventContext(
+def build_enriched_context(context: Dict[str, Any], ingested_event_id: int | None = None) -> models.EnrichedEventContext:
+    return models.EnrichedEventContext(
         ingested_event_id=ingested_event_id,
         geo_country=context["geo_country"],
         geo_city=context["geo_city"],
@@ -121,6 +113,10 @@ def store_enriched_context(db: Session, ingested_event_id: int, context: Dict[st
         explanations=context["explanations"],
         created_at=datetime.datetime.utcnow(),
     )
+
+
+def store_enriched_context(db: Session, ingested_event_id: int, context: Dict[str, Any]) -> models.EnrichedEventContext:
+    record = build_enriched_context(context, ingested_event_id)
     db.add(record)
     db.commit()
     db.refresh(record)
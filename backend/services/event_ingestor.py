@@ -1,79 +1,181 @@
 import datetime
+import logging
+from typing import Any, Dict, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 import models
 import schemas
-from services.transaction_service import create_transaction_record
-from services.enrichment_service import enrich_transaction_event, store_enriched_context
+import ml_engine
+from services.transaction_service import create_transaction_record, build_transaction_record
+from services.enrichment_service import enrich_transaction_event, store_enriched_context, build_enriched_context
 from services.event_pipeline import (
     run_processing_pipeline,
     persist_rule_hits,
     persist_automated_action,
+    build_rule_evaluations,
+    build_automated_action,
 )
-from services.event_repository import record_event_snapshot, update_event_metrics
-from services.alert_service import create_alert_from_event
+from services.event_repository import (
+    record_event_snapshot,
+    update_event_metrics,
+    build_event_snapshot,
+    apply_event_metrics_batch,
+)
+from services.alert_service import create_alert_from_event, build_alert_from_event
+from services.idempotency_index import idempotency_index
+from services.rule_compiler import CompiledRuleSet
+from services.rule_store import rule_store
+from services.scoring_batcher import scoring_batcher
 
+logger = logging.getLogger(__name__)
 
-def ingest_transaction_event(db: Session, event: schemas.TransactionEvent) -> schemas.IngestTransactionResponse:
-    existing = db.query(models.IngestedEvent).filter(models.IngestedEvent.event_id == event.event_id).first()
-    if existing and existing.processed_transaction_id:
-        return schemas.IngestTransactionResponse(
-            event_id=event.event_id,
-            status=existing.status,
-            transaction_id=existing.processed_transaction_id,
-            message="Event already processed"
-        )
 
-    payload = event.model_dump()
+def _build_transaction_payload(event: schemas.TransactionEvent, enrichment_context: Dict[str, Any]) -> schemas.TransactionCreate:
+    derived_features = enrichment_context.get("derived_features", {})
+    return event.transaction.model_copy(
+        update={
+            "avg_transaction_amount": derived_features.get("avg_transaction_amount"),
+            "transaction_frequency": derived_features.get("transaction_frequency"),
+            "days_since_last_transaction": derived_features.get("days_since_last_transaction"),
+            "velocity_flag": derived_features.get("velocity_flag"),
+            "device_change": derived_features.get("device_change"),
+            "ip_change": derived_features.get("ip_change"),
+            "location_change_speed": derived_features.get("location_change_speed"),
+            "metadata": {
+                "enrichment_signals": enrichment_context.get("signals"),
+                "user_segment": enrichment_context.get("user_segment"),
+            },
+        }
+    )
 
-    if not existing:
-        event_record = models.IngestedEvent(
-            event_id=event.event_id,
-            source_system=event.source_system,
-            channel=event.channel,
-            priority=event.priority or "normal",
-            event_type="TRANSACTION",
-            payload=payload,
-            status=models.IngestedEventStatus.RECEIVED.value,
-            received_at=event.ingestion_timestamp or datetime.datetime.utcnow()
-        )
-        db.add(event_record)
-        try:
-            db.commit()
-        except IntegrityError:
-            db.rollback()
-            event_record = db.query(models.IngestedEvent).filter(models.IngestedEvent.event_id == event.event_id).first()
-        db.refresh(event_record)
-    else:
-        event_record = existing
 
+def _new_event_record(event: schemas.TransactionEvent) -> models.IngestedEvent:
+    return models.IngestedEvent(
+        event_id=event.event_id,
+        source_system=event.source_system,
+        channel=event.channel,
+        priority=event.priority or "normal",
+        event_type="TRANSACTION",
+        payload=event.model_dump(mode="json"),
+        status=models.IngestedEventStatus.RECEIVED.value,
+        received_at=event.ingestion_timestamp or datetime.datetime.utcnow()
+    )
+
+
+def _already_processed_response(event_record: models.IngestedEvent) -> schemas.IngestTransactionResponse:
+    idempotency_index.remember(event_record.event_id, event_record.processed_transaction_id, event_record.status)
+    return schemas.IngestTransactionResponse(
+        event_id=event_record.event_id,
+        status=event_record.status,
+        transaction_id=event_record.processed_transaction_id,
+        message="Event already processed"
+    )
+
+
+def lookup_processed_event(event_id: str) -> schemas.IngestTransactionResponse | None:
+    """Answers a retried event from the in-memory idempotency index, without a DB read"""
+    cached = idempotency_index.lookup(event_id)
+    if not cached:
+        return None
+    return schemas.IngestTransactionResponse(
+        event_id=event_id,
+        status=cached["status"],
+        transaction_id=cached["transaction_id"],
+        message="Event already processed"
+    )
+
+
+def receive_transaction_event(db: Session, event: schemas.TransactionEvent) -> models.IngestedEvent:
+    """
+    Durably records the event as RECEIVED (or returns the existing record for a
+    repeated event_id) without running the processing pipeline.
+    """
+    # A Bloom miss means this process has not seen the event_id, so skip the
+    # lookup and let the unique constraint catch ids recorded elsewhere.
+    if idempotency_index.might_contain(event.event_id):
+        existing = db.query(models.IngestedEvent).filter(models.IngestedEvent.event_id == event.event_id).first()
+        if existing:
+            return existing
+
+    event_record = _new_event_record(event)
+    db.add(event_record)
     try:
-        event_record.status = models.IngestedEventStatus.PROCESSING.value
         db.commit()
+    except IntegrityError:
+        db.rollback()
+        event_record = db.query(models.IngestedEvent).filter(models.IngestedEvent.event_id == event.event_id).first()
+    db.refresh(event_record)
+    idempotency_index.add(event.event_id)
+    return event_record
+
+
+def claim_ingested_event(db: Session, event_record: models.IngestedEvent, from_status: str) -> bool:
+    """
+    Moves the event to PROCESSING if it is still in from_status, with a single
+    conditional UPDATE, so that of several workers (threads, uvicorn
+    processes, retry schedulers) offered the same event exactly one runs it.
+    While PROCESSING, processed_at holds the claim time (see
+    RetryScheduler.release_stale). Returns False when another worker has it.
+    """
+    claimed = db.query(models.IngestedEvent).filter(
+        models.IngestedEvent.id == event_record.id,
+        models.IngestedEvent.status == from_status,
+    ).update(
+        {
+            models.IngestedEvent.status: models.IngestedEventStatus.PROCESSING.value,
+            models.IngestedEvent.processed_at: datetime.datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    db.refresh(event_record)
+    return claimed == 1
+
 
+# Statuses a resubmitted event is run again from; PROCESSING belongs to another worker
+RECLAIMABLE_STATUSES = (
+    models.IngestedEventStatus.RECEIVED.value,
+    models.IngestedEventStatus.FAILED.value,
+)
+
+
+def _not_claimed_response(event_record: models.IngestedEvent) -> schemas.IngestTransactionResponse:
+    if event_record.processed_transaction_id:
+        return _already_processed_response(event_record)
+    if event_record.status == models.IngestedEventStatus.DEAD_LETTER.value:
+        message = "Event is dead-lettered; replay it with POST /ingest/dead-letters/replay"
+    else:
+        message = f"Event is {event_record.status} and handled by another worker"
+    return schemas.IngestTransactionResponse(event_id=event_record.event_id, status=event_record.status, message=message)
+
+
+def process_ingested_event(
+    db: Session,
+    event_record: models.IngestedEvent,
+    event: schemas.TransactionEvent | None = None,
+) -> schemas.IngestTransactionResponse:
+    """
+    Runs enrichment, rules, scoring and persistence for a RECEIVED event. The
+    event is rebuilt from the stored payload when not supplied. A resubmitted
+    FAILED event is re-run at once (see reprocess_failed_event), as the batch
+    path does; an event that another worker has already claimed is left alone.
+    """
+    if event_record.processed_transaction_id:
+        return _already_processed_response(event_record)
+    if event_record.status == models.IngestedEventStatus.FAILED.value:
+        return _reprocess_resubmitted_event(db, event_record)
+    if not claim_ingested_event(db, event_record, models.IngestedEventStatus.RECEIVED.value):
+        return _not_claimed_response(event_record)
+
+    try:
+        if event is None:
+            event = schemas.TransactionEvent.model_validate(event_record.payload)
         enrichment_context = enrich_transaction_event(event)
         store_enriched_context(db, event_record.id, enrichment_context)
-        payload = event_record.payload or {}
-        payload["enrichment"] = enrichment_context
-        event_record.payload = payload
+        event_record.payload = {**(event_record.payload or {}), "enrichment": enrichment_context}
         db.commit()
 
-        derived_features = enrichment_context.get("derived_features", {})
-        transaction_payload = event.transaction.model_copy(
-            update={
-                "avg_transaction_amount": derived_features.get("avg_transaction_amount"),
-                "transaction_frequency": derived_features.get("transaction_frequency"),
-                "days_since_last_transaction": derived_features.get("days_since_last_transaction"),
-                "velocity_flag": derived_features.get("velocity_flag"),
-                "device_change": derived_features.get("device_change"),
-                "ip_change": derived_features.get("ip_change"),
-                "location_change_speed": derived_features.get("location_change_speed"),
-                "metadata": {
-                    "enrichment_signals": enrichment_context.get("signals"),
-                    "user_segment": enrichment_context.get("user_segment"),
-                },
-            }
-        )
+        transaction_payload = _build_transaction_payload(event, enrichment_context)
 
         pipeline_result = run_processing_pipeline(event, enrichment_context)
         decision = pipeline_result["decision"]
@@ -93,6 +195,7 @@ def ingest_transaction_event(db: Session, event: schemas.TransactionEvent) -> sc
         record_event_snapshot(db, event_record, transaction, enrichment_context, decision, rule_hits)
         update_event_metrics(db, transaction)
 
+        idempotency_index.remember(event.event_id, transaction.id, event_record.status)
         return schemas.IngestTransactionResponse(
             event_id=event.event_id,
             status=event_record.status,
@@ -108,3 +211,349 @@ def ingest_transaction_event(db: Session, event: schemas.TransactionEvent) -> sc
         db.commit()
         raise
 
+
+def ingest_transaction_event(db: Session, event: schemas.TransactionEvent) -> schemas.IngestTransactionResponse:
+    cached = lookup_processed_event(event.event_id)
+    if cached:
+        return cached
+    event_record = receive_transaction_event(db, event)
+    return process_ingested_event(db, event_record, event)
+
+
+def score_transaction_event(
+    event: schemas.TransactionEvent,
+    engine: ml_engine.MLEngine | None = None,
+    rules: List[Dict[str, Any]] | CompiledRuleSet | None = None,
+) -> Dict[str, Any]:
+    """
+    Runs enrichment, rules and scoring for one event and returns an unsaved
+    Transaction (with its RiskScore) plus the context needed for dependent rows.
+    Touches no database state, so it is safe to call from worker processes.
+    engine and rules default to the production model and the active rule set.
+    """
+    scored = score_transaction_events([event], engine, rules)[0]
+    if isinstance(scored, Exception):
+        raise scored
+    return scored
+
+
+def score_transaction_events(
+    events: List[schemas.TransactionEvent],
+    engine: ml_engine.MLEngine | None = None,
+    rules: List[Dict[str, Any]] | CompiledRuleSet | None = None,
+) -> List[Dict[str, Any] | Exception]:
+    """
+    Batch form of score_transaction_event: enrichment and rules run per event,
+    the model runs once over all of them via MLEngine.predict_batch. An event
+    that fails gets its exception in its slot instead of failing the batch.
+    """
+    # Single production-model calls are coalesced with concurrent callers by the micro-batcher.
+    batcher = engine is None and len(events) == 1
+    engine = engine or ml_engine.ml_engine
+    # One rule set version for the whole batch, even if a new one is activated meanwhile
+    rules = rules if rules is not None else rule_store.current()
+    prepared: List[Dict[str, Any] | Exception] = []
+    for event in events:
+        try:
+            enrichment_context = enrich_transaction_event(event)
+            transaction_payload = _build_transaction_payload(event, enrichment_context)
+            pipeline_result = run_processing_pipeline(event, enrichment_context, rules)
+            prepared.append({
+                "payload": transaction_payload,
+                "enrichment_context": enrichment_context,
+                "decision": pipeline_result["decision"],
+                "rule_hits": pipeline_result["rule_hits"],
+            })
+        except Exception as exc:
+            prepared.append(exc)
+
+    ready = [item for item in prepared if not isinstance(item, Exception)]
+    try:
+        if batcher and ready:
+            risk_results = [scoring_batcher.predict(ready[0]["payload"].model_dump())]
+        else:
+            risk_results = engine.predict_batch([item["payload"].model_dump() for item in ready])
+    except Exception:
+        # Isolate the event the model rejects instead of failing all of them.
+        risk_results = []
+        for item in ready:
+            try:
+                risk_results.append(engine.predict(item["payload"].model_dump()))
+            except Exception as exc:
+                risk_results.append(exc)
+
+    results: List[Dict[str, Any] | Exception] = []
+    risk_iter = iter(risk_results)
+    for item in prepared:
+        if isinstance(item, Exception):
+            results.append(item)
+            continue
+        risk_result = next(risk_iter)
+        if isinstance(risk_result, Exception):
+            results.append(risk_result)
+            continue
+        results.append({
+            "transaction": build_transaction_record(item["payload"], risk_result, item["decision"]),
+            "enrichment_context": item["enrichment_context"],
+            "decision": item["decision"],
+            "rule_hits": item["rule_hits"],
+        })
+    return results
+
+
+def build_event_record(event: schemas.TransactionEvent, scored: Dict[str, Any]) -> models.IngestedEvent:
+    """Builds an unsaved IngestedEvent already marked PROCESSED for a scored event"""
+    event_record = _new_event_record(event)
+    _mark_event_processed(event_record, scored)
+    return event_record
+
+
+def _mark_event_processed(event_record: models.IngestedEvent, scored: Dict[str, Any]):
+    event_record.payload = {**(event_record.payload or {}), "enrichment": scored["enrichment_context"]}
+    event_record.status = models.IngestedEventStatus.PROCESSED.value
+    event_record.processed_at = datetime.datetime.utcnow()
+    event_record.processing_error = None
+
+
+def _stage_processed_event(
+    event_record: models.IngestedEvent,
+    event: schemas.TransactionEvent,
+    scored: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    scored = scored or score_transaction_event(event)
+    _mark_event_processed(event_record, scored)
+    event_record.transaction = scored["transaction"]
+    return {"event_record": event_record, **scored}
+
+
+def build_dependent_rows(
+    event_record: models.IngestedEvent,
+    transaction: models.Transaction,
+    scored: Dict[str, Any],
+) -> List[Any]:
+    """
+    Builds the enrichment, rule, action, alert and snapshot rows for an event
+    whose IngestedEvent and Transaction ids are already known.
+    """
+    rule_hits = scored["rule_hits"]
+    rows = [build_enriched_context(scored["enrichment_context"], event_record.id)]
+    rows.extend(build_rule_evaluations(rule_hits, event_record.id, transaction.id))
+    action = build_automated_action(scored["decision"], event_record.id, transaction.id)
+    if action:
+        rows.append(action)
+    alert = build_alert_from_event(event_record, transaction, rule_hits)
+    if alert:
+        rows.append(alert)
+    rows.append(build_event_snapshot(event_record, transaction, scored["enrichment_context"], scored["decision"], rule_hits))
+    return rows
+
+
+def _discard_partial_results(db: Session, event_record: models.IngestedEvent, event: schemas.TransactionEvent):
+    """Deletes rows committed by an earlier attempt that failed part-way through the pipeline"""
+    for model in (
+        models.EnrichedEventContext,
+        models.RuleEvaluation,
+        models.AutomatedAction,
+        models.Alert,
+        models.EventSnapshot,
+    ):
+        db.query(model).filter(model.ingested_event_id == event_record.id).delete(synchronize_session=False)
+    transaction_ids = [event_record.processed_transaction_id] if event_record.processed_transaction_id else []
+    # create_transaction_record commits a PENDING transaction before scoring it;
+    # a failure in between leaves it unlinked to any event.
+    transaction_ids.extend(
+        transaction_id for (transaction_id,) in db.query(models.Transaction.id).filter(
+            models.Transaction.transaction_id == event.transaction.transaction_id,
+            models.Transaction.status == models.TransactionStatus.PENDING.value,
+            ~models.Transaction.ingested_events.any(),
+        )
+    )
+    if transaction_ids:
+        event_record.processed_transaction_id = None
+        db.flush()
+        db.query(models.RiskScore).filter(models.RiskScore.transaction_id.in_(transaction_ids)).delete(synchronize_session=False)
+        db.query(models.Transaction).filter(models.Transaction.id.in_(transaction_ids)).delete(synchronize_session=False)
+
+
+def reprocess_failed_event(db: Session, event_record: models.IngestedEvent) -> schemas.IngestTransactionResponse:
+    """
+    Re-runs a FAILED (or dead-lettered) event from its stored payload. Unlike
+    process_ingested_event, the retry is a single transaction: leftovers of the
+    failed attempt are discarded and every row is written with one commit, so a
+    retry that fails again leaves nothing behind. Errors propagate after rollback.
+    """
+    try:
+        event = schemas.TransactionEvent.model_validate(event_record.payload)
+        _discard_partial_results(db, event_record, event)
+        staged = _stage_processed_event(event_record, event)
+        db.flush()
+        transaction = staged["transaction"]
+        db.add_all(build_dependent_rows(event_record, transaction, staged))
+        apply_event_metrics_batch(db, [transaction])
+        db.flush()
+        response = schemas.IngestTransactionResponse(
+            event_id=event_record.event_id,
+            status=event_record.status,
+            transaction_id=transaction.id,
+            message="Transaction ingested and processed on retry"
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    idempotency_index.remember(response.event_id, response.transaction_id, response.status)
+    return response
+
+
+def _clear_scheduled_retry(db: Session, event_record: models.IngestedEvent):
+    db.query(models.EventRetry).filter(models.EventRetry.ingested_event_id == event_record.id).delete(synchronize_session=False)
+
+
+def _reprocess_resubmitted_event(db: Session, event_record: models.IngestedEvent) -> schemas.IngestTransactionResponse:
+    """Claims a FAILED event that was submitted again and re-runs it; a failure leaves it FAILED for the scheduler"""
+    if not claim_ingested_event(db, event_record, models.IngestedEventStatus.FAILED.value):
+        return _not_claimed_response(event_record)
+    try:
+        response = reprocess_failed_event(db, event_record)
+    except Exception as exc:
+        event_record.status = models.IngestedEventStatus.FAILED.value
+        event_record.processing_error = str(exc)
+        event_record.processed_at = datetime.datetime.utcnow()
+        db.commit()
+        raise
+    _clear_scheduled_retry(db, event_record)
+    db.commit()
+    return response
+
+
+def _ingest_individually(db: Session, events: List[schemas.TransactionEvent]) -> Dict[str, schemas.IngestTransactionResponse]:
+    results = {}
+    for event in events:
+        try:
+            results[event.event_id] = ingest_transaction_event(db, event)
+        except Exception as exc:
+            results[event.event_id] = schemas.IngestTransactionResponse(
+                event_id=event.event_id,
+                status=models.IngestedEventStatus.FAILED.value,
+                message=str(exc),
+            )
+    return results
+
+
+def _release_claims(db: Session, claimed: List[Tuple[models.IngestedEvent, str]]):
+    """Hands events claimed by a batch that could not commit back in their previous status"""
+    for event_record, previous_status in claimed:
+        db.query(models.IngestedEvent).filter(
+            models.IngestedEvent.id == event_record.id,
+            models.IngestedEvent.status == models.IngestedEventStatus.PROCESSING.value,
+        ).update({models.IngestedEvent.status: previous_status}, synchronize_session=False)
+    db.commit()
+
+
+def ingest_transaction_events_batch(
+    db: Session,
+    events: List[schemas.TransactionEvent],
+) -> List[schemas.IngestTransactionResponse]:
+    """
+    Ingests a batch of events as a single unit of work: one lookup for the event
+    ids the idempotency index has not answered, bulk inserts for every derived
+    row and one commit. Events already stored are claimed first (see
+    claim_ingested_event), so one owned by a queue worker or the retry
+    scheduler is not run twice. If the commit
+    is rejected (e.g. a transaction_id collision), the batch falls back to the
+    per-event path so one bad event cannot fail the others.
+    """
+    results: Dict[str, schemas.IngestTransactionResponse] = {}
+    unique_events: Dict[str, schemas.TransactionEvent] = {}
+    for event in events:
+        if event.event_id in unique_events or event.event_id in results:
+            continue
+        cached = lookup_processed_event(event.event_id)
+        if cached:
+            results[event.event_id] = cached
+        else:
+            unique_events[event.event_id] = event
+
+    # The index only knows this process's recent events (not other workers',
+    # or those from before a restart), so its misses cannot skip the lookup.
+    existing = {}
+    if unique_events:
+        existing = {
+            record.event_id: record
+            for record in db.query(models.IngestedEvent).filter(
+                models.IngestedEvent.event_id.in_(list(unique_events))
+            )
+        }
+
+    pending: List[schemas.TransactionEvent] = []
+    event_records: List[models.IngestedEvent] = []
+    staged: List[Dict[str, Any]] = []
+    errors: Dict[str, str] = {}
+    claimed: List[Tuple[models.IngestedEvent, str]] = []
+
+    for event_id, event in unique_events.items():
+        event_record = existing.get(event_id)
+        if event_record and event_record.processed_transaction_id:
+            results[event_id] = _already_processed_response(event_record)
+            continue
+
+        if event_record:
+            previous_status = event_record.status
+            if previous_status not in RECLAIMABLE_STATUSES or not claim_ingested_event(db, event_record, previous_status):
+                results[event_id] = _not_claimed_response(event_record)
+                continue
+            claimed.append((event_record, previous_status))
+            if previous_status == models.IngestedEventStatus.FAILED.value:
+                _discard_partial_results(db, event_record, event)
+        else:
+            event_record = _new_event_record(event)
+            db.add(event_record)
+        pending.append(event)
+        event_records.append(event_record)
+
+    for event, event_record, scored in zip(pending, event_records, score_transaction_events(pending)):
+        if isinstance(scored, Exception):
+            event_record.status = models.IngestedEventStatus.FAILED.value
+            event_record.processing_error = str(scored)
+            event_record.processed_at = datetime.datetime.utcnow()
+            errors[event.event_id] = str(scored)
+        else:
+            staged.append(_stage_processed_event(event_record, event, scored))
+            if event_record.id is not None:
+                # A re-run FAILED event; its attempt count is kept should it fail again.
+                _clear_scheduled_retry(db, event_record)
+
+    if pending:
+        try:
+            # Parents need their generated ids; dependents are written with executemany.
+            db.flush()
+            dependent_rows = []
+            for item in staged:
+                dependent_rows.extend(build_dependent_rows(item["event_record"], item["transaction"], item))
+            # bulk_save_objects only batches consecutive rows of the same mapper.
+            dependent_rows.sort(key=lambda row: type(row).__name__)
+            db.bulk_save_objects(dependent_rows)
+            apply_event_metrics_batch(db, [item["transaction"] for item in staged])
+            db.flush()
+            # Build responses before commit expires the flushed attributes.
+            for event_record in event_records:
+                results[event_record.event_id] = schemas.IngestTransactionResponse(
+                    event_id=event_record.event_id,
+                    status=event_record.status,
+                    transaction_id=event_record.processed_transaction_id,
+                    message=errors.get(event_record.event_id, "Transaction ingested and processed")
+                )
+            db.commit()
+            for response in results.values():
+                if response.transaction_id:
+                    idempotency_index.remember(response.event_id, response.transaction_id, response.status)
+                else:
+                    idempotency_index.add(response.event_id)
+        except SQLAlchemyError as exc:
+            db.rollback()
+            logger.warning(f"Batch commit failed, retrying {len(pending)} events individually: {exc}")
+            if claimed:
+                _release_claims(db, claimed)
+            results.update(_ingest_individually(db, pending))
+
+    return [results[event.event_id] for event in events]
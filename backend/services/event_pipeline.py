@@ -1,15 +1,20 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import datetime
 from sqlalchemy.orm import Session
 
 import models
 import schemas
+from services.rule_compiler import CompiledRuleSet
 from services.rule_engine import evaluate_rules, decide_action
 
 
-def run_processing_pipeline(event: schemas.TransactionEvent, enrichment_context: Dict[str, Any]) -> Dict[str, Any]:
+def run_processing_pipeline(
+    event: schemas.TransactionEvent,
+    enrichment_context: Dict[str, Any],
+    rules: List[Dict[str, Any]] | CompiledRuleSet | None = None,
+) -> Dict[str, Any]:
     transaction_dict = event.transaction.model_dump()
-    rule_hits = evaluate_rules(transaction_dict, enrichment_context)
+    rule_hits = evaluate_rules(transaction_dict, enrichment_context, rules)
     decision = decide_action(rule_hits)
     return {
         "rule_hits": rule_hits,
@@ -17,9 +22,9 @@ def run_processing_pipeline(event: schemas.TransactionEvent, enrichment_context:
     }
 
 
-def persist_rule_hits(db: Session, ingested_event_id: int, transaction_id: int, hits: List[Dict[str, Any]]):
-    for hit in hits:
-        evaluation = models.RuleEvaluation(
+def build_rule_evaluations(hits: List[Dict[str, Any]], ingested_event_id: int | None = None, transaction_id: int | None = None) -> List[models.RuleEvaluation]:
+    return [
+        models.RuleEvaluation(
             ingested_event_id=ingested_event_id,
             transaction_id=transaction_id,
             rule_id=hit["rule_id"],
@@ -30,27 +35,34 @@ def persist_rule_hits(db: Session, ingested_event_id: int, transaction_id: int,
             matched=1,
             created_at=datetime.datetime.utcnow()
         )
-        db.add(evaluation)
-    db.commit()
+        for hit in hits
+    ]
 
 
-def persist_automated_action(db: Session, ingested_event_id: int, transaction_id: int, decision: Dict[str, Any]):
-    if decision.get("action") in ("CHALLENGE", "BLOCK"):
-        action = models.AutomatedAction(
-            ingested_event_id=ingested_event_id,
-            transaction_id=transaction_id,
-            action_type=decision["action"],
-            status="EXECUTED",
-            details={
-                "reason": decision.get("reason"),
-                "triggered_rules": decision.get("triggered_rules", []),
-            },
-            created_at=datetime.datetime.utcnow(),
-            processed_at=datetime.datetime.utcnow()
-        )
-        db.add(action)
-        db.commit()
+def build_automated_action(decision: Dict[str, Any], ingested_event_id: int | None = None, transaction_id: int | None = None) -> Optional[models.AutomatedAction]:
+    if decision.get("action") not in ("CHALLENGE", "BLOCK"):
+        return None
+    return models.AutomatedAction(
+        ingested_event_id=ingested_event_id,
+        transaction_id=transaction_id,
+        action_type=decision["action"],
+        status="EXECUTED",
+        details={
+            "reason": decision.get("reason"),
+            "triggered_rules": decision.get("triggered_rules", []),
+        },
+        created_at=datetime.datetime.utcnow(),
+        processed_at=datetime.datetime.utcnow()
+    )
 
 
+def persist_rule_hits(db: Session, ingested_event_id: int, transaction_id: int, hits: List[Dict[str, Any]]):
+    db.add_all(build_rule_evaluations(hits, ingested_event_id, transaction_id))
+    db.commit()
 
 
+def persist_automated_action(db: Session, ingested_event_id: int, transaction_id: int, decision: Dict[str, Any]):
+    action = build_automated_action(decision, ingested_event_id, transaction_id)
+    if action:
+        db.add(action)
+        db.commit()
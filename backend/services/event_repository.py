@@ -5,20 +5,19 @@ from sqlalchemy import func
 import models
 
 
-def record_event_snapshot(
-    db: Session,
+def build_event_snapshot(
     event_record: models.IngestedEvent,
     transaction: models.Transaction,
     enrichment_context: dict,
     decision: dict,
     rule_hits: list,
-):
+) -> models.EventSnapshot:
     rule_ids = [hit["rule_id"] for hit in rule_hits]
     metrics = {
         "confidence": transaction.risk_score.confidence if transaction.risk_score else None,
         "reason": transaction.risk_score.reason if transaction.risk_score else None,
     }
-    snapshot = models.EventSnapshot(
+    return models.EventSnapshot(
         ingested_event_id=event_record.id,
         event_id=event_record.event_id,
         transaction_id=transaction.id,
@@ -34,42 +33,132 @@ def record_event_snapshot(
         metrics=metrics,
         created_at=datetime.datetime.utcnow(),
     )
+
+
+def record_event_snapshot(
+    db: Session,
+    event_record: models.IngestedEvent,
+    transaction: models.Transaction,
+    enrichment_context: dict,
+    decision: dict,
+    rule_hits: list,
+):
+    snapshot = build_event_snapshot(event_record, transaction, enrichment_context, decision, rule_hits)
     db.add(snapshot)
     db.commit()
     return snapshot
 
 
+def metric_day(timestamp: datetime.datetime) -> datetime.datetime:
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _metric_day(transaction: models.Transaction) -> datetime.datetime:
+    return metric_day(transaction.timestamp)
+
+
+def _new_metric(metric_date: datetime.datetime) -> models.EventMetric:
+    return models.EventMetric(
+        metric_date=metric_date,
+        total_events=0,
+        blocked_events=0,
+        challenged_events=0,
+        allowed_events=0,
+        avg_amount=0.0,
+        avg_risk_score=0.0,
+    )
+
+
+def new_metric_totals() -> dict:
+    return {"count": 0, "blocked": 0, "challenged": 0, "allowed": 0, "amount_sum": 0.0, "scored": 0, "score_sum": 0.0}
+
+
+def add_to_metric_totals(totals: dict, status: str, amount: float, risk_score: float | None):
+    totals["count"] += 1
+    if status == "BLOCK":
+        totals["blocked"] += 1
+    elif status == "CHALLENGE":
+        totals["challenged"] += 1
+    else:
+        totals["allowed"] += 1
+    totals["amount_sum"] += amount
+    if risk_score is not None:
+        totals["scored"] += 1
+        totals["score_sum"] += risk_score
+
+
+def summarize_metric_totals(transactions: list) -> dict:
+    """Groups transactions into per-day metric totals"""
+    by_day = {}
+    for transaction in transactions:
+        totals = by_day.setdefault(_metric_day(transaction), new_metric_totals())
+        score = transaction.risk_score.score if transaction.risk_score else None
+        add_to_metric_totals(totals, transaction.status, transaction.amount, score)
+    return by_day
+
+
+def _apply_totals_to_metric(metric: models.EventMetric, totals: dict):
+    previous_count = metric.total_events or 0
+    count = previous_count + totals["count"]
+
+    metric.total_events = count
+    metric.blocked_events = (metric.blocked_events or 0) + totals["blocked"]
+    metric.challenged_events = (metric.challenged_events or 0) + totals["challenged"]
+    metric.allowed_events = (metric.allowed_events or 0) + totals["allowed"]
+
+    # Running averages
+    metric.avg_amount = (((metric.avg_amount or 0.0) * previous_count) + totals["amount_sum"]) / count
+    if totals["scored"]:
+        metric.avg_risk_score = (
+            ((metric.avg_risk_score or 0.0) * (count - totals["scored"])) + totals["score_sum"]
+        ) / count
+
+
 def update_event_metrics(db: Session, transaction: models.Transaction):
-    metric_date = transaction.timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    metric_date = _metric_day(transaction)
     metric = (
         db.query(models.EventMetric)
         .filter(models.EventMetric.metric_date == metric_date)
         .first()
     )
     if not metric:
-        metric = models.EventMetric(metric_date=metric_date)
+        metric = _new_metric(metric_date)
         db.add(metric)
 
-    metric.total_events += 1
-    if transaction.status == "BLOCK":
-        metric.blocked_events += 1
-    elif transaction.status == "CHALLENGE":
-        metric.challenged_events += 1
-    else:
-        metric.allowed_events += 1
-
-    # Running averages
-    count = metric.total_events
-    metric.avg_amount = ((metric.avg_amount * (count - 1)) + transaction.amount) / count
-    if transaction.risk_score:
-        metric.avg_risk_score = (
-            (metric.avg_risk_score * (count - 1)) + transaction.risk_score.score
-        ) / count
+    _apply_totals_to_metric(metric, summarize_metric_totals([transaction])[metric_date])
 
     db.commit()
     return metric
 
 
+def apply_metric_totals(db: Session, totals_by_day: dict):
+    """
+    Folds per-day totals into the EventMetric rows with a single lookup query.
+    Does not commit; the caller owns the unit of work.
+    """
+    if not totals_by_day:
+        return []
+
+    existing = {
+        metric.metric_date: metric
+        for metric in db.query(models.EventMetric).filter(models.EventMetric.metric_date.in_(list(totals_by_day)))
+    }
+    metrics = []
+    for metric_date, totals in totals_by_day.items():
+        metric = existing.get(metric_date)
+        if not metric:
+            metric = _new_metric(metric_date)
+            db.add(metric)
+        _apply_totals_to_metric(metric, totals)
+        metrics.append(metric)
+    return metrics
+
+
+def apply_event_metrics_batch(db: Session, transactions: list):
+    """Folds a batch of transactions into the daily EventMetric rows"""
+    return apply_metric_totals(db, summarize_metric_totals(transactions))
+
+
 def query_snapshots(
     db: Session,
     status: str | None = None,
@@ -0,0 +1,128 @@
+"""
+In-memory idempotency index for ingested event ids.
+
+At-least-once producers retry the same event_id; this index answers most of
+those retries without touching the database. A pair of rotating Bloom filters
+tells us when an event_id has certainly not been seen inside the time window,
+and an LRU maps recently processed event_ids to their transaction ids. The
+unique constraint on ingested_events.event_id remains the source of truth.
+"""
+import collections
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class _BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class IdempotencyIndex:
+    """Bounded, time-windowed event_id index: Bloom filter for misses, LRU for hits"""
+
+    def __init__(
+        self,
+        capacity: int | None = None,
+        window_seconds: float | None = None,
+        error_rate: float = 0.01,
+    ):
+        self.capacity = capacity or int(os.getenv("IDEMPOTENCY_CAPACITY", "100000"))
+        self.window_seconds = window_seconds or float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "3600"))
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._current = _BloomFilter(self.capacity, self.error_rate)
+            self._previous: Optional[_BloomFilter] = None
+            self._rotated_at = time.monotonic()
+            self._recent: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+            self.hits = 0
+            self.certain_misses = 0
+            self.possible_hits = 0
+
+    def _rotate_if_due(self, now: float):
+        # Each generation covers half a window, so membership spans one to one-and-a-half windows.
+        if now - self._rotated_at >= self.window_seconds / 2:
+            self._previous = self._current
+            self._current = _BloomFilter(self.capacity, self.error_rate)
+            self._rotated_at = now
+
+    def lookup(self, event_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the remembered outcome for a processed event, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._recent.get(event_id)
+            if entry is None:
+                return None
+            transaction_id, status, recorded_at = entry
+            if now - recorded_at > self.window_seconds:
+                del self._recent[event_id]
+                return None
+            self._recent.move_to_end(event_id)
+            self.hits += 1
+            return {"transaction_id": transaction_id, "status": status}
+
+    def might_contain(self, event_id: str) -> bool:
+        """False means the event_id was not seen by this process within the window"""
+        with self._lock:
+            self._rotate_if_due(time.monotonic())
+            seen = event_id in self._current or (self._previous is not None and event_id in self._previous)
+            if seen:
+                self.possible_hits += 1
+            else:
+                self.certain_misses += 1
+            return seen
+
+    def add(self, event_id: str):
+        """Marks an event_id as recorded, before its outcome is known"""
+        with self._lock:
+            self._rotate_if_due(time.monotonic())
+            self._current.add(event_id)
+
+    def remember(self, event_id: str, transaction_id: int, status: str):
+        """Records the outcome of a processed event"""
+        now = time.monotonic()
+        with self._lock:
+            self._rotate_if_due(now)
+            self._current.add(event_id)
+            self._recent[event_id] = (transaction_id, status, now)
+            self._recent.move_to_end(event_id)
+            while len(self._recent) > self.capacity:
+                self._recent.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "window_seconds": self.window_seconds,
+                "cached_outcomes": len(self._recent),
+                "bloom_bits": self._current.size,
+                "bloom_hashes": self._current.hash_count,
+                "hits": self.hits,
+                "certain_misses": self.certain_misses,
+                "possible_hits": self.possible_hits,
+            }
+
+
+idempotency_index = IdempotencyIndex()
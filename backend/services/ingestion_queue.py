@@ -0,0 +1,201 @@
+"""
+Accept-then-process ingestion: events are recorded as RECEIVED by the API and
+drained by a pool of worker threads through bounded per-priority queues.
+"""
+import os
+import queue
+import threading
+import time
+import logging
+from typing import Callable, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+import database
+import models
+from services.event_ingestor import process_ingested_event
+from services.priority_scheduler import PRIORITY_CLASSES, WeightedPriorityQueue, normalize_priority
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionQueue:
+    """Bounded, priority-scheduled work queue of IngestedEvent ids with a fixed worker pool"""
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        capacity: int | None = None,
+        retry_after_seconds: int | None = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ):
+        self.workers = workers or int(os.getenv("INGEST_WORKERS", "4"))
+        self.capacity = capacity or int(os.getenv("INGEST_QUEUE_CAPACITY", "10000"))
+        self.retry_after_seconds = retry_after_seconds or int(os.getenv("INGEST_RETRY_AFTER_SECONDS", "1"))
+        self._session_factory = session_factory
+
+        self._queue = WeightedPriorityQueue(
+            capacity_per_class=self.capacity,
+            weights=_parse_class_setting(os.getenv("INGEST_PRIORITY_WEIGHTS"), int),
+            slo_ms=_parse_class_setting(os.getenv("INGEST_PRIORITY_SLO_MS"), float),
+        )
+        self._in_flight: set = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: list = []
+
+        self._busy_workers = 0
+        self._busy_seconds = 0.0
+        self._started_at: float | None = None
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self._threads = [
+            threading.Thread(target=self._worker_loop, name=f"ingest-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Ingestion queue started with {self.workers} workers (capacity {self.capacity})")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def has_capacity(self, priority: str | None = None) -> bool:
+        return self.running and not self._queue.full(priority)
+
+    def submit(self, ingested_event_id: int, priority: str | None = None) -> bool:
+        """Enqueue an event in its priority class; returns False when that class is full"""
+        with self._lock:
+            if ingested_event_id in self._in_flight:
+                return True
+            try:
+                self._queue.put_nowait(ingested_event_id, priority)
+            except queue.Full:
+                self.rejected += 1
+                return False
+            self._in_flight.add(ingested_event_id)
+            self.accepted += 1
+            return True
+
+    def recover_pending(self, db: Session) -> int:
+        """
+        Re-enqueue events left RECEIVED by a previous process, oldest first and at
+        most the free capacity of each priority class; the retry scheduler picks
+        up the rest once they are stale (see RetryScheduler.release_stale)
+        """
+        recovered = 0
+        for priority in PRIORITY_CLASSES:
+            free = self.capacity - self._queue.qsize(priority)
+            if free <= 0:
+                continue
+            pending = (
+                db.query(models.IngestedEvent.id)
+                .filter(models.IngestedEvent.status == models.IngestedEventStatus.RECEIVED.value)
+                .filter(_priority_filter(priority))
+                .order_by(models.IngestedEvent.received_at)
+                .limit(free)
+                .all()
+            )
+            recovered += sum(1 for (event_id,) in pending if self.submit(event_id, priority))
+        if recovered:
+            logger.info(f"Recovered {recovered} RECEIVED events into the ingestion queue")
+        return recovered
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        with self._lock:
+            busy_seconds = self._busy_seconds
+            busy_workers = self._busy_workers
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "busy_workers": busy_workers,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity_per_priority": self.capacity,
+            "worker_utilization": round(busy_workers / self.workers, 4) if self.workers else 0.0,
+            "average_utilization": round(busy_seconds / (elapsed * self.workers), 4) if elapsed and self.workers else 0.0,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "priorities": self._queue.stats(),
+        }
+
+    def _new_session(self) -> Session:
+        factory = self._session_factory or database.SessionLocal
+        return factory()
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                ingested_event_id, _ = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            started = time.monotonic()
+            with self._lock:
+                self._busy_workers += 1
+            try:
+                self._process(ingested_event_id)
+            finally:
+                with self._lock:
+                    self._busy_workers -= 1
+                    self._busy_seconds += time.monotonic() - started
+                    self._in_flight.discard(ingested_event_id)
+
+    def _process(self, ingested_event_id: int):
+        db = self._new_session()
+        try:
+            event_record = db.query(models.IngestedEvent).filter(models.IngestedEvent.id == ingested_event_id).first()
+            if not event_record:
+                logger.warning(f"Queued event {ingested_event_id} no longer exists")
+                return
+            process_ingested_event(db, event_record)
+            with self._lock:
+                self.processed += 1
+        except Exception as exc:
+            with self._lock:
+                self.failed += 1
+            logger.error(f"Failed to process queued event {ingested_event_id}: {exc}")
+        finally:
+            db.close()
+
+
+def _priority_filter(priority: str):
+    """SQL condition matching stored priorities that normalize_priority maps to the class"""
+    column = func.lower(func.trim(models.IngestedEvent.priority))
+    if priority != "normal":
+        return column == priority
+    others = [name for name in PRIORITY_CLASSES if name != "normal"]
+    return or_(models.IngestedEvent.priority.is_(None), column.notin_(others))
+
+
+def _parse_class_setting(raw: str | None, cast) -> dict:
+    """Parses settings like "high=8,normal=3,low=1" into a per-class dict"""
+    if not raw:
+        return {}
+    values = {}
+    for part in raw.split(","):
+        name, _, value = part.partition("=")
+        if value:
+            values[normalize_priority(name)] = cast(value)
+    return values
+
+
+ingestion_queue = IngestionQueue()
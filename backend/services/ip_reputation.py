@@ -0,0 +1,233 @@
+"""
+IP reputation lookup over IPv4 and IPv6 CIDR ranges.
+
+Ranges may nest (a /24 inside a /8); the most specific one wins, as in a
+longest-prefix match. At load time the ranges of each family are flattened
+into disjoint intervals covering the whole address space, stored as two
+sorted arrays: interval start addresses (uint32 for IPv4, 16-byte
+big-endian strings for IPv6, which sort in address order) and the label of
+each interval (-1 where no range applies). A lookup is then one binary
+search, about log2(n) comparisons, and np.searchsorted answers a whole
+array of packed addresses at once.
+
+Ranges come from IP_REPUTATION_FILE when set, a CSV of
+`cidr,reputation,risk_score` lines (blank lines and lines starting with #
+are skipped; later lines win over identical earlier ranges), and otherwise
+from the prefixes in data/reference_data.py.
+"""
+import csv
+import logging
+import os
+import socket
+import threading
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from data.reference_data import HIGH_RISK_IP_RANGES, KNOWN_SAFE_IP_RANGES
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_REPUTATION = {"reputation": "unknown", "risk_score": 0.35}
+
+# family -> (address bits, socket family, packed dtype)
+_FAMILIES = {
+    4: (32, socket.AF_INET, np.uint32),
+    6: (128, socket.AF_INET6, "S16"),
+}
+
+
+def parse_cidr(cidr: str) -> Tuple[int, int, int]:
+    """(family, first address, last address) of a CIDR; a bare address is a full-length prefix"""
+    address, _, length = cidr.strip().partition("/")
+    family = 6 if ":" in address else 4
+    bits, socket_family, _ = _FAMILIES[family]
+    value = int.from_bytes(socket.inet_pton(socket_family, address), "big")
+    prefix = int(length) if length else bits
+    if not 0 <= prefix <= bits:
+        raise ValueError(f"Invalid prefix length in {cidr!r}")
+    host_mask = (1 << (bits - prefix)) - 1
+    first = value & ~host_mask
+    return family, first, first | host_mask
+
+
+def pack_address(ip_address: str) -> Tuple[int, Any]:
+    """(family, packed value) of an address: an int for IPv4, 16 big-endian bytes for IPv6"""
+    if ":" in ip_address:
+        return 6, socket.inet_pton(socket.AF_INET6, ip_address)
+    return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip_address), "big")
+
+
+def pack_ipv4(addresses: Iterable[str]) -> np.ndarray:
+    """uint32 array of dotted IPv4 addresses, for lookup_batch"""
+    return np.fromiter((pack_address(address)[1] for address in addresses), dtype=np.uint32)
+
+
+def _flatten(ranges: List[Tuple[int, int, int]], last_address: int) -> Tuple[List[int], List[int]]:
+    """
+    Disjoint (start, label) intervals of nested ranges (first, last, label),
+    each address labelled by its innermost range. CIDR ranges either nest or
+    are disjoint, so a stack of the enclosing ranges is enough.
+    """
+    starts: List[int] = []
+    labels: List[int] = []
+
+    def emit(start, label):
+        # A later interval at the same start replaces the earlier, empty one.
+        if starts and starts[-1] == start:
+            labels[-1] = label
+        else:
+            starts.append(start)
+            labels.append(label)
+
+    # Outer ranges first among those starting at the same address; the stable sort keeps file order for duplicates.
+    ranges.sort(key=lambda entry: (entry[0], -entry[1]))
+    stack: List[Tuple[int, int]] = []  # (last address, label) of the ranges enclosing the cursor
+    cursor = 0
+    emit(0, -1)
+    for first, last, label in ranges:
+        while stack and stack[-1][0] < first:
+            cursor = stack.pop()[0] + 1
+            emit(cursor, stack[-1][1] if stack else -1)
+        if cursor < first:
+            emit(cursor, stack[-1][1] if stack else -1)
+        emit(first, label)
+        cursor = first
+        stack.append((last, label))
+    while stack:
+        cursor = stack.pop()[0] + 1
+        if cursor <= last_address:
+            emit(cursor, stack[-1][1] if stack else -1)
+
+    # Adjacent intervals with the same label are one.
+    keep = [0] + [i for i in range(1, len(labels)) if labels[i] != labels[i - 1]]
+    return [starts[i] for i in keep], [labels[i] for i in keep]
+
+
+class IPReputationTable:
+    """Longest-prefix reputation lookup for IPv4 and IPv6 addresses"""
+
+    def __init__(self, entries: Iterable[Tuple[str, str, float]]):
+        """entries: (cidr, reputation, risk_score)"""
+        label_index: Dict[Tuple[str, float], int] = {}
+        ranges: Dict[int, List[Tuple[int, int, int]]] = {4: [], 6: []}
+        for cidr, reputation, risk_score in entries:
+            family, first, last = parse_cidr(cidr)
+            label = label_index.setdefault((reputation, float(risk_score)), len(label_index))
+            ranges[family].append((first, last, label))
+
+        # Label -1 (no range) picks the trailing unknown entry.
+        self.reputations = np.array(
+            [reputation for reputation, _ in label_index] + [UNKNOWN_REPUTATION["reputation"]], dtype=object
+        )
+        self.risk_scores = np.array(
+            [risk_score for _, risk_score in label_index] + [UNKNOWN_REPUTATION["risk_score"]], dtype=np.float64
+        )
+        self.ranges = {family: len(family_ranges) for family, family_ranges in ranges.items()}
+        self._starts: Dict[int, np.ndarray] = {}
+        self._labels: Dict[int, np.ndarray] = {}
+        for family, family_ranges in ranges.items():
+            bits, _, dtype = _FAMILIES[family]
+            starts, labels = _flatten(family_ranges, (1 << bits) - 1)
+            if family == 4:
+                self._starts[4] = np.array(starts, dtype=dtype)
+            else:
+                self._starts[6] = np.array([start.to_bytes(16, "big") for start in starts], dtype=dtype)
+            self._labels[family] = np.array(labels, dtype=np.int32)
+
+    @classmethod
+    def from_file(cls, path: str) -> "IPReputationTable":
+        def entries():
+            with open(path, newline="") as handle:
+                for line_number, row in enumerate(csv.reader(handle), start=1):
+                    if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                        continue
+                    if len(row) < 3:
+                        raise ValueError(f"{path}:{line_number}: expected cidr,reputation,risk_score")
+                    yield row[0], row[1].strip(), float(row[2])
+        table = cls(entries())
+        logger.info(f"Loaded {table.ranges[4]:,} IPv4 and {table.ranges[6]:,} IPv6 reputation ranges from {path}")
+        return table
+
+    @classmethod
+    def from_reference_data(cls) -> "IPReputationTable":
+        """Ranges of the first-octet prefixes ("45.") of data/reference_data.py"""
+        entries = []
+        for ranges in (KNOWN_SAFE_IP_RANGES, HIGH_RISK_IP_RANGES):
+            for prefix, data in ranges.items():
+                octets = [octet for octet in prefix.split(".") if octet]
+                cidr = ".".join(octets + ["0"] * (4 - len(octets))) + f"/{8 * len(octets)}"
+                entries.append((cidr, data["reputation"], data["risk_score"]))
+        return cls(entries)
+
+    def _label(self, family: int, packed: Any) -> int:
+        if family == 4:
+            # A Python int would make searchsorted promote the whole start array to int64.
+            packed = np.uint32(packed)
+        return int(self._labels[family][np.searchsorted(self._starts[family], packed, side="right") - 1])
+
+    def lookup(self, ip_address: str | None) -> Dict[str, Any]:
+        """Reputation of the most specific range containing the address; unknown for none or an invalid address"""
+        try:
+            family, packed = pack_address(ip_address.strip())
+        except (AttributeError, OSError, ValueError):
+            return dict(UNKNOWN_REPUTATION)
+        label = self._label(family, packed)
+        return {"reputation": self.reputations[label], "risk_score": float(self.risk_scores[label])}
+
+    def lookup_batch(self, packed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (reputation, risk_score) arrays for an array of packed addresses:
+        uint32 for IPv4 (see pack_ipv4), S16 big-endian bytes for IPv6
+        """
+        packed = np.asarray(packed)
+        family = 6 if packed.dtype.kind == "S" else 4
+        if family == 4 and packed.dtype != np.uint32:
+            packed = packed.astype(np.uint32)
+        labels = self._labels[family][np.searchsorted(self._starts[family], packed, side="right") - 1]
+        return self.reputations[labels], self.risk_scores[labels]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ranges": {f"ipv{family}": count for family, count in self.ranges.items()},
+            "intervals": {f"ipv{family}": len(starts) for family, starts in self._starts.items()},
+        }
+
+
+_table: IPReputationTable | None = None
+_table_lock = threading.Lock()
+
+
+def get_ip_reputation_table() -> IPReputationTable:
+    """The process-wide table, loaded on first use from IP_REPUTATION_FILE or the reference data"""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                path = os.getenv("IP_REPUTATION_FILE")
+                _table = IPReputationTable.from_file(path) if path else IPReputationTable.from_reference_data()
+    return _table
+
+
+def lookup_ip_reputation(ip_address: str | None) -> Dict[str, Any]:
+    return get_ip_reputation_table().lookup(ip_address)
+
+
+def lookup_ip_reputation_batch(addresses: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(reputation, risk_score) arrays for address strings of either family, in input order"""
+    table = get_ip_reputation_table()
+    reputations = np.full(len(addresses), UNKNOWN_REPUTATION["reputation"], dtype=object)
+    risk_scores = np.full(len(addresses), UNKNOWN_REPUTATION["risk_score"], dtype=np.float64)
+    by_family: Dict[int, Tuple[List[int], List[Any]]] = {4: ([], []), 6: ([], [])}
+    for position, address in enumerate(addresses):
+        try:
+            family, packed = pack_address(address.strip())
+        except (AttributeError, OSError, ValueError):
+            continue
+        by_family[family][0].append(position)
+        by_family[family][1].append(packed)
+    for family, (positions, packed) in by_family.items():
+        if positions:
+            _, _, dtype = _FAMILIES[family]
+            reputations[positions], risk_scores[positions] = table.lookup_batch(np.array(packed, dtype=dtype))
+    return reputations, risk_scores
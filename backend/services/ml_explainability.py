@@ -9,6 +9,8 @@ from typing import Dict, List
 import pickle
 import os
 
+from feature_hashing import hash_bucket
+
 # Global SHAP explainer (initialized on demand)
 _explainer = None
 _model = None
@@ -20,11 +22,11 @@ def _get_feature_vector(transaction_data: dict) -> np.ndarray:
     """
     features = [
         transaction_data.get('amount', 0),
-        hash(transaction_data.get('merchant', '')) % 1000,
-        hash(transaction_data.get('location', '')) % 100,
-        hash(transaction_data.get('user_id', '')) % 1000,
-        hash(transaction_data.get('ip_address', '')) % 10000,
-        hash(transaction_data.get('device_id', '')) % 10000,
+        hash_bucket(transaction_data.get('merchant', ''), 1000),
+        hash_bucket(transaction_data.get('location', ''), 100),
+        hash_bucket(transaction_data.get('user_id', ''), 1000),
+        hash_bucket(transaction_data.get('ip_address', ''), 10000),
+        hash_bucket(transaction_data.get('device_id', ''), 10000),
         # Add more engineered features as needed
     ]
     return np.array([features])
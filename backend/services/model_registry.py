@@ -0,0 +1,315 @@
+"""
+Versioned model registry with zero-downtime hot swap.
+
+Each version is a directory of model artifacts under MODEL_REGISTRY_DIR,
+listed in a registry.json manifest that also records the active and the
+previous (rollback) version. Activating a version loads it into a new
+MLEngine, warms it with a synthetic batch, and only then replaces the
+module-level ml_engine.ml_engine reference; requests in flight finish on
+the engine they started with.
+
+Every worker process runs a small sync thread that follows the manifest's
+active and shadow versions, so one activation, rollback or shadow change
+reaches all workers, and writes a heartbeat file to workers/ reporting the
+versions it serves.
+"""
+import datetime
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import ml_engine
+from cascade import CASCADE_CONFIG_FILE
+from tree_engine import NATIVE_MODEL_FILE
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_ARTIFACTS = tuple(ml_engine.MODEL_ARTIFACTS.values())
+OPTIONAL_ARTIFACTS = (NATIVE_MODEL_FILE, CASCADE_CONFIG_FILE)
+MANIFEST_FILE = "registry.json"
+
+
+def warmup_transactions(n: int = 64) -> List[dict]:
+    """Deterministic synthetic transactions covering the feature ranges used in scoring"""
+    rng = np.random.default_rng(0)
+    locations = ["", "Tashkent", "Samarkand", "abroad", "international"]
+    return [
+        {
+            "amount": float(rng.lognormal(5, 2)),
+            "merchant": f"warmup-{i % 7}",
+            "location": locations[i % len(locations)],
+            "hour_of_day": int(rng.integers(0, 24)),
+            "day_of_week": int(rng.integers(0, 7)),
+            "device_change": int(rng.integers(0, 2)),
+            "ip_change": int(rng.integers(0, 2)),
+            "transaction_frequency": int(rng.poisson(5)),
+        }
+        for i in range(n)
+    ]
+
+
+class ModelRegistry:
+    """Model versions on disk plus this worker's loaded version"""
+
+    def __init__(self, root: str | None = None, poll_interval_seconds: float | None = None):
+        self.root = root or os.getenv(
+            "MODEL_REGISTRY_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model_registry")
+        )
+        self.poll_interval_seconds = poll_interval_seconds or float(os.getenv("MODEL_REGISTRY_POLL_SECONDS", "10"))
+
+        self._manifest_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.loaded_version: Optional[str] = None
+        self.loaded_at: Optional[str] = None
+        self.loading_version: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._failed_version: Optional[str] = None
+
+    @property
+    def worker_id(self) -> str:
+        return f"{socket.gethostname()}-{os.getpid()}"
+
+    # Manifest
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"active": None, "previous": None, "shadows": [], "versions": []}
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self._manifest_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def version_dir(self, version: str) -> str:
+        if not any(entry["version"] == version for entry in self.manifest()["versions"]):
+            raise KeyError(f"Unknown model version {version}")
+        return os.path.join(self.root, version)
+
+    def register(self, source_dir: str, version: str | None = None, notes: str | None = None) -> Dict[str, Any]:
+        """Copies the artifacts in source_dir into a new version directory"""
+        missing = [name for name in REQUIRED_ARTIFACTS if not os.path.exists(os.path.join(source_dir, name))]
+        if missing:
+            raise ValueError(f"Missing model artifacts in {source_dir}: {', '.join(missing)}")
+        version = version or datetime.datetime.utcnow().strftime("v%Y%m%d-%H%M%S")
+        if not version.replace("-", "").replace("_", "").replace(".", "").isalnum():
+            raise ValueError(f"Invalid version name {version!r}")
+
+        with self._manifest_lock:
+            manifest = self.manifest()
+            if any(entry["version"] == version for entry in manifest["versions"]):
+                raise ValueError(f"Model version {version} already exists")
+            target = os.path.join(self.root, version)
+            os.makedirs(target)
+            files = [name for name in REQUIRED_ARTIFACTS + OPTIONAL_ARTIFACTS if os.path.exists(os.path.join(source_dir, name))]
+            for name in files:
+                shutil.copy2(os.path.join(source_dir, name), os.path.join(target, name))
+            entry = {
+                "version": version,
+                "registered_at": datetime.datetime.utcnow().isoformat(),
+                "source_dir": os.path.abspath(source_dir),
+                "notes": notes,
+                "files": files,
+            }
+            manifest["versions"].append(entry)
+            self._write_manifest(manifest)
+        logger.info(f"Registered model version {version} from {source_dir}")
+        return entry
+
+    # Loading and swapping
+
+    def load(self, version: str) -> ml_engine.MLEngine:
+        """Loads and warms a version without making it active"""
+        engine = ml_engine.MLEngine(self.version_dir(version))
+        if not engine.use_ensemble:
+            raise RuntimeError(f"Model version {version} could not be loaded")
+        warmup = warmup_transactions()
+        results = engine.predict_batch(warmup)
+        engine.predict(warmup[0])
+        if len(results) != len(warmup) or not all(0 <= result["score"] <= 1000 for result in results):
+            raise RuntimeError(f"Model version {version} returned invalid warm-up scores")
+        engine.version = version
+        return engine
+
+    def _swap(self, version: str):
+        """Loads version and replaces the engine used for scoring in this worker"""
+        with self._swap_lock:
+            if version == self.loaded_version:
+                return
+            self.loading_version = version
+            try:
+                engine = self.load(version)
+            except Exception as exc:
+                self.last_error = f"{version}: {exc}"
+                self._failed_version = version
+                raise
+            finally:
+                self.loading_version = None
+            # Shadow models keep running against whichever engine is champion.
+            engine.shadows = ml_engine.ml_engine.shadows
+            # Single reference assignment: callers resolve ml_engine.ml_engine per request or per batch.
+            ml_engine.ml_engine = engine
+            self.loaded_version = version
+            self.loaded_at = datetime.datetime.utcnow().isoformat()
+            self.last_error = None
+            self._failed_version = None
+        logger.info(f"Model version {version} is now serving in worker {self.worker_id}")
+        self._write_heartbeat()
+
+    def activate(self, version: str):
+        """Loads, warms and swaps in version here, then makes it active for all workers"""
+        self.version_dir(version)
+        self._swap(version)
+        with self._manifest_lock:
+            manifest = self.manifest()
+            if manifest["active"] != version:
+                manifest["previous"] = manifest["active"]
+                manifest["active"] = version
+                self._write_manifest(manifest)
+
+    def rollback(self) -> str:
+        """Re-activates the previous version; returns it"""
+        previous = self.manifest()["previous"]
+        if not previous:
+            raise ValueError("No previous model version to roll back to")
+        self.activate(previous)
+        return previous
+
+    def add_shadow(self, version: str):
+        """Loads version as a shadow of the champion here, then for all workers"""
+        self.version_dir(version)
+        self._load_shadow(version)
+        with self._manifest_lock:
+            manifest = self.manifest()
+            shadows = manifest.setdefault("shadows", [])
+            if version not in shadows:
+                shadows.append(version)
+                self._write_manifest(manifest)
+
+    def remove_shadow(self, version: str) -> bool:
+        with self._manifest_lock:
+            manifest = self.manifest()
+            if version in manifest.get("shadows", []):
+                manifest["shadows"].remove(version)
+                self._write_manifest(manifest)
+        return ml_engine.ml_engine.shadows.remove(version)
+
+    def _load_shadow(self, version: str):
+        shadows = ml_engine.ml_engine.shadows
+        if version not in shadows.shadows:
+            shadows.register(version, self.version_dir(version), warmup_transactions())
+
+    def sync(self):
+        """Follows the manifest's active and shadow versions if this worker serves others"""
+        manifest = self.manifest()
+        active = manifest["active"]
+        # A version that failed to load here is not retried every poll; activate() retries explicitly.
+        if active and active != self.loaded_version and active != self._failed_version:
+            self._swap(active)
+
+        shadows = ml_engine.ml_engine.shadows
+        wanted = manifest.get("shadows", [])
+        for version in list(shadows.shadows):
+            if version not in wanted:
+                shadows.remove(version)
+        for version in wanted:
+            if version not in shadows.shadows and version != self._failed_version:
+                try:
+                    self._load_shadow(version)
+                except Exception as exc:
+                    self.last_error = f"shadow {version}: {exc}"
+                    self._failed_version = version
+                    logger.error(f"Shadow model {version} could not be loaded: {exc}")
+
+    # Worker reporting
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "pid": os.getpid(),
+            "loaded_version": self.loaded_version,
+            "shadow_versions": sorted(ml_engine.ml_engine.shadows.shadows),
+            "loaded_at": self.loaded_at,
+            "loading_version": self.loading_version,
+            "last_error": self.last_error,
+            "sync_running": self._thread is not None and self._thread.is_alive(),
+            "updated_at": datetime.datetime.utcnow().isoformat(),
+        }
+
+    def _write_heartbeat(self):
+        if not os.path.isdir(self.root):
+            return
+        workers_dir = os.path.join(self.root, "workers")
+        try:
+            os.makedirs(workers_dir, exist_ok=True)
+            path = os.path.join(workers_dir, f"{self.worker_id}.json")
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(self.status(), f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as exc:
+            logger.warning(f"Could not write model registry heartbeat: {exc}")
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Last reported status of every worker; stale entries belong to stopped workers"""
+        workers_dir = os.path.join(self.root, "workers")
+        if not os.path.isdir(workers_dir):
+            return []
+        statuses = []
+        stale_after = datetime.timedelta(seconds=3 * self.poll_interval_seconds)
+        now = datetime.datetime.utcnow()
+        for name in sorted(os.listdir(workers_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(workers_dir, name)) as f:
+                    status = json.load(f)
+            except (OSError, ValueError):
+                continue
+            status["stale"] = now - datetime.datetime.fromisoformat(status["updated_at"]) > stale_after
+            statuses.append(status)
+        return statuses
+
+    # Background sync
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="model-registry-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+        ml_engine.ml_engine.shadows.close()
+
+    def _loop(self):
+        # First pass runs immediately so a restarted worker picks up the active version.
+        while True:
+            try:
+                self.sync()
+            except Exception as exc:
+                logger.error(f"Model registry sync failed: {exc}")
+            self._write_heartbeat()
+            if self._stop.wait(self.poll_interval_seconds):
+                return
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,134 @@
+"""
+Weighted fair scheduling of queued work across priority classes.
+
+Each class has its own bounded FIFO so bulk traffic cannot crowd out urgent
+events, and classes are served by smooth weighted round-robin so lower
+priorities keep a guaranteed share and never starve.
+"""
+import collections
+import queue
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+PRIORITY_CLASSES = ("high", "normal", "low")
+DEFAULT_WEIGHTS = {"high": 8, "normal": 3, "low": 1}
+DEFAULT_SLO_MS = {"high": 50.0, "normal": 1000.0, "low": 10000.0}
+
+
+def normalize_priority(priority: str | None) -> str:
+    value = (priority or "normal").strip().lower()
+    return value if value in PRIORITY_CLASSES else "normal"
+
+
+class _DelayStats:
+    """Queueing delay accumulator with a bounded window for percentiles"""
+
+    def __init__(self, slo_ms: float, window: int = 2048):
+        self.slo_ms = slo_ms
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.slo_breaches = 0
+        self._recent = collections.deque(maxlen=window)
+
+    def record(self, delay_ms: float):
+        self.count += 1
+        self.total_ms += delay_ms
+        self.max_ms = max(self.max_ms, delay_ms)
+        if delay_ms > self.slo_ms:
+            self.slo_breaches += 1
+        self._recent.append(delay_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        recent = sorted(self._recent)
+
+        def percentile(p: float) -> float:
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 3)
+
+        return {
+            "dequeued": self.count,
+            "avg_delay_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_delay_ms": percentile(0.50),
+            "p95_delay_ms": percentile(0.95),
+            "p99_delay_ms": percentile(0.99),
+            "max_delay_ms": round(self.max_ms, 3),
+            "slo_ms": self.slo_ms,
+            "slo_breaches": self.slo_breaches,
+        }
+
+
+class WeightedPriorityQueue:
+    """Thread-safe multi-class queue with the put_nowait/get/qsize subset of queue.Queue"""
+
+    def __init__(
+        self,
+        capacity_per_class: int,
+        weights: Dict[str, int] | None = None,
+        slo_ms: Dict[str, float] | None = None,
+    ):
+        self.capacity_per_class = capacity_per_class
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        slo_ms = {**DEFAULT_SLO_MS, **(slo_ms or {})}
+        self._queues = {name: collections.deque() for name in PRIORITY_CLASSES}
+        self._credit = {name: 0 for name in PRIORITY_CLASSES}
+        self._delays = {name: _DelayStats(slo_ms[name]) for name in PRIORITY_CLASSES}
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def qsize(self, priority: str | None = None) -> int:
+        with self._not_empty:
+            if priority:
+                return len(self._queues[normalize_priority(priority)])
+            return sum(len(q) for q in self._queues.values())
+
+    def full(self, priority: str | None = None) -> bool:
+        return self.qsize(normalize_priority(priority)) >= self.capacity_per_class
+
+    def put_nowait(self, item: Any, priority: str | None = None):
+        name = normalize_priority(priority)
+        with self._not_empty:
+            if len(self._queues[name]) >= self.capacity_per_class:
+                raise queue.Full
+            self._queues[name].append((time.monotonic(), item))
+            self._not_empty.notify()
+
+    def get(self, timeout: float | None = None) -> Tuple[Any, str]:
+        with self._not_empty:
+            if not self._not_empty.wait_for(self._has_items, timeout):
+                raise queue.Empty
+            name = self._next_class()
+            enqueued_at, item = self._queues[name].popleft()
+            self._delays[name].record((time.monotonic() - enqueued_at) * 1000)
+            return item, name
+
+    def stats(self) -> Dict[str, Any]:
+        with self._not_empty:
+            return {
+                name: {
+                    "depth": len(self._queues[name]),
+                    "capacity": self.capacity_per_class,
+                    "weight": self.weights[name],
+                    **self._delays[name].summary(),
+                }
+                for name in PRIORITY_CLASSES
+            }
+
+    def _has_items(self) -> bool:
+        return any(self._queues.values())
+
+    def _next_class(self) -> str:
+        # Smooth weighted round-robin over the non-empty classes.
+        ready = [name for name in PRIORITY_CLASSES if self._queues[name]]
+        total = 0
+        for name in PRIORITY_CLASSES:
+            if name not in ready:
+                # Idle classes do not bank credit for a later burst.
+                self._credit[name] = 0
+                continue
+            self._credit[name] += self.weights[name]
+            total += self.weights[name]
+        chosen = max(ready, key=lambda name: self._credit[name])
+        self._credit[chosen] -= total
+        return chosen
@@ -0,0 +1,238 @@
+"""
+Replay of stored IngestedEvent payloads against a candidate model or ruleset.
+
+Processed events in a time window are streamed by id with server-side cursors
+(yield_per), re-run through enrichment, rules and scoring in a process pool,
+and written to replay_results next to the production outcome recorded in
+event_snapshots. Production rows are never modified.
+
+The window is read in keyset pages so that no read transaction stays open
+while results are written (SQLite would otherwise block the writer, and long
+read transactions on PostgreSQL hold back vacuum).
+"""
+import datetime
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import database
+import ml_engine
+import models
+import schemas
+from services.event_ingestor import score_transaction_events
+
+logger = logging.getLogger(__name__)
+
+REPLAY_BATCH_SIZE = int(os.getenv("REPLAY_BATCH_SIZE", "1000"))
+REPLAY_PAGE_SIZE = int(os.getenv("REPLAY_PAGE_SIZE", "50000"))
+REPLAY_WORKERS = int(os.getenv("REPLAY_WORKERS", str(os.cpu_count() or 1)))
+
+# Candidate model and rules, loaded once per worker process.
+_worker_engine: ml_engine.MLEngine | None = None
+_worker_rules: List[Dict[str, Any]] | None = None
+
+
+def load_candidate_engine(model_dir: str | None) -> ml_engine.MLEngine:
+    return ml_engine.MLEngine(model_dir) if model_dir else ml_engine.ml_engine
+
+
+def _init_replay_worker(model_dir: str | None, rules: List[Dict[str, Any]] | None):
+    global _worker_engine, _worker_rules
+    _worker_engine = load_candidate_engine(model_dir)
+    _worker_rules = rules
+
+
+def replay_batch(
+    rows: List[Dict[str, Any]],
+    engine: ml_engine.MLEngine | None = None,
+    rules: List[Dict[str, Any]] | None = None,
+) -> List[Dict[str, Any]]:
+    """Re-scores stored events and returns replay_results rows (without run_id)"""
+    engine = engine or _worker_engine
+    rules = rules if rules is not None else _worker_rules
+    results = []
+    events = []
+    for row in rows:
+        result = {
+            "ingested_event_id": row["id"],
+            "event_id": row["event_id"],
+            "original_status": row["transaction_status"],
+            "original_score": row["risk_score"],
+            "original_action": row["rule_action"],
+            "replay_status": None,
+            "replay_score": None,
+            "replay_action": None,
+            "rule_ids": None,
+            "error": None,
+        }
+        results.append(result)
+        try:
+            # The stored payload also carries the enrichment computed at ingest time; replay recomputes it.
+            payload = {key: value for key, value in row["payload"].items() if key != "enrichment"}
+            events.append((result, schemas.TransactionEvent.model_validate(payload)))
+        except ValidationError as exc:
+            result["error"] = str(exc)
+
+    scored_events = score_transaction_events([event for _, event in events], engine, rules)
+    for (result, _), scored in zip(events, scored_events):
+        if isinstance(scored, Exception):
+            result["error"] = str(scored)
+            continue
+        transaction = scored["transaction"]
+        result.update(
+            replay_status=transaction.status,
+            replay_score=transaction.risk_score.score,
+            replay_action=scored["decision"]["action"],
+            rule_ids=[hit["rule_id"] for hit in scored["rule_hits"]],
+        )
+    return results
+
+
+def _page_statement(run: models.ReplayRun, after_id: int, page_size: int):
+    statement = (
+        select(
+            models.IngestedEvent.id,
+            models.IngestedEvent.event_id,
+            models.IngestedEvent.payload,
+            models.EventSnapshot.transaction_status,
+            models.EventSnapshot.risk_score,
+            models.EventSnapshot.rule_action,
+        )
+        .outerjoin(models.EventSnapshot, models.EventSnapshot.ingested_event_id == models.IngestedEvent.id)
+        .where(models.IngestedEvent.status == models.IngestedEventStatus.PROCESSED.value)
+        .where(models.IngestedEvent.id > after_id)
+        .order_by(models.IngestedEvent.id)
+        .limit(page_size)
+    )
+    if run.window_start:
+        statement = statement.where(models.IngestedEvent.received_at >= run.window_start)
+    if run.window_end:
+        statement = statement.where(models.IngestedEvent.received_at < run.window_end)
+    return statement
+
+
+def _write_results(bind: Engine, run_id: int, results: List[Dict[str, Any]]) -> Dict[str, int]:
+    counts = {"total": len(results), "changed_status": 0, "changed_action": 0}
+    for result in results:
+        result["run_id"] = run_id
+        if result["error"] is None:
+            counts["changed_status"] += result["original_status"] != result["replay_status"]
+            counts["changed_action"] += result["original_action"] != result["replay_action"]
+    if results:
+        with bind.begin() as connection:
+            connection.execute(insert(models.ReplayResult.__table__), results)
+    return counts
+
+
+def run_replay(
+    run_id: int,
+    session_factory=None,
+    workers: int | None = None,
+    batch_size: int = REPLAY_BATCH_SIZE,
+    page_size: int = REPLAY_PAGE_SIZE,
+):
+    """Executes a PENDING replay run to completion; intended for a background task"""
+    db: Session = (session_factory or database.SessionLocal)()
+    run = db.get(models.ReplayRun, run_id)
+    if run is None:
+        db.close()
+        return
+    workers = workers or REPLAY_WORKERS
+    bind = db.get_bind()
+    pool = None
+    try:
+        run.status = models.ReplayRunStatus.RUNNING.value
+        run.started_at = datetime.datetime.utcnow()
+        db.commit()
+
+        if workers > 1:
+            # Spawned, not forked: a fork of the API process would inherit its threads' locks and open connections.
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_replay_worker,
+                initargs=(run.model_dir, run.rules),
+            )
+        else:
+            candidate = load_candidate_engine(run.model_dir)
+
+        after_id = 0
+        while True:
+            pending = []
+            page_rows = 0
+            with bind.connect() as connection:
+                result = connection.execution_options(yield_per=batch_size).execute(_page_statement(run, after_id, page_size))
+                for partition in result.partitions():
+                    rows = [dict(row._mapping) for row in partition]
+                    page_rows += len(rows)
+                    after_id = rows[-1]["id"]
+                    if pool:
+                        pending.append(pool.submit(replay_batch, rows))
+                    else:
+                        pending.append(replay_batch(rows, candidate, run.rules))
+
+            for item in pending:
+                counts = _write_results(bind, run.id, item.result() if pool else item)
+                run.total_events += counts["total"]
+                run.changed_status += counts["changed_status"]
+                run.changed_action += counts["changed_action"]
+            db.commit()
+            logger.info(f"Replay run {run.id}: {run.total_events:,} events replayed")
+
+            if page_rows < page_size:
+                break
+
+        run.status = models.ReplayRunStatus.COMPLETED.value
+    except Exception as exc:
+        logger.exception(f"Replay run {run_id} failed")
+        db.rollback()
+        run.status = models.ReplayRunStatus.FAILED.value
+        run.error = str(exc)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        run.finished_at = datetime.datetime.utcnow()
+        db.commit()
+        db.close()
+
+
+def summarize_replay(db: Session, run_id: int) -> Dict[str, Any]:
+    """Status and action transition counts between production and replay"""
+    status_rows = db.query(
+        models.ReplayResult.original_status,
+        models.ReplayResult.replay_status,
+        func.count(models.ReplayResult.id),
+    ).filter(models.ReplayResult.run_id == run_id).group_by(
+        models.ReplayResult.original_status, models.ReplayResult.replay_status
+    ).all()
+    action_rows = db.query(
+        models.ReplayResult.original_action,
+        models.ReplayResult.replay_action,
+        func.count(models.ReplayResult.id),
+    ).filter(models.ReplayResult.run_id == run_id).group_by(
+        models.ReplayResult.original_action, models.ReplayResult.replay_action
+    ).all()
+    score_row = db.query(
+        func.avg(models.ReplayResult.original_score),
+        func.avg(models.ReplayResult.replay_score),
+        func.count(models.ReplayResult.error),
+    ).filter(models.ReplayResult.run_id == run_id).one()
+
+    return {
+        "status_transitions": [
+            {"original": original, "replay": replay, "count": count} for original, replay, count in status_rows
+        ],
+        "action_transitions": [
+            {"original": original, "replay": replay, "count": count} for original, replay, count in action_rows
+        ],
+        "avg_original_score": round(score_row[0] or 0.0, 2),
+        "avg_replay_score": round(score_row[1] or 0.0, 2),
+        "errors": score_row[2],
+    }
@@ -0,0 +1,265 @@
+"""
+Retry scheduling for events whose pipeline run failed.
+
+A background thread periodically picks FAILED events that are due, re-runs
+them with exponential backoff and a per-event attempt counter (event_retries),
+and moves events that keep failing to the dead_letter_events table, from which
+they can be inspected and replayed in bulk. Transient database errors (e.g.
+SQLite "database is locked" under concurrent writers) are retried without
+limit, so lock contention alone never dead-letters an event.
+
+Events stuck in RECEIVED or PROCESSING longer than INGEST_STALE_SECONDS
+(a worker crashed mid-event, the FAILED commit itself hit a lock, or the
+queue had no room for them at startup) are released to FAILED and retried
+the same way. Every uvicorn worker runs a scheduler, so each retry first
+claims its event with a conditional UPDATE (see claim_ingested_event).
+"""
+import datetime
+import logging
+import os
+import random
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import database
+import models
+from services.event_ingestor import claim_ingested_event, reprocess_failed_event
+
+logger = logging.getLogger(__name__)
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    return isinstance(exc, OperationalError) or "database is locked" in str(exc)
+
+
+def backoff_delay(attempts: int, base_seconds: float, max_seconds: float) -> float:
+    """Exponential backoff with jitter: base * 2^(attempts-1), capped, scaled by 0.5-1.0"""
+    delay = min(max_seconds, base_seconds * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class RetryScheduler:
+    """Background re-processing of FAILED events with backoff and a dead-letter table"""
+
+    def __init__(
+        self,
+        max_attempts: int | None = None,
+        base_delay_seconds: float | None = None,
+        max_delay_seconds: float | None = None,
+        poll_interval_seconds: float | None = None,
+        batch_size: int | None = None,
+        stale_after_seconds: float | None = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ):
+        self.max_attempts = max_attempts or int(os.getenv("INGEST_RETRY_MAX_ATTEMPTS", "5"))
+        self.base_delay_seconds = base_delay_seconds or float(os.getenv("INGEST_RETRY_BASE_SECONDS", "2"))
+        self.max_delay_seconds = max_delay_seconds or float(os.getenv("INGEST_RETRY_MAX_DELAY_SECONDS", "600"))
+        self.poll_interval_seconds = poll_interval_seconds or float(os.getenv("INGEST_RETRY_POLL_SECONDS", "5"))
+        self.batch_size = batch_size or int(os.getenv("INGEST_RETRY_BATCH_SIZE", "100"))
+        self.stale_after_seconds = stale_after_seconds or float(os.getenv("INGEST_STALE_SECONDS", "300"))
+        self._session_factory = session_factory
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.retried = 0
+        self.recovered = 0
+        self.rescheduled = 0
+        self.dead_lettered = 0
+        self.released = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="ingest-retry-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Retry scheduler started (max {self.max_attempts} attempts, poll {self.poll_interval_seconds}s)")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def release_stale(self, db: Session) -> int:
+        """
+        Marks events RECEIVED or PROCESSING for longer than the stale timeout as
+        FAILED so that they are retried; PROCESSING is timed from the claim,
+        which processed_at records. Returns how many were released.
+        """
+        now = datetime.datetime.utcnow()
+        cutoff = now - datetime.timedelta(seconds=self.stale_after_seconds)
+        released = 0
+        for status, since in (
+            (models.IngestedEventStatus.RECEIVED.value, models.IngestedEvent.received_at),
+            (models.IngestedEventStatus.PROCESSING.value, models.IngestedEvent.processed_at),
+        ):
+            released += db.query(models.IngestedEvent).filter(
+                models.IngestedEvent.status == status,
+                or_(since < cutoff, since.is_(None)),
+            ).update(
+                {
+                    models.IngestedEvent.status: models.IngestedEventStatus.FAILED.value,
+                    models.IngestedEvent.processing_error: f"Released for retry after {self.stale_after_seconds:g}s in {status}",
+                    models.IngestedEvent.processed_at: now,
+                },
+                synchronize_session=False,
+            )
+        db.commit()
+        if released:
+            with self._lock:
+                self.released += released
+            logger.warning(f"Released {released} stale RECEIVED/PROCESSING events for retry")
+        return released
+
+    def run_once(self, db: Session) -> int:
+        """Releases stale events, then retries every FAILED event that is due; returns how many were attempted"""
+        self.release_stale(db)
+        now = datetime.datetime.utcnow()
+        due = (
+            db.query(models.IngestedEvent, models.EventRetry)
+            .outerjoin(models.EventRetry, models.EventRetry.ingested_event_id == models.IngestedEvent.id)
+            .filter(models.IngestedEvent.status == models.IngestedEventStatus.FAILED.value)
+            .filter(or_(models.EventRetry.id.is_(None), models.EventRetry.next_attempt_at <= now))
+            .order_by(models.IngestedEvent.id)
+            .limit(self.batch_size)
+            .all()
+        )
+        attempted = 0
+        for event_record, retry in due:
+            # The scheduler of another worker may have claimed it since the query.
+            if not claim_ingested_event(db, event_record, models.IngestedEventStatus.FAILED.value):
+                continue
+            if retry is None:
+                retry = models.EventRetry(ingested_event_id=event_record.id, attempts=0)
+                db.add(retry)
+                db.commit()
+            self.retry_event(db, event_record, retry)
+            attempted += 1
+        return attempted
+
+    def retry_event(self, db: Session, event_record: models.IngestedEvent, retry: models.EventRetry) -> bool:
+        """One retry attempt; on failure either reschedules or dead-letters the event"""
+        retry.attempts += 1
+        attempts = retry.attempts
+        with self._lock:
+            self.retried += 1
+        try:
+            reprocess_failed_event(db, event_record)
+        except Exception as exc:
+            # reprocess_failed_event rolled back, so the attempt count is re-applied here.
+            retry.attempts = attempts
+            retry.last_error = str(exc)
+            event_record.status = models.IngestedEventStatus.FAILED.value
+            event_record.processing_error = str(exc)
+            if attempts >= self.max_attempts and not is_transient_error(exc):
+                self._dead_letter(db, event_record, retry)
+            else:
+                delay = backoff_delay(attempts, self.base_delay_seconds, self.max_delay_seconds)
+                retry.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+                with self._lock:
+                    self.rescheduled += 1
+            db.commit()
+            logger.warning(f"Retry {attempts} of event {event_record.event_id} failed: {exc}")
+            return False
+
+        db.delete(retry)
+        db.commit()
+        with self._lock:
+            self.recovered += 1
+        return True
+
+    def _dead_letter(self, db: Session, event_record: models.IngestedEvent, retry: models.EventRetry):
+        event_record.status = models.IngestedEventStatus.DEAD_LETTER.value
+        retry.next_attempt_at = None
+        dead_letter = db.query(models.DeadLetterEvent).filter(
+            models.DeadLetterEvent.ingested_event_id == event_record.id
+        ).first() or models.DeadLetterEvent(ingested_event_id=event_record.id)
+        dead_letter.event_id = event_record.event_id
+        dead_letter.source_system = event_record.source_system
+        dead_letter.attempts = retry.attempts
+        dead_letter.last_error = retry.last_error
+        dead_letter.dead_lettered_at = datetime.datetime.utcnow()
+        dead_letter.replayed_at = None
+        dead_letter.replay_status = None
+        db.add(dead_letter)
+        with self._lock:
+            self.dead_lettered += 1
+        logger.error(f"Event {event_record.event_id} moved to the dead-letter table after {retry.attempts} attempts")
+
+    def replay_dead_letters(self, db: Session, ids: List[int] | None = None, limit: int = 500) -> Dict[str, Any]:
+        """Re-runs dead-lettered events (all not yet recovered, or the given dead-letter ids) immediately"""
+        query = db.query(models.DeadLetterEvent).filter(or_(
+            models.DeadLetterEvent.replayed_at.is_(None),
+            models.DeadLetterEvent.replay_status == models.IngestedEventStatus.FAILED.value,
+        ))
+        if ids:
+            query = query.filter(models.DeadLetterEvent.id.in_(ids))
+        dead_letters = query.order_by(models.DeadLetterEvent.id).limit(limit).all()
+
+        summary = {"requested": len(dead_letters), "processed": 0, "failed": 0, "results": []}
+        for dead_letter in dead_letters:
+            event_record = dead_letter.event
+            previous_status = event_record.status
+            replayable = previous_status in (models.IngestedEventStatus.DEAD_LETTER.value, models.IngestedEventStatus.FAILED.value)
+            if not replayable or not claim_ingested_event(db, event_record, previous_status):
+                summary["results"].append({"id": dead_letter.id, "event_id": dead_letter.event_id, "status": event_record.status, "error": "Event is handled by another worker"})
+                continue
+            try:
+                response = reprocess_failed_event(db, event_record)
+            except Exception as exc:
+                event_record.status = previous_status
+                dead_letter.replay_status = models.IngestedEventStatus.FAILED.value
+                dead_letter.last_error = str(exc)
+                summary["failed"] += 1
+                summary["results"].append({"id": dead_letter.id, "event_id": dead_letter.event_id, "status": "FAILED", "error": str(exc)})
+            else:
+                dead_letter.replay_status = response.status
+                db.query(models.EventRetry).filter(models.EventRetry.ingested_event_id == event_record.id).delete(synchronize_session=False)
+                summary["processed"] += 1
+                summary["results"].append({"id": dead_letter.id, "event_id": dead_letter.event_id, "status": response.status, "transaction_id": response.transaction_id})
+            dead_letter.replayed_at = datetime.datetime.utcnow()
+            db.commit()
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self.running,
+                "max_attempts": self.max_attempts,
+                "base_delay_seconds": self.base_delay_seconds,
+                "max_delay_seconds": self.max_delay_seconds,
+                "retried": self.retried,
+                "recovered": self.recovered,
+                "rescheduled": self.rescheduled,
+                "dead_lettered": self.dead_lettered,
+                "released": self.released,
+                "stale_after_seconds": self.stale_after_seconds,
+            }
+
+    def _new_session(self) -> Session:
+        factory = self._session_factory or database.SessionLocal
+        return factory()
+
+    def _loop(self):
+        while not self._stop.wait(self.poll_interval_seconds):
+            db = self._new_session()
+            try:
+                self.run_once(db)
+            except Exception as exc:
+                db.rollback()
+                logger.error(f"Retry scheduler pass failed: {exc}")
+            finally:
+                db.close()
+
+
+retry_scheduler = RetryScheduler()
@@ -0,0 +1,304 @@
+"""
+Backtest of a candidate rule set over stored event snapshots.
+
+EventSnapshot rows in a time window, joined to their EnrichedEventContext,
+are read in keyset pages with server-side cursors (yield_per) and handed
+out in chunks to a process pool. Each worker compiles the candidate once
+(see _init_backtest_worker), evaluates a chunk with the batch evaluator
+(see rule_compiler.py) and returns only chunk totals: hits per rule, the
+candidate's decision against the production decision recorded in the
+snapshot, and the sparse rule x rule co-hit matrix. Memory therefore
+follows the chunk size and the number of rules, not the window; at most
+two chunks per worker are in flight.
+
+Only rule conditions are replayed: enrichment is taken as stored, and
+models are not re-scored (see replay_service.py for full replays).
+
+POST /rules/backtest stores a RuleBacktestRun and returns at once;
+execute_backtest_run runs it as a background task and stores the summary.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import database
+import models
+from services.rule_compiler import CompiledRuleSet, rule_columns
+from services.rule_engine import decide_actions_batch
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_CHUNK_SIZE = int(os.getenv("RULE_BACKTEST_CHUNK_SIZE", "50000"))
+BACKTEST_PAGE_SIZE = int(os.getenv("RULE_BACKTEST_PAGE_SIZE", "500000"))
+BACKTEST_WORKERS = int(os.getenv("RULE_BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+
+# Decision labels; production snapshots without a known action count as UNKNOWN
+DECISIONS = ("ALLOW", "CHALLENGE", "BLOCK", "UNKNOWN")
+_DECISION_CODES = {decision: code for code, decision in enumerate(DECISIONS)}
+
+# Candidate rules, compiled once per worker process.
+_worker_rules: CompiledRuleSet | None = None
+
+
+def _init_backtest_worker(rules: List[Dict[str, Any]]):
+    global _worker_rules
+    # Backtests evaluate in batches only; sampling single events would never trigger.
+    _worker_rules = CompiledRuleSet(rules, profile_every=0)
+
+
+class SnapshotRow(NamedTuple):
+    """Columns of _page_statement; plain tuples keep chunks cheap to send to workers"""
+    id: int
+    amount: float | None
+    rule_action: str | None
+    geo_country: str | None
+    ip_risk_score: float | None
+    ip_reputation: str | None
+    user_segment: str | None
+    signals: Dict[str, Any] | None
+    derived_features: Dict[str, Any] | None
+
+
+class BacktestTotals:
+    """Additive totals of a backtest, per chunk and overall"""
+
+    def __init__(self, n_rules: int):
+        self.events = 0
+        self.hits = np.zeros(n_rules, dtype=np.int64)
+        self.exclusive_hits = np.zeros(n_rules, dtype=np.int64)
+        self.top_rule_hits = np.zeros(n_rules, dtype=np.int64)
+        # transitions[production, candidate] over DECISIONS
+        self.transitions = np.zeros((len(DECISIONS), len(DECISIONS)), dtype=np.int64)
+        self.overlap = sparse.csr_matrix((n_rules, n_rules), dtype=np.int64)
+
+    def add(self, other: "BacktestTotals"):
+        self.events += other.events
+        self.hits += other.hits
+        self.exclusive_hits += other.exclusive_hits
+        self.top_rule_hits += other.top_rule_hits
+        self.transitions += other.transitions
+        self.overlap = self.overlap + other.overlap
+
+
+def _chunk_events(rows: List[SnapshotRow]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Transaction and enrichment dicts of snapshot rows, shaped as at ingest time"""
+    transactions, enrichments = [], []
+    for row in rows:
+        transactions.append({"amount": row.amount if row.amount is not None else float("nan")})
+        enrichments.append({
+            "geo_country": row.geo_country,
+            "ip_risk_score": row.ip_risk_score,
+            "ip_reputation": row.ip_reputation,
+            "user_segment": row.user_segment,
+            "signals": row.signals or {},
+            "derived_features": row.derived_features or {},
+        })
+    return transactions, enrichments
+
+
+def backtest_chunk(rows: List[SnapshotRow], rules: CompiledRuleSet | None = None) -> BacktestTotals:
+    """Evaluates the candidate rules on a chunk of snapshot rows and returns its totals"""
+    rules = rules if rules is not None else _worker_rules
+    n_rules = len(rules)
+    totals = BacktestTotals(n_rules)
+    totals.events = len(rows)
+    if not rows:
+        return totals
+
+    hits = rules.evaluate_batch(rule_columns(*_chunk_events(rows)))
+    decisions = decide_actions_batch(hits, rules)
+
+    totals.hits = np.diff(hits.indptr).astype(np.int64)
+    single = decisions["hit_count"] == 1
+    totals.exclusive_hits = np.asarray(hits[:, single].sum(axis=1), dtype=np.int64).ravel()
+    top_rule = decisions["top_rule"]
+    totals.top_rule_hits = np.bincount(top_rule[top_rule >= 0], minlength=n_rules).astype(np.int64)
+
+    unknown = _DECISION_CODES["UNKNOWN"]
+    production = np.fromiter(
+        (_DECISION_CODES.get(row.rule_action, unknown) for row in rows), dtype=np.int64, count=len(rows)
+    )
+    candidate = np.fromiter(
+        (_DECISION_CODES[action] for action in decisions["action"]), dtype=np.int64, count=len(rows)
+    )
+    totals.transitions = np.bincount(
+        production * len(DECISIONS) + candidate, minlength=len(DECISIONS) ** 2
+    ).reshape(len(DECISIONS), len(DECISIONS)).astype(np.int64)
+
+    matrix = hits.astype(np.int64)
+    totals.overlap = (matrix @ matrix.T).tocsr()
+    return totals
+
+
+def _page_statement(window_start: datetime | None, window_end: datetime | None, after_id: int, page_size: int):
+    statement = (
+        select(
+            models.EventSnapshot.id,
+            models.EventSnapshot.amount,
+            models.EventSnapshot.rule_action,
+            func.coalesce(models.EnrichedEventContext.geo_country, models.EventSnapshot.geo_country).label("geo_country"),
+            models.EnrichedEventContext.ip_risk_score,
+            func.coalesce(models.EnrichedEventContext.ip_reputation, models.EventSnapshot.ip_reputation).label("ip_reputation"),
+            models.EnrichedEventContext.user_segment,
+            models.EnrichedEventContext.signals,
+            models.EnrichedEventContext.derived_features,
+        )
+        .outerjoin(
+            models.EnrichedEventContext,
+            models.EnrichedEventContext.ingested_event_id == models.EventSnapshot.ingested_event_id,
+        )
+        .where(models.EventSnapshot.id > after_id)
+        .order_by(models.EventSnapshot.id)
+        .limit(page_size)
+    )
+    if window_start:
+        statement = statement.where(models.EventSnapshot.created_at >= window_start)
+    if window_end:
+        statement = statement.where(models.EventSnapshot.created_at < window_end)
+    return statement
+
+
+def run_backtest(
+    rules: List[Dict[str, Any]],
+    window_start: datetime | None = None,
+    window_end: datetime | None = None,
+    session_factory=None,
+    workers: int | None = None,
+    chunk_size: int = BACKTEST_CHUNK_SIZE,
+    page_size: int = BACKTEST_PAGE_SIZE,
+    max_overlaps: int = 50,
+) -> Dict[str, Any]:
+    """Evaluates a validated candidate rule list over the snapshots of a window and summarizes it"""
+    started = time.perf_counter()
+    workers = workers or BACKTEST_WORKERS
+    totals = BacktestTotals(len(rules))
+    db: Session = (session_factory or database.SessionLocal)()
+    bind = db.get_bind()
+    pool = None
+    pending = deque()
+    try:
+        if workers > 1:
+            # Spawned, not forked: a fork of the API process would inherit its threads' locks and open connections.
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_backtest_worker,
+                initargs=(rules,),
+            )
+        else:
+            compiled = CompiledRuleSet(rules, profile_every=0)
+
+        after_id = 0
+        while True:
+            page_rows = 0
+            with bind.connect() as connection:
+                result = connection.execution_options(yield_per=chunk_size).execute(
+                    _page_statement(window_start, window_end, after_id, page_size)
+                )
+                for partition in result.partitions():
+                    rows = [SnapshotRow(*row) for row in partition]
+                    page_rows += len(rows)
+                    after_id = rows[-1].id
+                    if pool is None:
+                        totals.add(backtest_chunk(rows, compiled))
+                        continue
+                    pending.append(pool.submit(backtest_chunk, rows))
+                    while len(pending) > 2 * workers:
+                        totals.add(pending.popleft().result())
+            logger.info(f"Rule backtest: read up to snapshot {after_id}, {totals.events:,} events evaluated")
+            if page_rows < page_size:
+                break
+        while pending:
+            totals.add(pending.popleft().result())
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        db.close()
+
+    return summarize_backtest(rules, totals, time.perf_counter() - started, max_overlaps)
+
+
+def execute_backtest_run(run_id: int, session_factory=None, workers: int | None = None):
+    """Executes a PENDING backtest run to completion; intended for a background task"""
+    db: Session = (session_factory or database.SessionLocal)()
+    run = db.get(models.RuleBacktestRun, run_id)
+    if run is None:
+        db.close()
+        return
+    try:
+        run.status = models.ReplayRunStatus.RUNNING.value
+        run.started_at = datetime.utcnow()
+        db.commit()
+        run.summary = run_backtest(
+            run.rules, run.window_start, run.window_end,
+            session_factory=session_factory, workers=workers, max_overlaps=run.max_overlaps,
+        )
+        run.status = models.ReplayRunStatus.COMPLETED.value
+    except Exception as exc:
+        logger.exception(f"Rule backtest run {run_id} failed")
+        db.rollback()
+        run.status = models.ReplayRunStatus.FAILED.value
+        run.error = str(exc)
+    finally:
+        run.finished_at = datetime.utcnow()
+        db.commit()
+        db.close()
+
+
+def summarize_backtest(
+    rules: List[Dict[str, Any]], totals: BacktestTotals, elapsed_seconds: float = 0.0, max_overlaps: int = 50
+) -> Dict[str, Any]:
+    events = totals.events
+    production = totals.transitions.sum(axis=1)
+    candidate = totals.transitions.sum(axis=0)
+
+    overlap = sparse.triu(totals.overlap, k=1).tocoo()
+    order = np.argsort(-overlap.data, kind="stable")[:max_overlaps]
+    overlaps = []
+    for a, b, both in zip(overlap.row[order], overlap.col[order], overlap.data[order]):
+        either = totals.hits[a] + totals.hits[b] - both
+        overlaps.append({
+            "rule_a": rules[a]["id"],
+            "rule_b": rules[b]["id"],
+            "events": int(both),
+            "jaccard": round(float(both) / either, 4) if either else 0.0,
+        })
+
+    return {
+        "events": events,
+        "elapsed_seconds": round(elapsed_seconds, 3),
+        "rules": [
+            {
+                "rule_id": rule["id"],
+                "action": rule["action"],
+                "hits": int(totals.hits[index]),
+                "hit_rate": round(float(totals.hits[index]) / events, 6) if events else 0.0,
+                "exclusive_hits": int(totals.exclusive_hits[index]),
+                "top_rule_hits": int(totals.top_rule_hits[index]),
+            }
+            for index, rule in enumerate(rules)
+        ],
+        "decisions": {
+            decision: {
+                "production": int(production[code]),
+                "candidate": int(candidate[code]),
+                "delta": int(candidate[code] - production[code]),
+            }
+            for code, decision in enumerate(DECISIONS)
+        },
+        "transitions": [
+            {"production": DECISIONS[a], "candidate": DECISIONS[b], "count": int(totals.transitions[a, b])}
+            for a, b in zip(*np.nonzero(totals.transitions))
+        ],
+        "overlaps": overlaps,
+    }
@@ -0,0 +1,527 @@
+"""
+Rules compiled once into predicate closures.
+
+The rule engine used to interpret every condition on every event: a chain of
+string comparisons on condition["type"] followed by dict lookups of the
+condition's parameters. compile_rules() does that work once per rule list:
+
+- each condition becomes a closure with its parameters bound as locals and
+  membership lists turned into frozensets;
+- conditions inside a rule start ordered cheapest first (plain transaction
+  fields before enrichment lookups), which is safe because a rule is a pure
+  conjunction, and, with RULES_PROFILE_EVERY set, are then reordered from
+  live selectivity statistics (see rule_profile.py), batch masks included;
+- rules containing an unknown condition type can never match and are
+  dropped, as the interpreter always evaluated such conditions to False;
+- the hit dict of every rule is prebuilt and copied on a match.
+
+CompiledRuleSet.evaluate returns exactly what the interpreter returned,
+hits in rule order; the interpreter is kept as the test oracle in
+tests/rule_interpreter.py, not as a serving path. Sets of RULE_INDEX_MIN_RULES rules or more also build
+a RuleIndex (see rule_index.py) and evaluate only the rules it returns as
+candidates for the event.
+
+Every condition is also compiled to a NumPy mask over one column of a batch
+of events (see rule_columns), for batch ingestion and backtesting:
+CompiledRuleSet.evaluate_batch narrows each rule's candidate rows condition
+by condition and returns a sparse rule x event hit matrix. String columns
+are factorized once per batch, so a string condition is evaluated once per
+distinct value and then gathered by code.
+"""
+import logging
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from services.rule_index import RuleIndex
+from services.rule_profile import RULE_PROFILE_EVERY, RuleProfile
+
+logger = logging.getLogger(__name__)
+
+Predicate = Callable[[Dict[str, Any], Dict[str, Any]], bool]
+BatchMask = Callable[[Any], np.ndarray]
+
+# Batch column read by each condition type (see rule_columns)
+CONDITION_COLUMNS = {
+    "amount_greater_than": "amount",
+    "amount_less_than": "amount",
+    "amount_between": "amount",
+    "country_in": "geo_country",
+    "ip_risk_above": "ip_risk_score",
+    "ip_reputation_equals": "ip_reputation",
+    "velocity_flag_equals": "velocity_flag",
+    "device_change_equals": "device_change",
+    "user_segment_in": "user_segment",
+}
+STRING_COLUMNS = ("geo_country", "ip_reputation", "user_segment")
+RULE_COLUMNS = tuple(dict.fromkeys(CONDITION_COLUMNS.values()))
+# evaluate_batch switches from a dense mask to row indices below 1/16 of the batch
+SPARSE_CANDIDATE_RATIO = 16
+INT32_MAX = np.iinfo(np.int32).max
+
+# Relative evaluation cost of each condition type; cheaper conditions run first within a rule
+CONDITION_COST = {
+    "amount_greater_than": 0,
+    "amount_less_than": 0,
+    "amount_between": 1,
+    "ip_risk_above": 2,
+    "ip_reputation_equals": 2,
+    "country_in": 3,
+    "velocity_flag_equals": 4,
+    "device_change_equals": 4,
+    "user_segment_in": 5,
+}
+
+# Below this many rules, evaluating every rule is cheaper than an index lookup
+RULE_INDEX_MIN_RULES = 16
+
+# Compiled sets of the rule lists evaluate_rules has seen, by id(); rule lists are not mutated once in use
+_COMPILED_CACHE_SIZE = 32
+
+
+def _membership(values) -> frozenset | tuple:
+    try:
+        return frozenset(values)
+    except TypeError:
+        return tuple(values)
+
+
+def _amount_greater_than(condition):
+    value = condition["value"]
+    return lambda transaction, enrichment: transaction["amount"] > value
+
+
+def _amount_less_than(condition):
+    value = condition["value"]
+    return lambda transaction, enrichment: transaction["amount"] < value
+
+
+def _amount_between(condition):
+    low, high = condition["min"], condition["max"]
+    return lambda transaction, enrichment: low <= transaction["amount"] <= high
+
+
+def _country_in(condition):
+    countries = _membership(condition["value"])
+    return lambda transaction, enrichment: (enrichment.get("geo_country") or "").upper() in countries
+
+
+def _ip_risk_above(condition):
+    value = condition["value"]
+    return lambda transaction, enrichment: (enrichment.get("ip_risk_score") or 0) > value
+
+
+def _ip_reputation_equals(condition):
+    value = condition["value"]
+    return lambda transaction, enrichment: (enrichment.get("ip_reputation") or "") == value
+
+
+def _derived_equals(field):
+    def compile_condition(condition):
+        value = condition["value"]
+
+        def predicate(transaction, enrichment):
+            derived = enrichment.get("derived_features")
+            return (derived.get(field) if derived else transaction.get(field)) == value
+        return predicate
+    return compile_condition
+
+
+def _user_segment_in(condition):
+    segments = _membership(condition["value"])
+
+    def predicate(transaction, enrichment):
+        segment = enrichment.get("user_segment") or enrichment.get("signals", {}).get("behavioral", {}).get("segment")
+        return segment in segments
+    return predicate
+
+
+CONDITION_COMPILERS: Dict[str, Callable[[Dict[str, Any]], Predicate]] = {
+    "amount_greater_than": _amount_greater_than,
+    "amount_less_than": _amount_less_than,
+    "amount_between": _amount_between,
+    "country_in": _country_in,
+    "ip_risk_above": _ip_risk_above,
+    "ip_reputation_equals": _ip_reputation_equals,
+    "velocity_flag_equals": _derived_equals("velocity_flag"),
+    "device_change_equals": _derived_equals("device_change"),
+    "user_segment_in": _user_segment_in,
+}
+
+
+class FactorizedColumn(NamedTuple):
+    """A string column as integer codes into its distinct values; -1 is a missing value"""
+    codes: np.ndarray
+    categories: np.ndarray
+
+    def take(self, rows: np.ndarray) -> "FactorizedColumn":
+        return FactorizedColumn(self.codes[rows], self.categories)
+
+    def where(self, test: Callable[[Any], bool]) -> np.ndarray:
+        """Mask of rows whose value passes test; test runs once per distinct value (and once for missing)"""
+        lookup = np.fromiter((test(value) for value in self.categories), dtype=bool, count=len(self.categories))
+        # codes of -1 pick the trailing entry
+        return np.append(lookup, test(None))[self.codes]
+
+
+def _string_mask(test_factory):
+    def compile_condition(condition):
+        test = test_factory(condition)
+        return lambda column: column.where(test)
+    return compile_condition
+
+
+def _batch_amount_greater_than(condition):
+    value = condition["value"]
+    return lambda amount: amount > value
+
+
+def _batch_amount_less_than(condition):
+    value = condition["value"]
+    return lambda amount: amount < value
+
+
+def _batch_amount_between(condition):
+    low, high = condition["min"], condition["max"]
+    return lambda amount: (low <= amount) & (amount <= high)
+
+
+def _batch_ip_risk_above(condition):
+    value = condition["value"]
+    return lambda ip_risk_score: ip_risk_score > value
+
+
+def _batch_equals(condition):
+    value = condition["value"]
+    return lambda column: column == value
+
+
+def _country_test(condition):
+    countries = _membership(condition["value"])
+    return lambda country: (country or "").upper() in countries
+
+
+def _reputation_test(condition):
+    value = condition["value"]
+    return lambda reputation: (reputation or "") == value
+
+
+def _segment_test(condition):
+    segments = _membership(condition["value"])
+    return lambda segment: segment in segments
+
+
+BATCH_CONDITION_COMPILERS: Dict[str, Callable[[Dict[str, Any]], BatchMask]] = {
+    "amount_greater_than": _batch_amount_greater_than,
+    "amount_less_than": _batch_amount_less_than,
+    "amount_between": _batch_amount_between,
+    "country_in": _string_mask(_country_test),
+    "ip_risk_above": _batch_ip_risk_above,
+    "ip_reputation_equals": _string_mask(_reputation_test),
+    "velocity_flag_equals": _batch_equals,
+    "device_change_equals": _batch_equals,
+    "user_segment_in": _string_mask(_segment_test),
+}
+
+
+def _event_values(transaction: Dict[str, Any], enrichment: Dict[str, Any]) -> Tuple:
+    """One event's batch column values, resolved the way the scalar conditions resolve them"""
+    derived = enrichment.get("derived_features")
+    source = derived if derived else transaction
+    return (
+        transaction["amount"],
+        enrichment.get("geo_country"),
+        enrichment.get("ip_risk_score") or 0,
+        enrichment.get("ip_reputation"),
+        source.get("velocity_flag"),
+        source.get("device_change"),
+        enrichment.get("user_segment") or enrichment.get("signals", {}).get("behavioral", {}).get("segment"),
+    )
+
+
+def rule_columns(transactions: List[Dict[str, Any]], enrichments: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Columnar batch input of evaluate_batch, built from per-event transaction and enrichment dicts"""
+    values = list(zip(*(_event_values(t, e) for t, e in zip(transactions, enrichments)))) or [()] * len(RULE_COLUMNS)
+    return {
+        name: np.array(column, dtype=object if name in STRING_COLUMNS else np.float64)
+        for name, column in zip(RULE_COLUMNS, values)
+    }
+
+
+def prepare_columns(columns: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Typed batch columns: numeric columns as float64 (missing velocity_flag /
+    device_change as NaN, which matches nothing; missing ip_risk_score as 0),
+    string columns factorized
+    """
+    prepared = {}
+    for name in RULE_COLUMNS:
+        if name not in columns:
+            continue
+        if name in STRING_COLUMNS:
+            codes, categories = pd.factorize(np.asarray(columns[name], dtype=object), use_na_sentinel=True)
+            prepared[name] = FactorizedColumn(codes, np.asarray(categories, dtype=object))
+        else:
+            column = np.asarray(columns[name], dtype=np.float64)
+            prepared[name] = np.nan_to_num(column, nan=0.0) if name == "ip_risk_score" else column
+    return prepared
+
+
+class CompiledRule(NamedTuple):
+    index: int
+    predicates: Tuple[Predicate, ...]
+    masks: Tuple[Tuple[str, BatchMask], ...]
+    hit: Dict[str, Any]
+    conditions: Tuple[int, ...]  # rule["conditions"] index of each predicate and mask
+
+
+def compile_rule(rule: Dict[str, Any], index: int = 0) -> CompiledRule | None:
+    """Predicates and batch masks of one rule, cheapest first; None if the rule can never match"""
+    order = sorted(
+        range(len(rule["conditions"])), key=lambda position: CONDITION_COST.get(rule["conditions"][position]["type"], 0)
+    )
+    predicates, masks = [], []
+    for condition in (rule["conditions"][position] for position in order):
+        compiler = CONDITION_COMPILERS.get(condition["type"])
+        if compiler is None:
+            logger.warning(f"Rule {rule['id']} has unknown condition type {condition['type']!r} and never matches")
+            return None
+        try:
+            predicates.append(compiler(condition))
+            masks.append((CONDITION_COLUMNS[condition["type"]], BATCH_CONDITION_COMPILERS[condition["type"]](condition)))
+        except KeyError as exc:
+            raise ValueError(f"Rule {rule['id']}: condition {condition['type']} is missing {exc}") from exc
+    hit = {
+        "rule_id": rule["id"],
+        "rule_name": rule["name"],
+        "severity": rule["severity"],
+        "action": rule["action"],
+        "reason": rule.get("reason", ""),
+    }
+    return CompiledRule(index, tuple(predicates), tuple(masks), hit, tuple(order))
+
+
+class CompiledRuleSet:
+    """A rule list compiled for repeated evaluation"""
+
+    def __init__(self, rules: List[Dict[str, Any]], use_index: bool | None = None, profile_every: int | None = None):
+        self.rules = rules
+        compiled = (compile_rule(rule, index) for index, rule in enumerate(rules))
+        # Replaced as a whole when conditions are reordered; readers take one reference per event.
+        self._compiled = [rule for rule in compiled if rule is not None]
+        if use_index is None:
+            use_index = len(self._compiled) >= RULE_INDEX_MIN_RULES
+        self.index = RuleIndex([rules[rule.index]["conditions"] for rule in self._compiled]) if use_index else None
+        if profile_every is None:
+            profile_every = RULE_PROFILE_EVERY
+        self.profile = (
+            RuleProfile([len(rules[rule.index]["conditions"]) for rule in self._compiled], profile_every)
+            if profile_every > 0 else None
+        )
+        self._until_profiled = profile_every
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def evaluate(self, transaction: Dict[str, Any], enrichment: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self.profile is not None:
+            self._until_profiled -= 1
+            if self._until_profiled <= 0:
+                self._until_profiled = self.profile.sample_every
+                return self._evaluate_profiled(transaction, enrichment)
+        candidates = self._compiled
+        if self.index is not None:
+            candidates = [candidates[position] for position in self.index.candidates(transaction, enrichment)]
+        hits = []
+        for rule in candidates:
+            for predicate in rule.predicates:
+                if not predicate(transaction, enrichment):
+                    break
+            else:
+                hits.append(rule.hit.copy())
+        return hits
+
+    def _evaluate_profiled(self, transaction: Dict[str, Any], enrichment: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """evaluate() with every condition of every candidate timed and recorded, none skipped"""
+        compiled, profile = self._compiled, self.profile
+        positions = self.index.candidates(transaction, enrichment) if self.index is not None else range(len(compiled))
+        hits = []
+        for position in positions:
+            rule = compiled[position]
+            matched = True
+            for condition, predicate in zip(rule.conditions, rule.predicates):
+                started = perf_counter_ns()
+                passed = predicate(transaction, enrichment)
+                profile.record(position, condition, passed, perf_counter_ns() - started)
+                if not passed:
+                    matched = False
+            if matched:
+                hits.append(rule.hit.copy())
+        if profile.event_done():
+            self.reorder()
+        return hits
+
+    def reorder(self):
+        """Reorders the conditions of every rule from the profile, most selective per nanosecond first"""
+        reordered = []
+        for position, rule in enumerate(self._compiled):
+            order = self.profile.order(position, rule.conditions)
+            if order != rule.conditions:
+                moved = [rule.conditions.index(condition) for condition in order]
+                rule = rule._replace(
+                    predicates=tuple(rule.predicates[i] for i in moved),
+                    masks=tuple(rule.masks[i] for i in moved),
+                    conditions=order,
+                )
+            reordered.append(rule)
+        self._compiled = reordered
+        self.profile.reorders += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Candidate index layout and, when profiling, per-condition selectivity in the current evaluation order"""
+        compiled = self._compiled
+        result = {
+            "rules": len(self.rules),
+            "compiled_rules": len(compiled),
+            "index": self.index.stats() if self.index is not None else None,
+            "profiling": self.profile is not None,
+        }
+        if self.profile is None:
+            return result
+        conditions = [self.rules[rule.index]["conditions"] for rule in compiled]
+        result.update(
+            sample_every=self.profile.sample_every,
+            sampled_events=self.profile.sampled_events,
+            reorders=self.profile.reorders,
+            condition_types=self.profile.type_stats([[condition["type"] for condition in rule] for rule in conditions]),
+            rule_conditions=[
+                {
+                    "rule_id": rule.hit["rule_id"],
+                    "conditions": [
+                        {"type": conditions[position][condition]["type"], **self.profile.condition_stats(position, condition)}
+                        for condition in rule.conditions
+                    ],
+                }
+                for position, rule in enumerate(compiled)
+            ],
+        )
+        return result
+
+    def evaluate_batch(self, columns: Dict[str, Any]) -> sparse.csr_matrix:
+        """
+        (n_rules, n_events) boolean CSR hit matrix for a batch given as columns
+        (see rule_columns / prepare_columns); row i belongs to self.rules[i]
+        """
+        prepared = prepare_columns(columns)
+        n_events = len(next(iter(columns.values()))) if columns else 0
+        # int32 event indices halve the hit matrix whenever they fit
+        index_dtype = np.int32 if n_events < INT32_MAX else np.int64
+        hit_rows: List[np.ndarray] = [np.empty(0, dtype=index_dtype)] * len(self.rules)
+        for rule in self._compiled:
+            # Candidates stay a dense mask while many rows match; once few do, later
+            # conditions only gather and test the matching rows.
+            matched, rows = None, None
+            for name, mask in rule.masks:
+                column = prepared[name]
+                if rows is not None:
+                    rows = rows[mask(column.take(rows) if isinstance(column, FactorizedColumn) else column[rows])]
+                    if not len(rows):
+                        break
+                    continue
+                matched = mask(column) if matched is None else matched & mask(column)
+                count = np.count_nonzero(matched)
+                if not count:
+                    break
+                if count * SPARSE_CANDIDATE_RATIO < n_events:
+                    rows = np.flatnonzero(matched)
+            else:
+                if rows is None:
+                    # A rule without conditions matches every event, as all([]) does.
+                    rows = np.flatnonzero(matched) if matched is not None else np.arange(n_events)
+                hit_rows[rule.index] = rows.astype(index_dtype, copy=False)
+        counts = [len(rows) for rows in hit_rows]
+        indptr = np.zeros(len(self.rules) + 1, dtype=np.int32 if sum(counts) < INT32_MAX else np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.concatenate(hit_rows) if hit_rows else np.empty(0, dtype=index_dtype)
+        return sparse.csr_matrix(
+            (np.ones(len(indices), dtype=bool), indices, indptr), shape=(len(self.rules), n_events)
+        )
+
+
+VALID_ACTIONS = ("ALLOW", "CHALLENGE", "BLOCK")
+REQUIRED_RULE_FIELDS = ("id", "name", "severity", "action", "conditions")
+
+# Events every predicate and mask of a submitted rule set is run against (see validate_rules)
+_VALIDATION_EVENTS = [
+    (
+        {"amount": 0.0, "velocity_flag": 0, "device_change": 0},
+        {"geo_country": None, "ip_risk_score": None, "ip_reputation": None, "signals": {}, "derived_features": {}},
+    ),
+    (
+        {"amount": 25000.0},
+        {
+            "geo_country": "Uae", "ip_risk_score": 0.9, "ip_reputation": "trusted_partner", "user_segment": "retail",
+            "signals": {}, "derived_features": {"velocity_flag": 1, "device_change": 1},
+        },
+    ),
+]
+
+
+def validate_rules(rules: List[Dict[str, Any]]) -> CompiledRuleSet:
+    """
+    Compiles a submitted rule list, raising ValueError on anything the
+    engine would mis-evaluate: missing fields, duplicate ids, unknown actions
+    or condition types, and parameters of the wrong type (every predicate
+    and batch mask is run once on sample events)
+    """
+    if not isinstance(rules, list) or not rules:
+        raise ValueError("A rule set needs at least one rule")
+    seen = set()
+    for position, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule {position} is not an object")
+        missing = [field for field in REQUIRED_RULE_FIELDS if field not in rule]
+        if missing:
+            raise ValueError(f"Rule {rule.get('id', position)} is missing {', '.join(missing)}")
+        if rule["id"] in seen:
+            raise ValueError(f"Duplicate rule id {rule['id']}")
+        seen.add(rule["id"])
+        if rule["action"] not in VALID_ACTIONS:
+            raise ValueError(f"Rule {rule['id']}: unknown action {rule['action']!r}")
+        if not isinstance(rule["conditions"], list):
+            raise ValueError(f"Rule {rule['id']}: conditions must be a list")
+        for condition in rule["conditions"]:
+            if not isinstance(condition, dict) or condition.get("type") not in CONDITION_COMPILERS:
+                raise ValueError(f"Rule {rule['id']}: unknown condition {condition!r}")
+
+    compiled = CompiledRuleSet(rules)
+    columns = prepare_columns(rule_columns(*zip(*_VALIDATION_EVENTS)))
+    for rule in compiled._compiled:
+        try:
+            for transaction, enrichment in _VALIDATION_EVENTS:
+                for predicate in rule.predicates:
+                    predicate(transaction, enrichment)
+            for name, mask in rule.masks:
+                mask(columns[name])
+        except (TypeError, AttributeError) as exc:
+            raise ValueError(f"Rule {rule.hit['rule_id']}: invalid condition parameter ({exc})") from exc
+    return compiled
+
+
+_compiled: Dict[int, CompiledRuleSet] = {}
+
+
+def compile_rules(rules: List[Dict[str, Any]] | CompiledRuleSet) -> CompiledRuleSet:
+    """Compiled form of a rule list, built on first use and then reused"""
+    if isinstance(rules, CompiledRuleSet):
+        return rules
+    compiled = _compiled.get(id(rules))
+    # The set keeps its list alive, so a matching id is the same list.
+    if compiled is None or compiled.rules is not rules:
+        if len(_compiled) >= _COMPILED_CACHE_SIZE:
+            _compiled.pop(next(iter(_compiled)), None)
+        compiled = _compiled[id(rules)] = CompiledRuleSet(rules)
+    return compiled
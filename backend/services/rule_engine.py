@@ -1,73 +1,85 @@
 from typing import List, Dict, Any
 
-from data.rules_config import RULES
+import numpy as np
+from scipy import sparse
 
+from services.rule_compiler import CompiledRuleSet, compile_rules
+from services.rule_store import rule_store
 
-def _get_value(key: str, context: Dict[str, Any], default=None):
-    return context.get(key, default)
+ACTION_PRIORITY = {"BLOCK": 3, "CHALLENGE": 2, "ALLOW": 1}
+ACTION_STATUS = {"BLOCK": "BLOCK", "CHALLENGE": "CHALLENGE", "ALLOW": None}
+NO_RULE_REASON = "No rule triggered."
 
 
-def _match_condition(condition: Dict[str, Any], transaction: Dict[str, Any], enrichment: Dict[str, Any]) -> bool:
-    cond_type = condition["type"]
-    derived = enrichment.get("derived_features", {})
-    signals = enrichment.get("signals", {})
-    if cond_type == "amount_greater_than":
-        return transaction["amount"] > condition["value"]
-    if cond_type == "amount_less_than":
-        return transaction["amount"] < condition["value"]
-    if cond_type == "amount_between":
-        return condition["min"] <= transaction["amount"] <= condition["max"]
-    if cond_type == "country_in":
-        return (enrichment.get("geo_country") or "").upper() in condition["value"]
-    if cond_type == "ip_risk_above":
-        return (enrichment.get("ip_risk_score") or 0) > condition["value"]
-    if cond_type == "ip_reputation_equals":
-        return (enrichment.get("ip_reputation") or "") == condition["value"]
-    if cond_type == "velocity_flag_equals":
-        flag = derived.get("velocity_flag") if derived else transaction.get("velocity_flag")
-        return flag == condition["value"]
-    if cond_type == "device_change_equals":
-        val = derived.get("device_change") if derived else transaction.get("device_change")
-        return val == condition["value"]
-    if cond_type == "user_segment_in":
-        segment = enrichment.get("user_segment") or signals.get("behavioral", {}).get("segment")
-        return segment in condition["value"]
-    return False
+def evaluate_rules(
+    transaction: Dict[str, Any],
+    enrichment: Dict[str, Any],
+    rules: List[Dict[str, Any]] | CompiledRuleSet | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rule hits for one event against rules, or the active rule set (see rule_store.py);
+    rule lists are compiled once (see rule_compiler.py) and reused
+    """
+    return compile_rules(rule_store.current() if rules is None else rules).evaluate(transaction, enrichment)
 
 
-def evaluate_rules(transaction: Dict[str, Any], enrichment: Dict[str, Any]) -> List[Dict[str, Any]]:
-    hits = []
-    for rule in RULES:
-        matched = all(_match_condition(cond, transaction, enrichment) for cond in rule["conditions"])
-        if matched:
-            hits.append({
-                "rule_id": rule["id"],
-                "rule_name": rule["name"],
-                "severity": rule["severity"],
-                "action": rule["action"],
-                "reason": rule.get("reason", ""),
-            })
-    return hits
+def evaluate_rules_batch(
+    columns: Dict[str, Any],
+    rules: List[Dict[str, Any]] | CompiledRuleSet | None = None,
+) -> sparse.csr_matrix:
+    """
+    Sparse (n_rules, n_events) hit matrix for a batch of events given as
+    columns (amount, geo_country, ip_risk_score, ip_reputation, velocity_flag,
+    device_change, user_segment); rule_compiler.rule_columns() builds them
+    from event dicts
+    """
+    return compile_rules(rule_store.current() if rules is None else rules).evaluate_batch(columns)
 
 
 def decide_action(rule_hits: List[Dict[str, Any]]) -> Dict[str, Any]:
     if not rule_hits:
-        return {"action": "ALLOW", "status_override": None, "reason": "No rule triggered."}
+        return {"action": "ALLOW", "status_override": None, "reason": NO_RULE_REASON}
 
-    priority = {"BLOCK": 3, "CHALLENGE": 2, "ALLOW": 1}
-    top_hit = max(rule_hits, key=lambda hit: priority.get(hit["action"], 0))
-    status_map = {
-        "BLOCK": "BLOCK",
-        "CHALLENGE": "CHALLENGE",
-        "ALLOW": None,
-    }
+    top_hit = max(rule_hits, key=lambda hit: ACTION_PRIORITY.get(hit["action"], 0))
     return {
         "action": top_hit["action"],
-        "status_override": status_map[top_hit["action"]],
+        "status_override": ACTION_STATUS[top_hit["action"]],
         "reason": top_hit["reason"],
         "triggered_rules": [hit["rule_id"] for hit in rule_hits],
     }
 
 
+def decide_actions_batch(
+    hits: sparse.spmatrix,
+    rules: List[Dict[str, Any]] | CompiledRuleSet | None = None,
+) -> Dict[str, np.ndarray]:
+    """
+    decide_action for every column of a hit matrix from evaluate_rules_batch.
+    The top rule of an event is the highest-priority action among its hits,
+    the first such rule on ties, as max() picks in decide_action. Returns
+    per-event arrays: action, status_override, reason, top_rule (-1 when no
+    rule hit) and hit_count.
+    """
+    rules = compile_rules(rule_store.current() if rules is None else rules).rules
+    hits = sparse.csr_matrix(hits)
+    n_events = hits.shape[1]
+    hit_count = np.bincount(hits.indices, minlength=n_events)
 
+    # Rules visited by descending priority, earlier rules first; an event keeps the first rule that claims it.
+    top_rule = np.full(n_events, -1, dtype=np.int64)
+    order = sorted(range(len(rules)), key=lambda index: (-ACTION_PRIORITY.get(rules[index]["action"], 0), index))
+    for index in order:
+        events = hits.indices[hits.indptr[index]:hits.indptr[index + 1]]
+        if len(events):
+            events = events[top_rule[events] < 0]
+            top_rule[events] = index
 
+    # Index -1 (no hit) picks the trailing default.
+    actions = np.array([rule["action"] for rule in rules] + ["ALLOW"], dtype=object)
+    return {
+        "action": actions[top_rule],
+        "status_override": np.array([ACTION_STATUS[action] for action in actions], dtype=object)[top_rule],
+        "reason": np.array([rule.get("reason", "") for rule in rules] + [NO_RULE_REASON], dtype=object)[top_rule],
+        "top_rule": top_rule,
+        "hit_count": hit_count,
+    }
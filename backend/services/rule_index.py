@@ -0,0 +1,163 @@
+"""
+Candidate-rule index for single-event evaluation.
+
+Each rule is filed under one discriminating condition, chosen at load time:
+
+- categorical conditions (country_in, ip_reputation_equals, user_segment_in,
+  velocity_flag_equals, device_change_equals) go into a hash map from each
+  accepted value to the rules accepting it;
+- numeric thresholds (amount_greater_than, amount_less_than, amount_between,
+  ip_risk_above) go into a sorted threshold array, and bisect on the event's
+  value yields the prefix or suffix of rules whose threshold it passes;
+- rules without an indexable condition are always candidates.
+
+A candidate still has all its conditions evaluated, so the index only
+skips rules that cannot match; per-event cost follows the number of
+candidate rules instead of the size of the rule set.
+"""
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, List, Tuple
+
+KeyFunction = Callable[[Dict[str, Any], Dict[str, Any]], Any]
+
+# Preferred discriminating condition of a rule, most selective kinds first
+DISCRIMINATING_ORDER = (
+    "country_in",
+    "ip_reputation_equals",
+    "user_segment_in",
+    "amount_greater_than",
+    "amount_between",
+    "amount_less_than",
+    "ip_risk_above",
+    "velocity_flag_equals",
+    "device_change_equals",
+)
+
+# Bisect sides of the numeric conditions: matching rules are a prefix (value passes thresholds below it) or a suffix
+_PREFIX_ABOVE, _PREFIX_AT_LEAST, _SUFFIX_BELOW = "above", "at_least", "below"
+
+
+def _amount(transaction, enrichment):
+    return transaction["amount"]
+
+
+def _country(transaction, enrichment):
+    return (enrichment.get("geo_country") or "").upper()
+
+
+def _ip_reputation(transaction, enrichment):
+    return enrichment.get("ip_reputation") or ""
+
+
+def _ip_risk_score(transaction, enrichment):
+    return enrichment.get("ip_risk_score") or 0
+
+
+def _derived(field):
+    def key(transaction, enrichment):
+        derived = enrichment.get("derived_features")
+        return derived.get(field) if derived else transaction.get(field)
+    return key
+
+
+def _user_segment(transaction, enrichment):
+    return enrichment.get("user_segment") or enrichment.get("signals", {}).get("behavioral", {}).get("segment")
+
+
+# condition type -> (event key, accepted values) for hash-indexed conditions
+_HASHED = {
+    "country_in": (_country, lambda condition: condition["value"]),
+    "ip_reputation_equals": (_ip_reputation, lambda condition: [condition["value"]]),
+    "user_segment_in": (_user_segment, lambda condition: condition["value"]),
+    "velocity_flag_equals": (_derived("velocity_flag"), lambda condition: [condition["value"]]),
+    "device_change_equals": (_derived("device_change"), lambda condition: [condition["value"]]),
+}
+# condition type -> (event key, threshold, bisect side) for range-indexed conditions
+_RANGED = {
+    "amount_greater_than": (_amount, lambda condition: condition["value"], _PREFIX_ABOVE),
+    "amount_between": (_amount, lambda condition: condition["min"], _PREFIX_AT_LEAST),
+    "amount_less_than": (_amount, lambda condition: condition["value"], _SUFFIX_BELOW),
+    "ip_risk_above": (_ip_risk_score, lambda condition: condition["value"], _PREFIX_ABOVE),
+}
+
+
+class RuleIndex:
+    """Maps an event to the positions of the rules that can match it, in rule order"""
+
+    def __init__(self, conditions: List[List[Dict[str, Any]]]):
+        """conditions[i] is the condition list of the i-th rule"""
+        self.size = len(conditions)
+        self._always: List[int] = []
+        hashed: Dict[str, Dict[Any, List[int]]] = {}
+        ranged: Dict[Tuple[str, str], List[Tuple[Any, int]]] = {}
+        for position, rule_conditions in enumerate(conditions):
+            condition = self._discriminating(rule_conditions)
+            if condition is None:
+                self._always.append(position)
+            elif condition["type"] in _HASHED:
+                table = hashed.setdefault(condition["type"], {})
+                for value in dict.fromkeys(_HASHED[condition["type"]][1](condition)):
+                    table.setdefault(value, []).append(position)
+            else:
+                _, threshold, side = _RANGED[condition["type"]]
+                ranged.setdefault((condition["type"], side), []).append((threshold(condition), position))
+
+        self._hashed: List[Tuple[str, KeyFunction, Dict[Any, List[int]]]] = [
+            (kind, _HASHED[kind][0], table) for kind, table in hashed.items()
+        ]
+        self._ranged: List[Tuple[str, KeyFunction, List[Any], List[int], str]] = []
+        for (kind, side), entries in ranged.items():
+            entries.sort(key=lambda entry: entry[0])
+            self._ranged.append(
+                (kind, _RANGED[kind][0], [entry[0] for entry in entries], [entry[1] for entry in entries], side)
+            )
+
+    @staticmethod
+    def _discriminating(rule_conditions: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+        """The rule's most selective indexable condition; None if none can be indexed"""
+        indexable = []
+        for condition in rule_conditions:
+            kind = condition.get("type")
+            if kind not in DISCRIMINATING_ORDER:
+                continue
+            try:
+                if kind in _HASHED:
+                    for value in _HASHED[kind][1](condition):
+                        hash(value)
+                else:
+                    threshold = _RANGED[kind][1](condition)
+                    if not isinstance(threshold, (int, float)) or threshold != threshold:
+                        continue
+            except (KeyError, TypeError):
+                continue
+            indexable.append(condition)
+        if not indexable:
+            return None
+        return min(indexable, key=lambda condition: DISCRIMINATING_ORDER.index(condition["type"]))
+
+    def candidates(self, transaction: Dict[str, Any], enrichment: Dict[str, Any]) -> List[int]:
+        found = list(self._always)
+        for _, key, table in self._hashed:
+            try:
+                found.extend(table.get(key(transaction, enrichment), ()))
+            except TypeError:  # unhashable event value: accepted by no hashed rule
+                pass
+        for _, key, thresholds, positions, side in self._ranged:
+            value = key(transaction, enrichment)
+            if side == _PREFIX_ABOVE:
+                found.extend(positions[:bisect_left(thresholds, value)])
+            elif side == _PREFIX_AT_LEAST:
+                found.extend(positions[:bisect_right(thresholds, value)])
+            else:
+                found.extend(positions[bisect_right(thresholds, value):])
+        found.sort()
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of rules filed under each discriminating condition type"""
+        indexed: Dict[str, int] = {}
+        for kind, _, table in self._hashed:
+            indexed[kind] = len({position for positions in table.values() for position in positions})
+        for kind, _, _, positions, _ in self._ranged:
+            indexed[kind] = indexed.get(kind, 0) + len(positions)
+        return {"rules": self.size, "indexed": indexed, "always_candidates": len(self._always)}
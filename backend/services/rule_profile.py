@@ -0,0 +1,103 @@
+"""
+Live selectivity statistics of rule conditions.
+
+A rule is a conjunction, so its conditions can run in any order; the best
+order runs first the conditions that reject the most events for the least
+time. CONDITION_COST gives the starting order, and RuleProfile refines it
+from traffic:
+
+- one event in every `sample_every` is evaluated with every condition of
+  every candidate rule timed and its outcome recorded, without
+  short-circuiting, so each condition's rejection rate is measured over the
+  same events rather than over those earlier conditions let through;
+- every `reorder_every` sampled events, the conditions of each rule with
+  enough samples are ranked by mean cost / rejection rate (the expected cost
+  of reaching a rejection), lowest first; conditions that never rejected go
+  last.
+
+Profiling is opt-in (RULES_PROFILE_EVERY > 0): sampled events pay for
+timing every condition. Counters are updated without a lock: a lost
+increment under concurrent sampling only makes the statistics slightly
+noisier.
+"""
+import os
+from typing import Any, Dict, List, Sequence, Tuple
+
+# One event in this many is profiled; 0 (the default) disables profiling and reordering
+RULE_PROFILE_EVERY = int(os.getenv("RULES_PROFILE_EVERY", "0"))
+# Conditions are reordered after this many profiled events
+RULE_REORDER_EVERY = int(os.getenv("RULES_REORDER_EVERY", "1000"))
+# A rule is only reordered once each of its conditions has this many samples
+RULE_REORDER_MIN_SAMPLES = 50
+
+
+class RuleProfile:
+    """Per-condition evaluation counts, rejections and time, by rule position and condition index"""
+
+    def __init__(
+        self,
+        condition_counts: Sequence[int],
+        sample_every: int = RULE_PROFILE_EVERY,
+        reorder_every: int = RULE_REORDER_EVERY,
+    ):
+        self.sample_every = sample_every
+        self.reorder_every = reorder_every
+        self.evaluations = [[0] * count for count in condition_counts]
+        self.rejections = [[0] * count for count in condition_counts]
+        self.nanoseconds = [[0] * count for count in condition_counts]
+        self.sampled_events = 0
+        self.reorders = 0
+
+    def record(self, position: int, condition: int, passed: bool, elapsed_ns: int):
+        self.evaluations[position][condition] += 1
+        self.nanoseconds[position][condition] += elapsed_ns
+        if not passed:
+            self.rejections[position][condition] += 1
+
+    def event_done(self) -> bool:
+        """Counts a profiled event; True when the rules are due for reordering"""
+        self.sampled_events += 1
+        return self.reorder_every > 0 and self.sampled_events % self.reorder_every == 0
+
+    def order(self, position: int, current: Tuple[int, ...]) -> Tuple[int, ...]:
+        """Condition indices of a rule, most selective per nanosecond first; current order without enough samples"""
+        evaluations = self.evaluations[position]
+        if any(evaluations[condition] < RULE_REORDER_MIN_SAMPLES for condition in current):
+            return current
+
+        def rank(condition):
+            rejections = self.rejections[position][condition]
+            if not rejections:
+                return float("inf")
+            return self.nanoseconds[position][condition] / rejections
+
+        # sorted() is stable: ties keep the current order.
+        return tuple(sorted(current, key=rank))
+
+    def condition_stats(self, position: int, condition: int) -> Dict[str, Any]:
+        evaluations = self.evaluations[position][condition]
+        return {
+            "evaluations": evaluations,
+            "rejections": self.rejections[position][condition],
+            "rejection_rate": round(self.rejections[position][condition] / evaluations, 4) if evaluations else None,
+            "mean_ns": round(self.nanoseconds[position][condition] / evaluations, 1) if evaluations else None,
+        }
+
+    def type_stats(self, condition_types: List[List[str]]) -> Dict[str, Dict[str, Any]]:
+        """Totals by condition type; condition_types[position][condition] is the type of that condition"""
+        totals: Dict[str, List[int]] = {}
+        for position, types in enumerate(condition_types):
+            for condition, kind in enumerate(types):
+                total = totals.setdefault(kind, [0, 0, 0])
+                total[0] += self.evaluations[position][condition]
+                total[1] += self.rejections[position][condition]
+                total[2] += self.nanoseconds[position][condition]
+        return {
+            kind: {
+                "evaluations": evaluations,
+                "rejections": rejections,
+                "rejection_rate": round(rejections / evaluations, 4) if evaluations else None,
+                "mean_ns": round(nanoseconds / evaluations, 1) if evaluations else None,
+            }
+            for kind, (evaluations, rejections, nanoseconds) in sorted(totals.items())
+        }
@@ -0,0 +1,162 @@
+"""
+Database-backed, hot-reloadable rule sets.
+
+Rule sets are versioned rows of the rule_sets table; the active one is
+served by every worker. Each worker holds the active set compiled (see
+rule_compiler.py) and swaps it with a single reference assignment when the
+active version changes, so an event is always evaluated against one
+complete version.
+
+The active version is checked at most every RULES_REFRESH_SECONDS: callers
+ask for current() once per batch, and between checks that costs a clock
+read. A rule set is validated before it is stored and again before a worker
+swaps it in; one that fails keeps the running version in place. Until a
+version is activated, the built-in RULES of data/rules_config.py are served.
+"""
+import datetime
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import database
+import models
+from data.rules_config import RULES
+from services.rule_compiler import CompiledRuleSet, validate_rules
+
+logger = logging.getLogger(__name__)
+
+# A concurrent activation that committed first makes ours violate the single-active index; retry against it.
+ACTIVATE_ATTEMPTS = 3
+
+
+class RuleStore:
+    """Active compiled rule set of this worker, following the rule_sets table"""
+
+    def __init__(
+        self,
+        refresh_interval_seconds: float | None = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ):
+        self.refresh_interval_seconds = (
+            refresh_interval_seconds
+            if refresh_interval_seconds is not None
+            else float(os.getenv("RULES_REFRESH_SECONDS", "5"))
+        )
+        self._session_factory = session_factory
+        self._refresh_lock = threading.Lock()
+        self._active = CompiledRuleSet(RULES)
+        self.version: Optional[int] = None  # None: built-in RULES
+        self.loaded_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._failed_version: Optional[int] = None
+        self._checked_at = float("-inf")
+
+    def current(self) -> CompiledRuleSet:
+        """The active rule set; checks for a new version when the last check is older than the interval"""
+        if time.monotonic() - self._checked_at >= self.refresh_interval_seconds:
+            self.refresh_if_stale()
+        return self._active
+
+    def refresh_if_stale(self, force: bool = False):
+        # Only one thread checks; the others keep evaluating with the current set.
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if not force and time.monotonic() - self._checked_at < self.refresh_interval_seconds:
+                return
+            self._checked_at = time.monotonic()
+            db = (self._session_factory or database.SessionLocal)()
+            try:
+                # Tables created before ix_rule_sets_single_active may hold several active rows; the newest wins.
+                active = db.query(models.RuleSet.version).filter(models.RuleSet.is_active == 1).order_by(
+                    models.RuleSet.activated_at.desc(), models.RuleSet.version.desc()
+                ).limit(1).scalar()
+                if active is None or active == self.version or (active == self._failed_version and not force):
+                    return
+                self._swap(db.get(models.RuleSet, active))
+            finally:
+                db.close()
+        except Exception as exc:
+            logger.error(f"Rule set refresh failed, keeping version {self.version}: {exc}")
+            self.last_error = str(exc)
+        finally:
+            self._refresh_lock.release()
+
+    def _swap(self, rule_set: models.RuleSet):
+        try:
+            compiled = validate_rules(rule_set.rules)
+        except ValueError as exc:
+            self._failed_version = rule_set.version
+            self.last_error = f"version {rule_set.version}: {exc}"
+            logger.error(f"Rule set version {rule_set.version} failed to compile, keeping version {self.version}: {exc}")
+            return
+        self._active = compiled
+        self.version = rule_set.version
+        self.loaded_at = datetime.datetime.utcnow().isoformat()
+        self.last_error = None
+        self._failed_version = None
+        logger.info(f"Rule set version {rule_set.version} ({len(compiled)} rules) is now active")
+
+    # Administration
+
+    def create(
+        self,
+        db: Session,
+        rules: List[Dict[str, Any]],
+        notes: str | None = None,
+        created_by: str | None = None,
+        activate: bool = False,
+    ) -> models.RuleSet:
+        """Stores a new version; raises ValueError, storing nothing, if the rules do not compile"""
+        validate_rules(rules)
+        rule_set = models.RuleSet(rules=rules, notes=notes, created_by=created_by)
+        db.add(rule_set)
+        db.commit()
+        db.refresh(rule_set)
+        if activate:
+            self.activate(db, rule_set.version)
+        return rule_set
+
+    def activate(self, db: Session, version: int) -> models.RuleSet:
+        """Makes version the active rule set of all workers; this worker swaps immediately"""
+        rule_set = db.get(models.RuleSet, version)
+        if rule_set is None:
+            raise KeyError(f"Unknown rule set version {version}")
+        validate_rules(rule_set.rules)
+        for attempt in range(1, ACTIVATE_ATTEMPTS + 1):
+            try:
+                db.query(models.RuleSet).filter(
+                    models.RuleSet.is_active == 1, models.RuleSet.version != version
+                ).update({models.RuleSet.is_active: 0}, synchronize_session=False)
+                rule_set.is_active = 1
+                rule_set.activated_at = datetime.datetime.utcnow()
+                db.commit()
+                break
+            except IntegrityError:
+                db.rollback()
+                if attempt == ACTIVATE_ATTEMPTS:
+                    raise
+                logger.warning(f"Rule set version {version} raced another activation, retrying")
+        db.refresh(rule_set)
+        self._swap(rule_set)
+        self._checked_at = time.monotonic()
+        return rule_set
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "source": "database" if self.version is not None else "rules_config",
+            "rules": len(self._active),
+            "indexed": self._active.index is not None,
+            "loaded_at": self.loaded_at,
+            "last_error": self.last_error,
+            "refresh_interval_seconds": self.refresh_interval_seconds,
+        }
+
+
+rule_store = RuleStore()
@@ -0,0 +1,117 @@
+"""
+Micro-batching in front of MLEngine.
+
+Concurrent single-transaction predict calls (API threads, ingestion workers)
+are coalesced by a background thread into one MLEngine.predict_batch call of
+up to ML_BATCH_MAX_SIZE items, waiting at most ML_BATCH_MAX_WAIT_MS after
+the first item arrives. Each caller gets its own result through a Future.
+"""
+import collections
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Tuple
+
+import ml_engine
+
+
+class ScoringBatcher:
+    """Coalesces concurrent predict() calls into vectorized predict_batch() calls"""
+
+    def __init__(self, max_batch_size: int | None = None, max_wait_ms: float | None = None):
+        self.max_batch_size = max_batch_size or int(os.getenv("ML_BATCH_MAX_SIZE", "64"))
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else float(os.getenv("ML_BATCH_MAX_WAIT_MS", "2"))
+        self._pending: "collections.deque[Tuple[dict, Future]]" = collections.deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._cond:
+            self.batches = 0
+            self.items = 0
+            self.failed_batches = 0
+            # Power-of-two buckets: "1", "2", "3-4", "5-8", ...
+            self._histogram: Dict[int, int] = collections.Counter()
+
+    def submit(self, transaction_data: dict) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._ensure_running()
+            self._pending.append((transaction_data, future))
+            self._cond.notify()
+        return future
+
+    def predict(self, transaction_data: dict, timeout: float | None = None) -> dict:
+        """Drop-in for MLEngine.predict that shares a model call with concurrent callers"""
+        return self.submit(transaction_data).result(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            histogram = {}
+            for bucket in sorted(self._histogram):
+                low = bucket // 2 + 1 if bucket > 1 else 1
+                label = str(bucket) if low == bucket else f"{low}-{bucket}"
+                histogram[label] = self._histogram[bucket]
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "failed_batches": self.failed_batches,
+                "queued": len(self._pending),
+                "batch_size_histogram": histogram,
+            }
+
+    def _ensure_running(self):
+        # A forked worker process inherits the object but not the thread.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._loop, name="ml-scoring-batcher", daemon=True)
+        self._thread.start()
+
+    def _next_batch(self) -> List[Tuple[dict, Future]]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending)
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._pending), self.max_batch_size)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _record(self, size: int, failed: bool):
+        with self._cond:
+            self.batches += 1
+            self.items += size
+            self.failed_batches += failed
+            self._histogram[1 << (size - 1).bit_length()] += 1
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            # Resolved per batch so a model swap takes effect on the next batch.
+            engine = ml_engine.ml_engine
+            try:
+                results = engine.predict_batch([data for data, _ in batch])
+            except Exception:
+                self._record(len(batch), failed=True)
+                # Score one by one so a single bad transaction fails only its own caller.
+                for data, future in batch:
+                    try:
+                        future.set_result(engine.predict(data))
+                    except Exception as exc:
+                        future.set_exception(exc)
+                continue
+            self._record(len(batch), failed=False)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+scoring_batcher = ScoringBatcher()
@@ -0,0 +1,146 @@
+"""
+Streaming NDJSON ingestion: the request body is read incrementally, parsed and
+validated in fixed-size chunks, pushed through the batch pipeline and answered
+with one NDJSON result line per input line. Memory is bounded by the chunk
+size, not the upload size.
+
+A client that disconnects stops ingestion at the next chunk: while the body
+is being read the request stream raises ClientDisconnect, and once it has
+been read the connection is polled before each remaining chunk.
+"""
+import json
+import logging
+import os
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+
+import database
+import schemas
+from services.event_ingestor import ingest_transaction_events_batch
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = int(os.getenv("INGEST_STREAM_CHUNK_SIZE", "500"))
+MAX_LINE_BYTES = int(os.getenv("INGEST_STREAM_MAX_LINE_BYTES", str(1024 * 1024)))
+
+
+class LineTooLongError(ValueError):
+    pass
+
+
+async def iter_ndjson_lines(body: AsyncIterator[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yields (line_number, line) pairs from a byte stream, skipping blank lines"""
+    buffer = bytearray()
+    line_number = 0
+    async for chunk in body:
+        buffer.extend(chunk)
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line_number += 1
+            line = bytes(buffer[start:end]).strip()
+            start = end + 1
+            if line:
+                yield line_number, line
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLongError(f"Line {line_number + 1} exceeds {max_line_bytes} bytes")
+    tail = bytes(buffer).strip()
+    if tail:
+        yield line_number + 1, tail
+
+
+def _result_line(payload: dict) -> bytes:
+    return (json.dumps(payload, default=str) + "\n").encode("utf-8")
+
+
+def _ingest_chunk(db: Session, chunk: List[Tuple[int, bytes]]) -> List[dict]:
+    results: List[dict] = []
+    events = []
+    positions = []
+    for line_number, line in chunk:
+        try:
+            event = schemas.TransactionEvent.model_validate_json(line)
+        except ValidationError as exc:
+            results.append({
+                "line": line_number,
+                "event_id": None,
+                "status": "INVALID",
+                "message": exc.errors(include_url=False, include_input=False)[0]["msg"],
+            })
+            continue
+        positions.append((len(results), line_number))
+        results.append({})
+        events.append(event)
+
+    if events:
+        responses = ingest_transaction_events_batch(db, events)
+        for (index, line_number), response in zip(positions, responses):
+            results[index] = {"line": line_number, **response.model_dump()}
+    return results
+
+
+async def stream_ingest_ndjson(
+    body: AsyncIterator[bytes],
+    session_factory: Callable[[], Session] | None = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Ingests an NDJSON byte stream chunk by chunk and yields NDJSON results.
+    is_disconnected (e.g. Request.is_disconnected) is only polled after the
+    body has been read: polling earlier could consume a body message.
+    """
+    db = (session_factory or database.SessionLocal)()
+    chunk: List[Tuple[int, bytes]] = []
+    totals = {"lines": 0, "processed": 0, "failed": 0, "invalid": 0}
+
+    async def client_gone() -> bool:
+        if is_disconnected is not None and await is_disconnected():
+            logger.info(f"NDJSON stream client disconnected after {totals['lines']:,} lines")
+            return True
+        return False
+
+    async def flush():
+        for result in await run_in_threadpool(_ingest_chunk, db, chunk):
+            totals["lines"] += 1
+            if result["status"] == "INVALID":
+                totals["invalid"] += 1
+            elif result["status"] == "FAILED":
+                totals["failed"] += 1
+            else:
+                totals["processed"] += 1
+            yield _result_line(result)
+        chunk.clear()
+
+    try:
+        try:
+            async for item in iter_ndjson_lines(body):
+                chunk.append(item)
+                if len(chunk) >= chunk_size:
+                    async for line in flush():
+                        yield line
+        except LineTooLongError as exc:
+            if chunk and not await client_gone():
+                async for line in flush():
+                    yield line
+            yield _result_line({"status": "ABORTED", "message": str(exc), **totals})
+            return
+        except ClientDisconnect:
+            logger.info(f"NDJSON stream client disconnected after {totals['lines']:,} lines")
+            return
+
+        if await client_gone():
+            return
+        if chunk:
+            async for line in flush():
+                yield line
+        yield _result_line({"status": "COMPLETED", **totals})
+    finally:
+        db.close()
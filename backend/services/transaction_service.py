@@ -2,7 +2,46 @@ import datetime
 from sqlalchemy.orm import Session
 import models
 import schemas
-import ml_engine
+from services.scoring_batcher import scoring_batcher
+
+
+def resolve_transaction_status(risk_result: dict, decision: dict | None = None) -> str:
+    if decision and decision.get("status_override"):
+        return decision["status_override"]
+    if risk_result["score"] > 800:
+        return "BLOCK"
+    if risk_result["score"] > 500:
+        return "CHALLENGE"
+    return "ALLOW"
+
+
+def build_transaction_record(
+    transaction: schemas.TransactionCreate,
+    risk_result: dict,
+    decision: dict | None = None,
+) -> models.Transaction:
+    """
+    Builds an unsaved Transaction with its RiskScore attached, so batch callers
+    can add many of them to a session and flush them in one unit of work.
+    """
+    db_transaction = models.Transaction(
+        transaction_id=transaction.transaction_id,
+        user_id=transaction.user_id,
+        amount=transaction.amount,
+        currency=transaction.currency,
+        merchant=transaction.merchant,
+        ip_address=transaction.ip_address,
+        location=transaction.location,
+        device_id=transaction.device_id,
+        timestamp=transaction.timestamp or datetime.datetime.utcnow(),
+        status=resolve_transaction_status(risk_result, decision)
+    )
+    db_transaction.risk_score = models.RiskScore(
+        score=risk_result["score"],
+        confidence=risk_result["confidence"],
+        reason=risk_result["reason"]
+    )
+    return db_transaction
 
 
 def create_transaction_record(db: Session, transaction: schemas.TransactionCreate, decision: dict | None = None) -> models.Transaction:
@@ -26,7 +65,7 @@ def create_transaction_record(db: Session, transaction: schemas.TransactionCreat
     db.commit()
     db.refresh(db_transaction)
 
-    risk_result = ml_engine.ml_engine.predict(transaction.dict())
+    risk_result = scoring_batcher.predict(transaction.dict())
 
     db_risk = models.RiskScore(
         transaction_id=db_transaction.id,
@@ -36,17 +75,8 @@ def create_transaction_record(db: Session, transaction: schemas.TransactionCreat
     )
     db.add(db_risk)
 
-    if decision and decision.get("status_override"):
-        db_transaction.status = decision["status_override"]
-    else:
-        if risk_result["score"] > 800:
-            db_transaction.status = "BLOCK"
-        elif risk_result["score"] > 500:
-            db_transaction.status = "CHALLENGE"
-        else:
-            db_transaction.status = "ALLOW"
+    db_transaction.status = resolve_transaction_status(risk_result, decision)
 
     db.commit()
     db.refresh(db_transaction)
     return db_transaction
-
@@ -0,0 +1,267 @@
+"""
+Shadow (champion/challenger) scoring.
+
+Challenger models registered on the champion MLEngine score the same
+feature matrix as the champion, off the critical path: the champion only
+hands the matrix and its own scores to a bounded queue and returns. When
+the queue is full the batch is dropped and counted. A background thread
+coalesces queued batches and scores them in a dedicated single-worker
+process that holds the shadow engines, so shadow scoring does not compete
+with the champion for the GIL either.
+
+Each shadow keeps a fixed-size ring buffer of (timestamp, champion score,
+shadow score) from which agreement and divergence statistics are computed
+on demand.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Score cut-offs of the ALLOW / CHALLENGE / BLOCK decisions (see resolve_transaction_status)
+DECISION_THRESHOLDS = np.array([500, 800])
+DIVERGENCE_THRESHOLD = 100
+# Upper bound on rows coalesced into one shadow scoring call
+SHADOW_MAX_BATCH_ROWS = 4096
+
+# Shadow engines loaded in the shadow process, by model directory.
+_process_engines: Dict[str, Any] = {}
+
+
+def _init_shadow_process():
+    # Lower priority, so shadow scoring yields the CPU to the champion's workers.
+    if hasattr(os, "nice"):
+        os.nice(int(os.getenv("ML_SHADOW_NICE", "10")))
+
+
+def _shadow_engine(model_dir: str):
+    import ml_engine  # imported here: ml_engine itself imports this module
+
+    if model_dir not in _process_engines:
+        engine = ml_engine.MLEngine(model_dir)
+        if not engine.use_ensemble:
+            raise RuntimeError(f"Shadow model in {model_dir} could not be loaded")
+        _process_engines[model_dir] = engine
+    return _process_engines[model_dir]
+
+
+def _warm_shadow(model_dir: str, transactions: List[dict]) -> int:
+    return len(_shadow_engine(model_dir).predict_batch(transactions))
+
+
+def _unload_shadow(model_dir: str):
+    _process_engines.pop(model_dir, None)
+
+
+def _score_shadow(model_dir: str, features: np.ndarray, feature_columns: List[str]) -> np.ndarray:
+    engine = _shadow_engine(model_dir)
+    if engine.feature_columns != feature_columns:
+        features = features[:, [feature_columns.index(column) for column in engine.feature_columns]]
+    results = engine.predict_ensemble_batch(features)
+    return np.fromiter((result["score"] for result in results), dtype=np.int16, count=len(results))
+
+
+class ShadowBuffer:
+    """Ring buffer of champion and shadow scores for one shadow model"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity)
+        self.champion = np.zeros(capacity, dtype=np.int16)
+        self.shadow = np.zeros(capacity, dtype=np.int16)
+        self.size = 0
+        self.position = 0
+
+    def append(self, champion: np.ndarray, shadow: np.ndarray):
+        now = time.time()
+        for start in range(0, len(champion), self.capacity):
+            chunk = slice(start, start + self.capacity)
+            count = len(champion[chunk])
+            indexes = (self.position + np.arange(count)) % self.capacity
+            self.timestamps[indexes] = now
+            self.champion[indexes] = champion[chunk]
+            self.shadow[indexes] = shadow[chunk]
+            self.position = (self.position + count) % self.capacity
+            self.size = min(self.capacity, self.size + count)
+
+    def ordered(self):
+        """Buffer contents, oldest first"""
+        indexes = (self.position - self.size + np.arange(self.size)) % self.capacity
+        return self.timestamps[indexes], self.champion[indexes], self.shadow[indexes]
+
+
+class ShadowScorer:
+    """Background scoring of champion feature matrices by registered shadow models"""
+
+    def __init__(self, buffer_size: int | None = None, queue_size: int | None = None):
+        self.buffer_size = buffer_size or int(os.getenv("ML_SHADOW_BUFFER_SIZE", "10000"))
+        self.queue_size = queue_size or int(os.getenv("ML_SHADOW_QUEUE_SIZE", "1024"))
+        # How long the shadow thread gathers champion batches before scoring them together
+        self.flush_seconds = float(os.getenv("ML_SHADOW_FLUSH_MS", "50")) / 1000
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._executor: ProcessPoolExecutor | None = None
+        self._carry = None
+        self.shadows: Dict[str, str] = {}
+        self.buffers: Dict[str, ShadowBuffer] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.dropped_batches = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self.shadows)
+
+    def _process(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn"), initializer=_init_shadow_process
+                )
+            return self._executor
+
+    def _reset_process(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def register(self, name: str, model_dir: str, warmup: List[dict]):
+        """Loads and warms model_dir in the shadow process; raises if it cannot score"""
+        self._process().submit(_warm_shadow, model_dir, warmup).result()
+        with self._lock:
+            self.shadows[name] = model_dir
+            self.buffers[name] = ShadowBuffer(self.buffer_size)
+            self.counters[name] = {"scored": 0, "errors": 0}
+        logger.info(f"Shadow model {name} registered")
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            self.buffers.pop(name, None)
+            self.counters.pop(name, None)
+            model_dir = self.shadows.pop(name, None)
+            executor = self._executor
+        if model_dir is not None and executor is not None and model_dir not in self.shadows.values():
+            try:
+                executor.submit(_unload_shadow, model_dir)
+            except (BrokenProcessPool, RuntimeError):
+                pass
+        return model_dir is not None
+
+    def close(self):
+        self._reset_process()
+
+    def observe(self, features: np.ndarray, feature_columns: List[str], results: List[Dict]):
+        """Queues a champion batch for shadow scoring; never blocks"""
+        champion_scores = np.fromiter((result["score"] for result in results), dtype=np.int16, count=len(results))
+        try:
+            self._ensure_running()
+            self._queue.put_nowait((features, feature_columns, champion_scores))
+        except queue.Full:
+            with self._lock:
+                self.dropped_batches += 1
+
+    def _ensure_running(self):
+        # A forked worker process inherits the object but not the thread.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="ml-shadow-scorer", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        """Blocks for one queued batch, waits one flush interval, then coalesces queued batches with the same columns"""
+        item, self._carry = self._carry, None
+        features, feature_columns, champion_scores = item or self._queue.get()
+        time.sleep(self.flush_seconds)
+        parts, scores, rows = [features], [champion_scores], len(features)
+        while rows < SHADOW_MAX_BATCH_ROWS:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[1] != feature_columns:
+                # Columns changed (champion swap); score what was gathered so far first.
+                self._carry = item
+                break
+            parts.append(item[0])
+            scores.append(item[2])
+            rows += len(item[0])
+        return np.vstack(parts), feature_columns, np.concatenate(scores)
+
+    def _loop(self):
+        while True:
+            features, feature_columns, champion_scores = self._next_batch()
+            with self._lock:
+                shadows = list(self.shadows.items())
+            for name, model_dir in shadows:
+                try:
+                    shadow_scores = self._process().submit(_score_shadow, model_dir, features, feature_columns).result()
+                except Exception as exc:
+                    logger.warning(f"Shadow model {name} failed to score a batch: {exc}")
+                    if isinstance(exc, BrokenProcessPool):
+                        # Restarted lazily; engines are reloaded on first use.
+                        self._reset_process()
+                    with self._lock:
+                        if name in self.counters:
+                            self.counters[name]["errors"] += 1
+                    continue
+                with self._lock:
+                    if name in self.buffers:
+                        self.buffers[name].append(champion_scores, shadow_scores)
+                        self.counters[name]["scored"] += len(shadow_scores)
+
+    def stats(self) -> Dict[str, Any]:
+        """Agreement and divergence of every shadow with the champion over its buffer"""
+        with self._lock:
+            snapshot = {name: (self.buffers[name].ordered(), dict(self.counters[name])) for name in self.shadows}
+            stats: Dict[str, Any] = {
+                "buffer_size": self.buffer_size,
+                "queued_batches": self._queue.qsize(),
+                "dropped_batches": self.dropped_batches,
+                "shadows": {},
+            }
+        for name, ((_, champion, shadow), counters) in snapshot.items():
+            entry: Dict[str, Any] = {**counters, "buffered": len(champion)}
+            if len(champion):
+                champion = champion.astype(np.int32)
+                shadow = shadow.astype(np.int32)
+                diff = shadow - champion
+                entry.update(
+                    decision_agreement=round(float(np.mean(
+                        np.searchsorted(DECISION_THRESHOLDS, champion) == np.searchsorted(DECISION_THRESHOLDS, shadow)
+                    )), 4),
+                    mean_score_diff=round(float(diff.mean()), 2),
+                    mean_abs_score_diff=round(float(np.abs(diff).mean()), 2),
+                    max_abs_score_diff=int(np.abs(diff).max()),
+                    divergent_fraction=round(float(np.mean(np.abs(diff) > DIVERGENCE_THRESHOLD)), 4),
+                    # Undefined when either side scored a constant over the buffer
+                    score_correlation=round(float(np.corrcoef(champion, shadow)[0, 1]), 4)
+                    if champion.std() > 0 and shadow.std() > 0 else None,
+                )
+            stats["shadows"][name] = entry
+        return stats
+
+    def samples(self, name: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent champion/shadow score pairs, newest first"""
+        with self._lock:
+            if name not in self.buffers:
+                raise KeyError(name)
+            timestamps, champion, shadow = self.buffers[name].ordered()
+        return [
+            {"timestamp": float(timestamps[i]), "champion_score": int(champion[i]), "shadow_score": int(shadow[i])}
+            for i in range(len(champion) - 1, max(len(champion) - 1 - limit, -1), -1)
+        ]
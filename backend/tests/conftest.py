@@ -5,7 +5,7 @@ from sqlalchemy.orm import sessionmaker
 from main import app
 from database import Base, get_db
 import models
-import os
+from services.idempotency_index import idempotency_index
 
 # Use in-memory SQLite for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -15,6 +15,12 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+@pytest.fixture(autouse=True)
+def reset_idempotency_index():
+    idempotency_index.clear()
+    yield
+
+
 @pytest.fixture(scope="function")
 def db():
     Base.metadata.create_all(bind=engine)
@@ -37,3 +43,28 @@ def client(db):
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def trained_model_dir(tmp_path):
+    """Tiny XGBoost/LightGBM/RandomForest ensemble artifacts over four of the real feature columns"""
+    import joblib
+    import lightgbm as lgb
+    import numpy as np
+    import xgboost as xgb
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(3)
+    X = rng.standard_normal((400, 4)) * [100.0, 5.0, 1.0, 10.0] + [500.0, 12.0, 0.0, 3.0]
+    y = (X[:, 0] + 40 * X[:, 2] + rng.standard_normal(400) * 50 > 520).astype(int)
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+
+    joblib.dump(xgb.XGBClassifier(n_estimators=15, max_depth=3).fit(X_scaled, y), tmp_path / "model_xgboost.pkl")
+    joblib.dump(lgb.LGBMClassifier(n_estimators=15, num_leaves=7, verbose=-1).fit(X_scaled, y), tmp_path / "model_lightgbm.pkl")
+    joblib.dump(RandomForestClassifier(n_estimators=10, max_depth=5, random_state=0).fit(X_scaled, y), tmp_path / "model_rf.pkl")
+    joblib.dump(scaler, tmp_path / "scaler.pkl")
+    joblib.dump(["amount", "hour_of_day", "location_change_speed", "transaction_frequency"], tmp_path / "feature_columns.pkl")
+    joblib.dump({"xgb_weight": 0.4, "lgb_weight": 0.35, "rf_weight": 0.25, "hash_scheme": "crc32"}, tmp_path / "ensemble_config.pkl")
+    return tmp_path
@@ -0,0 +1,57 @@
+"""
+Reference rule interpreter, the test oracle for the compiled evaluator.
+
+Serving evaluates rules compiled by services/rule_compiler.py; this plain
+interpreter of the rule dicts is kept out of the production modules and only
+checks, in tests and benchmarks/bench_rules.py, that the compiled, indexed
+and batch paths return the same hits.
+"""
+from typing import Any, Dict, List
+
+
+def _match_condition(condition: Dict[str, Any], transaction: Dict[str, Any], enrichment: Dict[str, Any]) -> bool:
+    cond_type = condition["type"]
+    derived = enrichment.get("derived_features", {})
+    signals = enrichment.get("signals", {})
+    if cond_type == "amount_greater_than":
+        return transaction["amount"] > condition["value"]
+    if cond_type == "amount_less_than":
+        return transaction["amount"] < condition["value"]
+    if cond_type == "amount_between":
+        return condition["min"] <= transaction["amount"] <= condition["max"]
+    if cond_type == "country_in":
+        return (enrichment.get("geo_country") or "").upper() in condition["value"]
+    if cond_type == "ip_risk_above":
+        return (enrichment.get("ip_risk_score") or 0) > condition["value"]
+    if cond_type == "ip_reputation_equals":
+        return (enrichment.get("ip_reputation") or "") == condition["value"]
+    if cond_type == "velocity_flag_equals":
+        flag = derived.get("velocity_flag") if derived else transaction.get("velocity_flag")
+        return flag == condition["value"]
+    if cond_type == "device_change_equals":
+        val = derived.get("device_change") if derived else transaction.get("device_change")
+        return val == condition["value"]
+    if cond_type == "user_segment_in":
+        segment = enrichment.get("user_segment") or signals.get("behavioral", {}).get("segment")
+        return segment in condition["value"]
+    return False
+
+
+def interpret_rules(
+    transaction: Dict[str, Any],
+    enrichment: Dict[str, Any],
+    rules: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Rule hits of one event, re-reading every condition on every call"""
+    hits = []
+    for rule in rules:
+        matched = all(_match_condition(cond, transaction, enrichment) for cond in rule["conditions"])
+        if matched:
+            hits.append({
+                "rule_id": rule["id"],
+                "rule_name": rule["name"],
+                "severity": rule["severity"],
+                "action": rule["action"],
+                "reason": rule.get("reason", ""),
+            })
+    return hits
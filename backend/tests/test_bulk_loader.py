@@ -0,0 +1,50 @@
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from services.bulk_loader import load_checkpoint, load_files
+
+
+def _write_events(path, count, offset=0):
+    with open(path, "w") as f:
+        for i in range(offset, offset + count):
+            f.write(json.dumps({
+                "event_id": f"evt-{i}",
+                "transaction_id": f"txn-{i}",
+                "user_id": "alisher_karimov_001",
+                "amount": 120.0 + i,
+                "merchant": "Korzinka.uz",
+                "ip_address": "10.0.0.1",
+                "location": "Tashkent, Uzbekistan",
+                "device_id": "iphone_1234",
+            }) + "\n")
+
+
+def test_load_files_is_resumable_and_skips_duplicates(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'load.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    source = tmp_path / "events.jsonl"
+    checkpoint = str(tmp_path / "load.ckpt")
+    _write_events(source, 7)
+
+    summary = load_files(engine, [str(source)], batch_size=3, workers=1, checkpoint_path=checkpoint)
+    assert summary["loaded"] == 7
+    assert load_checkpoint(checkpoint) == {str(source.resolve()): 7}
+
+    # A rerun resumes after the committed rows; a fresh file with overlapping ids only adds new events.
+    assert load_files(engine, [str(source)], batch_size=3, workers=1, checkpoint_path=checkpoint)["read"] == 0
+    _write_events(source, 5, offset=5)
+    summary = load_files(engine, [str(source)], batch_size=3, workers=1)
+    assert summary["loaded"] == 3
+    assert summary["duplicates"] == 2
+
+    db = sessionmaker(bind=engine)()
+    try:
+        assert db.query(models.IngestedEvent).count() == 10
+        assert db.query(models.Transaction).count() == 10
+        assert db.query(models.RiskScore).count() == 10
+        assert sum(m.total_events for m in db.query(models.EventMetric)) == 10
+    finally:
+        db.close()
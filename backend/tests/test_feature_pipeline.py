@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import FEATURE_COLUMNS, FeaturePipeline, add_derived_features
+
+
+def _transactions():
+    return [
+        {"amount": 120.0, "merchant": "Makro", "location": "Tashkent", "hour_of_day": 3},
+        {"amount": 7500, "location": "abroad", "hour_of_day": 23, "day_of_week": 6, "transaction_frequency": 12},
+        {"amount": 25000.0, "merchant": "Korzinka", "location": "", "avg_transaction_amount": 80.0, "device_change": 1},
+        {},
+    ]
+
+
+def test_single_row_fast_path_matches_batch_transform():
+    for columns in (FEATURE_COLUMNS, list(reversed(FEATURE_COLUMNS))):
+        pipeline = FeaturePipeline(columns)
+        batch = pipeline.transform(_transactions())
+        assert batch.shape == (4, len(FEATURE_COLUMNS))
+        assert np.array_equal(batch, np.vstack([pipeline.transform_one(t) for t in _transactions()]))
+
+
+def test_float32_pipeline_builds_contiguous_float32_rows():
+    pipeline = FeaturePipeline(dtype=np.float32)
+    batch = pipeline.transform(_transactions())
+    assert batch.dtype == np.float32 and batch.flags.c_contiguous
+    assert np.array_equal(batch, np.vstack([pipeline.transform_one(t) for t in _transactions()]))
+    assert np.array_equal(batch, FeaturePipeline().transform(_transactions()).astype(np.float32))
+
+
+def test_training_dataframe_gets_the_same_derived_features():
+    pipeline = FeaturePipeline()
+    served = pd.DataFrame(pipeline.transform(_transactions()), columns=FEATURE_COLUMNS)
+    trained = add_derived_features(served.drop(columns=["is_night", "is_weekend", "amount_deviation", "velocity_flag"]))
+    assert np.array_equal(trained[FEATURE_COLUMNS].to_numpy(dtype=float), served.to_numpy())
+    assert served[["is_night", "is_weekend", "velocity_flag"]].values.tolist()[1] == [1, 1, 1]
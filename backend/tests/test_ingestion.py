@@ -0,0 +1,146 @@
+import time
+
+import pytest
+
+import models
+import schemas
+from services.event_ingestor import ingest_transaction_event, ingest_transaction_events_batch
+from services.idempotency_index import IdempotencyIndex, idempotency_index
+
+
+def _event(event_id, transaction_id, amount=120.0, ip_address="10.0.0.1", location="Tashkent, Uzbekistan"):
+    return schemas.TransactionEvent(
+        event_id=event_id,
+        source_system="gateway",
+        transaction={
+            "transaction_id": transaction_id,
+            "user_id": "alisher_karimov_001",
+            "amount": amount,
+            "merchant": "Korzinka.uz",
+            "ip_address": ip_address,
+            "location": location,
+            "device_id": "iphone_1234",
+        },
+    )
+
+
+def test_single_ingest_creates_daily_metric(db):
+    response = ingest_transaction_event(db, _event("evt-1", "txn-1"))
+    assert response.status == "PROCESSED"
+    metric = db.query(models.EventMetric).one()
+    assert metric.total_events == 1
+
+
+def test_batch_ingest_persists_every_event(db):
+    events = [
+        _event("evt-1", "txn-1"),
+        _event("evt-2", "txn-2", amount=15000, ip_address="45.10.0.1", location="Dubai, UAE"),
+        _event("evt-3", "txn-3"),
+    ]
+    results = ingest_transaction_events_batch(db, events)
+
+    assert [r.status for r in results] == ["PROCESSED"] * 3
+    assert all(r.transaction_id for r in results)
+    assert db.query(models.Transaction).count() == 3
+    assert db.query(models.EventSnapshot).count() == 3
+    assert db.query(models.EnrichedEventContext).count() == 3
+    assert db.query(models.EventMetric).one().total_events == 3
+
+    blocked = db.query(models.IngestedEvent).filter(models.IngestedEvent.event_id == "evt-2").one()
+    assert blocked.transaction.status == "BLOCK"
+    assert {e.rule_id for e in blocked.rule_evaluations} == {"high_amount_risky_geo"}
+    assert db.query(models.AutomatedAction).count() == 1
+
+
+def test_batch_ingest_reports_known_and_repeated_events(db):
+    ingest_transaction_events_batch(db, [_event("evt-1", "txn-1")])
+
+    results = ingest_transaction_events_batch(db, [_event("evt-1", "txn-1"), _event("evt-2", "txn-2"), _event("evt-2", "txn-2")])
+
+    assert results[0].message == "Event already processed"
+    assert results[1].transaction_id == results[2].transaction_id
+    assert db.query(models.Transaction).count() == 2
+
+
+def test_batch_ingest_falls_back_when_commit_is_rejected(db):
+    ingest_transaction_events_batch(db, [_event("evt-1", "txn-1")])
+
+    results = ingest_transaction_events_batch(db, [_event("evt-2", "txn-1"), _event("evt-3", "txn-3")])
+
+    assert results[0].status == "FAILED"
+    assert results[1].status == "PROCESSED"
+
+
+def test_batch_retry_unknown_to_the_index_keeps_the_single_commit(db, monkeypatch):
+    import services.event_ingestor as event_ingestor
+
+    ingest_transaction_events_batch(db, [_event(f"evt-{i}", f"txn-{i}") for i in range(5)])
+    # Another worker, or this one after a restart, has never seen these ids.
+    idempotency_index.clear()
+    monkeypatch.setattr(event_ingestor, "_ingest_individually", lambda *args: pytest.fail("batch fell back"))
+
+    results = ingest_transaction_events_batch(db, [_event(f"evt-{i}", f"txn-{i}") for i in range(3, 8)])
+
+    assert [r.message == "Event already processed" for r in results] == [True, True, False, False, False]
+    assert [r.status for r in results[2:]] == ["PROCESSED"] * 3
+    assert db.query(models.Transaction).count() == 8
+
+
+def test_batch_claims_stored_events_before_rerunning_them(db, monkeypatch):
+    import services.event_ingestor as event_ingestor
+
+    for event_id, status in (("evt-busy", "PROCESSING"), ("evt-failed", "FAILED")):
+        db.add(models.IngestedEvent(
+            event_id=event_id, source_system="gateway", event_type="transaction", status=status,
+            payload=_event(event_id, f"txn-{event_id}").model_dump(mode="json"),
+        ))
+    db.flush()
+    failed = db.query(models.IngestedEvent).filter(models.IngestedEvent.event_id == "evt-failed").one()
+    # A leftover of the failed attempt; the unique context row would reject the batch commit.
+    db.add(models.EnrichedEventContext(ingested_event_id=failed.id, geo_country="uzbekistan"))
+    db.commit()
+    monkeypatch.setattr(event_ingestor, "_ingest_individually", lambda *args: pytest.fail("batch fell back"))
+
+    busy, rerun = ingest_transaction_events_batch(db, [_event("evt-busy", "txn-evt-busy"), _event("evt-failed", "txn-evt-failed")])
+
+    assert busy.status == "PROCESSING" and busy.transaction_id is None
+    assert rerun.status == "PROCESSED" and rerun.transaction_id
+    assert db.query(models.Transaction).count() == 1
+    assert db.query(models.EnrichedEventContext).count() == 1
+
+
+def test_resubmitted_failed_event_is_rerun_by_both_routes(db):
+    for event_id in ("evt-single", "evt-batch"):
+        db.add(models.IngestedEvent(
+            event_id=event_id, source_system="gateway", event_type="transaction", status="FAILED",
+            payload=_event(event_id, f"txn-{event_id}").model_dump(mode="json"),
+        ))
+    db.commit()
+
+    single = ingest_transaction_event(db, _event("evt-single", "txn-evt-single"))
+    batch = ingest_transaction_events_batch(db, [_event("evt-batch", "txn-evt-batch")])[0]
+
+    assert single.status == batch.status == "PROCESSED"
+    assert single.transaction_id and batch.transaction_id
+
+
+def test_retried_event_is_answered_from_idempotency_index(db):
+    first = ingest_transaction_event(db, _event("evt-1", "txn-1"))
+    db.close()
+
+    retry = ingest_transaction_event(db, _event("evt-1", "txn-1"))
+
+    assert retry.message == "Event already processed"
+    assert retry.transaction_id == first.transaction_id
+    assert idempotency_index.stats()["hits"] == 1
+
+
+def test_idempotency_index_expires_entries_after_window():
+    index = IdempotencyIndex(capacity=100, window_seconds=0.05)
+    index.remember("evt-1", 7, "PROCESSED")
+    assert index.lookup("evt-1") == {"transaction_id": 7, "status": "PROCESSED"}
+    assert index.might_contain("evt-1")
+    assert not index.might_contain("evt-2")
+
+    time.sleep(0.06)
+    assert index.lookup("evt-1") is None
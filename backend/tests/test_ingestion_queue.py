@@ -0,0 +1,127 @@
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+import schemas
+from database import Base
+from services.event_ingestor import process_ingested_event, receive_transaction_event
+from services.ingestion_queue import IngestionQueue
+from services.priority_scheduler import WeightedPriorityQueue
+
+
+def _session_factory(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _event(event_id):
+    return schemas.TransactionEvent(
+        event_id=event_id,
+        source_system="gateway",
+        transaction={
+            "transaction_id": f"txn-{event_id}",
+            "user_id": "malika_rahimov_002",
+            "amount": 250.0,
+            "merchant": "Makro",
+            "ip_address": "10.0.0.1",
+            "location": "Tashkent, Uzbekistan",
+            "device_id": "android_5555",
+        },
+    )
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_workers_process_received_events(tmp_path):
+    Session = _session_factory(tmp_path / "queue.db")
+    ingestion_queue = IngestionQueue(workers=2, capacity=10, session_factory=Session)
+    ingestion_queue.start()
+    try:
+        db = Session()
+        for i in range(3):
+            record = receive_transaction_event(db, _event(f"evt-{i}"))
+            assert record.status == "RECEIVED"
+            assert ingestion_queue.submit(record.id)
+
+        assert _wait_for(lambda: ingestion_queue.stats()["processed"] == 3)
+        db.expire_all()
+        statuses = {r.status for r in db.query(models.IngestedEvent)}
+        assert statuses == {"PROCESSED"}
+        db.close()
+    finally:
+        ingestion_queue.stop()
+
+
+def test_submit_rejects_when_queue_is_full(tmp_path):
+    Session = _session_factory(tmp_path / "queue.db")
+    ingestion_queue = IngestionQueue(workers=1, capacity=1, session_factory=Session)
+
+    assert ingestion_queue.submit(1)
+    assert not ingestion_queue.submit(2)
+    assert ingestion_queue.stats()["rejected"] == 1
+    assert not ingestion_queue.has_capacity()
+
+
+def test_weighted_queue_serves_high_priority_first_without_starving_low():
+    scheduler = WeightedPriorityQueue(capacity_per_class=100, weights={"high": 3, "normal": 1, "low": 1})
+    for i in range(20):
+        scheduler.put_nowait(f"low-{i}", "low")
+        scheduler.put_nowait(f"high-{i}", "high")
+
+    served = [scheduler.get(timeout=0)[1] for _ in range(8)]
+
+    assert served.count("high") == 6
+    assert served.count("low") == 2
+    assert scheduler.stats()["high"]["dequeued"] == 6
+
+
+def test_unknown_priority_is_scheduled_as_normal():
+    scheduler = WeightedPriorityQueue(capacity_per_class=1)
+    scheduler.put_nowait("a", "URGENT-ish")
+    assert scheduler.full("normal")
+    assert not scheduler.full("high")
+
+
+def test_recovery_fills_each_priority_class_up_to_its_capacity(tmp_path):
+    Session = _session_factory(tmp_path / "recover.db")
+    db = Session()
+    priorities = ["high"] * 3 + ["normal", "URGENT", None, "normal"] + ["low"]
+    for i, priority in enumerate(priorities):
+        receive_transaction_event(db, _event(f"evt-{i}").model_copy(update={"priority": priority}))
+
+    ingestion_queue = IngestionQueue(workers=1, capacity=2, session_factory=Session)
+    assert ingestion_queue.recover_pending(db) == 5
+    stats = ingestion_queue.stats()
+    assert {name: stats["priorities"][name]["depth"] for name in ("high", "normal", "low")} == {"high": 2, "normal": 2, "low": 1}
+    # Events left over were never offered by a client.
+    assert stats["rejected"] == 0
+    db.close()
+
+
+def test_only_one_worker_processes_a_recovered_event(tmp_path):
+    Session = _session_factory(tmp_path / "claim.db")
+    db = Session()
+    record = receive_transaction_event(db, _event("evt-1"))
+    # Two uvicorn workers both recovered this RECEIVED event at startup.
+    first, second = Session(), Session()
+    first_record, second_record = first.get(models.IngestedEvent, record.id), second.get(models.IngestedEvent, record.id)
+    winner = process_ingested_event(first, first_record)
+    loser = process_ingested_event(second, second_record)
+
+    assert winner.status == "PROCESSED"
+    assert loser.message == "Event already processed" and loser.transaction_id == winner.transaction_id
+    db.expire_all()
+    assert db.get(models.IngestedEvent, record.id).status == "PROCESSED"
+    assert db.query(models.Transaction).count() == 1
+    for session in (db, first, second):
+        session.close()
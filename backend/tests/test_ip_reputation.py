@@ -0,0 +1,48 @@
+import numpy as np
+
+from services.enrichment_service import _lookup_ip_reputation
+from services.ip_reputation import IPReputationTable, pack_ipv4
+
+
+def test_most_specific_range_wins_for_both_families(tmp_path):
+    path = tmp_path / "ip_reputation.csv"
+    path.write_text(
+        "# cidr,reputation,risk_score\n"
+        "10.0.0.0/8,corporate_network,0.1\n"
+        "10.20.0.0/16,anonymous_proxy,0.8\n"
+        "10.20.30.0/24,botnet,0.95\n"
+        "\n"
+        "2001:db8::/32,datacenter,0.5\n"
+        "2001:db8:1::/48,tor_exit,0.9\n"
+        "2001:db8:1::/48,tor_exit,0.97\n"
+    )
+    table = IPReputationTable.from_file(str(path))
+
+    expected = {
+        "9.255.255.255": ("unknown", 0.35),
+        "10.0.0.0": ("corporate_network", 0.1),
+        "10.20.29.255": ("anonymous_proxy", 0.8),
+        "10.20.30.7": ("botnet", 0.95),
+        "10.20.31.0": ("anonymous_proxy", 0.8),
+        "10.255.255.255": ("corporate_network", 0.1),
+        "11.0.0.0": ("unknown", 0.35),
+        "2001:db8::1": ("datacenter", 0.5),
+        "2001:db8:1:ffff::": ("tor_exit", 0.97),
+        "2001:db8:2::": ("datacenter", 0.5),
+        "2001:db9::": ("unknown", 0.35),
+        "not-an-ip": ("unknown", 0.35),
+    }
+    for address, (reputation, risk_score) in expected.items():
+        assert table.lookup(address) == {"reputation": reputation, "risk_score": risk_score}, address
+
+    ipv4 = [address for address in expected if "." in address]
+    reputations, risk_scores = table.lookup_batch(pack_ipv4(ipv4))
+    assert reputations.tolist() == [expected[address][0] for address in ipv4]
+    assert np.allclose(risk_scores, [expected[address][1] for address in ipv4])
+
+
+def test_reference_prefixes_keep_their_reputation():
+    table = IPReputationTable.from_reference_data()
+    assert table.lookup("45.12.0.1") == {"reputation": "botnet", "risk_score": 0.92}
+    assert table.lookup("145.12.0.1")["reputation"] == "unknown"
+    assert _lookup_ip_reputation("66.249.66.1")["reputation"] == "trusted_partner"
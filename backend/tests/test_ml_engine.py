@@ -0,0 +1,148 @@
+import os
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+import pytest
+
+from cascade import CascadeStage
+from feature_hashing import hash_bucket
+import ml_engine
+from tree_engine import export_ensemble
+
+
+def _transactions():
+    return [
+        {"amount": amount, "merchant": "Makro", "location": location, "hour_of_day": hour}
+        for amount, location, hour in [(120.0, "Tashkent", 3), (7500.0, "abroad", 14), (25000.0, "", 23)]
+    ]
+
+
+def test_predict_batch_matches_predict():
+    engine = ml_engine.ml_engine
+    np.random.seed(7)
+    single = [engine.predict(transaction) for transaction in _transactions()]
+    np.random.seed(7)
+    assert engine.predict_batch(_transactions()) == single
+    assert engine.predict_batch([]) == []
+
+
+@pytest.mark.parametrize("native_trees", ["1", "0"])
+def test_trained_ensemble_predict_batch_matches_predict(monkeypatch, trained_model_dir, native_trees):
+    monkeypatch.setenv("ML_NATIVE_TREES", native_trees)
+    export_ensemble(str(trained_model_dir))
+    engine = ml_engine.MLEngine(str(trained_model_dir))
+    assert engine.use_ensemble and (engine.native_engine is not None) == (native_trees == "1")
+
+    rows = _transactions()
+    assert engine.predict_batch(rows) == [engine.predict(row) for row in rows]
+
+
+def test_cascade_sends_only_uncertain_rows_to_the_ensemble(monkeypatch, tmp_path):
+    # Stage one: a single split on amount (feature 0) at 1000 with leaf probabilities 0.02 / 0.5
+    cascade = CascadeStage({
+        "tree": {
+            "feature": [0, 0, 0],
+            "threshold": [1000.0, 0.0, 0.0],
+            "left": [1, 1, 2],
+            "right": [2, 1, 2],
+            "value": [0.0, 0.02, 0.5],
+            "depth": 1,
+        },
+        "low": 0.1,
+        "high": 0.9,
+    })
+    engine = ml_engine.MLEngine(str(tmp_path))
+    engine.cascade = cascade
+    full_batches = []
+
+    def full_ensemble(features):
+        full_batches.append(features)
+        return [{"score": 500, "confidence": 0.5, "reason": "ensemble", "model_details": {}} for _ in features]
+
+    monkeypatch.setattr(engine, "predict_full_ensemble_batch", full_ensemble)
+    results = engine.predict_cascade_batch(np.array([[50.0, 1.0], [5000.0, 2.0], [999.0, 3.0]]))
+
+    assert [result["model_details"]["cascade_stage"] for result in results] == ["early_exit", "ensemble", "early_exit"]
+    assert results[0]["score"] == 20 and results[1]["score"] == 500
+    assert len(full_batches) == 1 and full_batches[0].tolist() == [[5000.0, 2.0]]
+    stats = cascade.stats()
+    assert (stats["scored"], stats["exited_low"], stats["escalated"]) == (3, 2, 1)
+
+
+def test_merchant_category_is_stable_across_processes():
+    # An engine without models returns the feature dict.
+    code = "import ml_engine; print(ml_engine.MLEngine('no-models').extract_features({'merchant': 'Makro'})['merchant_category'])"
+    categories = {
+        subprocess.run(
+            [sys.executable, "-c", code],
+            env={**os.environ, "PYTHONHASHSEED": seed},
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True,
+        ).stdout.split()[-1]
+        for seed in ("1", "2")
+    }
+    assert {float(category) for category in categories} == {hash_bucket("Makro", 11)}
+
+
+@pytest.mark.parametrize("native_trees", ["1", "0"])
+def test_models_hashed_with_another_scheme_are_not_served(monkeypatch, trained_model_dir, native_trees):
+    monkeypatch.setenv("ML_NATIVE_TREES", native_trees)
+    export_ensemble(str(trained_model_dir))
+    assert ml_engine.MLEngine(str(trained_model_dir)).status == ml_engine.READY
+
+    config = {"xgb_weight": 0.4, "lgb_weight": 0.35, "rf_weight": 0.25, "hash_scheme": "python-hash"}
+    joblib.dump(config, trained_model_dir / "ensemble_config.pkl")
+    export_ensemble(str(trained_model_dir))
+    engine = ml_engine.MLEngine(str(trained_model_dir))
+    assert engine.status == ml_engine.RULE_BASED and not engine.use_ensemble
+    assert "python-hash" in engine.load_error
+
+
+def test_native_trees_exported_before_a_retrain_are_not_served(trained_model_dir):
+    export_ensemble(str(trained_model_dir))
+    assert ml_engine.MLEngine(str(trained_model_dir)).native_engine is not None
+
+    # A retrain rewrites the pickles but not model_trees.npz.
+    joblib.dump({"xgb_weight": 0.2, "lgb_weight": 0.3, "rf_weight": 0.5, "hash_scheme": "crc32"}, trained_model_dir / "ensemble_config.pkl")
+    engine = ml_engine.MLEngine(str(trained_model_dir))
+    assert engine.status == ml_engine.READY and engine.native_engine is None
+    assert engine.ensemble_config["rf_weight"] == 0.5
+
+
+def test_background_load_with_memory_mapped_artifacts(monkeypatch, trained_model_dir):
+    monkeypatch.setenv("ML_MMAP_MODELS", "1")
+    engine = ml_engine.MLEngine(str(trained_model_dir), background=True)
+
+    assert engine.wait_until_loaded(60)
+    assert engine.status == ml_engine.READY and engine.ready
+    assert isinstance(engine.scaler.mean_, np.memmap)
+    assert 0 <= engine.predict({"amount": 900.0})["score"] <= 1000
+
+
+def test_ingestion_is_rejected_until_models_are_ready(monkeypatch, client, tmp_path):
+    monkeypatch.setenv("ML_ALLOW_RULE_FALLBACK", "0")
+    monkeypatch.setattr(ml_engine, "ml_engine", ml_engine.MLEngine(str(tmp_path)))
+    event = {
+        "event_id": "evt-ready-1",
+        "source_system": "gateway",
+        "transaction": {
+            "transaction_id": "txn-ready-1", "user_id": "u1", "amount": 120.0, "merchant": "Makro",
+            "ip_address": "10.0.0.1", "location": "Tashkent", "device_id": "d1",
+        },
+    }
+
+    readiness = client.get("/health/ready")
+    assert readiness.status_code == 503 and readiness.json()["status"] == ml_engine.RULE_BASED
+    response = client.post("/ingest/transaction", json=event)
+    assert response.status_code == 503 and "Retry-After" in response.headers
+    assert client.post("/transactions/", json=event["transaction"]).status_code == 503
+    with pytest.raises(ml_engine.ModelsNotReadyError):
+        ml_engine.ml_engine.predict_batch([event["transaction"]])
+
+    # The fallback is on by default: rule-based scoring, reported by the readiness probe.
+    monkeypatch.delenv("ML_ALLOW_RULE_FALLBACK")
+    readiness = client.get("/health/ready")
+    assert readiness.status_code == 200 and readiness.json()["status"] == ml_engine.RULE_BASED
+    assert "score" in ml_engine.ml_engine.predict_batch([event["transaction"]])[0]
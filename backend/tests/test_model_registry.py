@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import ml_engine
+from services.model_registry import ModelRegistry
+
+
+@pytest.fixture
+def restore_engine():
+    engine = ml_engine.ml_engine
+    yield
+    ml_engine.ml_engine = engine
+
+
+def test_activate_swaps_engine_and_rollback_restores_previous(trained_model_dir, tmp_path, restore_engine):
+    registry = ModelRegistry(root=str(tmp_path / "registry"))
+    registry.register(str(trained_model_dir), version="v1")
+    registry.register(str(trained_model_dir), version="v2", notes="retrained")
+    with pytest.raises(ValueError):
+        registry.register(str(trained_model_dir), version="v2")
+
+    registry.activate("v1")
+    assert ml_engine.ml_engine.version == "v1"
+    assert ml_engine.ml_engine.predict({"amount": 900.0})["score"] >= 0
+    registry.activate("v2")
+    assert ml_engine.ml_engine.version == "v2"
+    assert (registry.manifest()["active"], registry.manifest()["previous"]) == ("v2", "v1")
+
+    assert registry.rollback() == "v1"
+    assert ml_engine.ml_engine.version == "v1"
+    assert registry.manifest()["active"] == "v1"
+    assert [worker["loaded_version"] for worker in registry.workers()] == ["v1"]
+
+
+def test_sync_follows_manifest_and_keeps_serving_when_load_fails(trained_model_dir, tmp_path, restore_engine):
+    root = str(tmp_path / "registry")
+    ModelRegistry(root=root).register(str(trained_model_dir), version="v1")
+    (tmp_path / "registry" / "v1" / "model_rf.pkl").write_bytes(b"corrupt")
+    other_worker = ModelRegistry(root=root)
+    manifest = other_worker.manifest()
+    manifest["active"] = "v1"
+    other_worker._write_manifest(manifest)
+
+    serving = ml_engine.ml_engine
+    with pytest.raises(RuntimeError):
+        other_worker.sync()
+    assert ml_engine.ml_engine is serving
+    assert other_worker.loaded_version is None and "v1" in other_worker.last_error
+    # The failed version is not reloaded on every poll.
+    other_worker.sync()
+
+
+def test_shadow_scores_champion_traffic_in_background(trained_model_dir, tmp_path, restore_engine):
+    registry = ModelRegistry(root=str(tmp_path / "registry"))
+    registry.register(str(trained_model_dir), version="v1")
+    registry.register(str(trained_model_dir), version="v2")
+    registry.activate("v1")
+    registry.add_shadow("v2")
+    assert registry.manifest()["shadows"] == ["v2"]
+
+    shadows = ml_engine.ml_engine.shadows
+    transactions = [{"amount": amount, "hour_of_day": 3} for amount in (50.0, 400.0, 900.0, 3000.0)]
+    champion = ml_engine.ml_engine.predict_batch(transactions)
+    deadline = time.monotonic() + 5
+    while shadows.stats()["shadows"]["v2"]["scored"] < len(transactions) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    stats = shadows.stats()["shadows"]["v2"]
+    # Same artifacts as the champion, so the shadow agrees everywhere.
+    assert stats["scored"] == len(transactions) and stats["errors"] == 0
+    assert stats["decision_agreement"] == 1.0 and stats["max_abs_score_diff"] == 0
+    assert shadows.samples("v2", limit=1)[0]["champion_score"] == champion[-1]["score"]
+
+    # Shadows survive a champion swap and can be removed.
+    registry.activate("v2")
+    assert ml_engine.ml_engine.shadows is shadows
+    assert registry.remove_shadow("v2") and not shadows.active
+    shadows.close()
@@ -0,0 +1,61 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+import schemas
+from database import Base
+from services.event_ingestor import ingest_transaction_events_batch
+from services.replay_service import run_replay, summarize_replay
+
+
+def _event(index):
+    return schemas.TransactionEvent(
+        event_id=f"evt-{index}",
+        source_system="gateway",
+        transaction={
+            "transaction_id": f"txn-{index}",
+            "user_id": "alisher_karimov_001",
+            "amount": 120.0 + index,
+            "merchant": "Korzinka.uz",
+            "ip_address": "10.0.0.1",
+            "location": "Tashkent, Uzbekistan",
+            "device_id": "iphone_1234",
+        },
+    )
+
+
+def test_replay_with_candidate_rules_writes_side_table_only(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replay.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    ingest_transaction_events_batch(db, [_event(i) for i in range(5)])
+    block_all = [{
+        "id": "block_all",
+        "name": "Block Everything",
+        "severity": "high",
+        "action": "BLOCK",
+        "conditions": [{"type": "amount_greater_than", "value": 0}],
+    }]
+    run = models.ReplayRun(name="block-all", rules=block_all)
+    db.add(run)
+    db.commit()
+    run_id = run.id
+    db.close()
+
+    # A page smaller than the window exercises the keyset paging.
+    run_replay(run_id, session_factory=Session, workers=1, batch_size=2, page_size=3)
+
+    db = Session()
+    run = db.get(models.ReplayRun, run_id)
+    assert run.status == models.ReplayRunStatus.COMPLETED.value
+    assert run.total_events == 5
+    assert run.changed_action == 5
+    results = db.query(models.ReplayResult).all()
+    assert {r.replay_status for r in results} == {"BLOCK"}
+    assert all(r.rule_ids == ["block_all"] for r in results)
+    assert db.query(models.Transaction).filter(models.Transaction.status == "BLOCK").count() == 0
+    summary = summarize_replay(db, run_id)
+    assert sum(t["count"] for t in summary["action_transitions"]) == 5
+    db.close()
@@ -0,0 +1,104 @@
+import datetime
+import time
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import ml_engine
+import models
+import schemas
+from services.event_ingestor import ingest_transaction_event, receive_transaction_event
+from services.retry_scheduler import RetryScheduler
+
+
+def _event(event_id):
+    return schemas.TransactionEvent(
+        event_id=event_id,
+        source_system="gateway",
+        transaction={
+            "transaction_id": f"txn-{event_id}",
+            "user_id": "alisher_karimov_001",
+            "amount": 120.0,
+            "merchant": "Korzinka.uz",
+            "ip_address": "10.0.0.1",
+            "location": "Tashkent, Uzbekistan",
+            "device_id": "iphone_1234",
+        },
+    )
+
+
+def _failing_predict(exc):
+    def predict(transaction_data):
+        raise exc
+    return predict
+
+
+def _fail_ingest(db, monkeypatch, event_id, exc):
+    monkeypatch.setattr(ml_engine.ml_engine, "predict", _failing_predict(exc))
+    monkeypatch.setattr(ml_engine.ml_engine, "predict_batch", _failing_predict(exc))
+    with pytest.raises(type(exc)):
+        ingest_transaction_event(db, _event(event_id))
+    return db.query(models.IngestedEvent).filter(models.IngestedEvent.event_id == event_id).one()
+
+
+def test_failed_event_is_dead_lettered_then_replayed(db, monkeypatch):
+    event_record = _fail_ingest(db, monkeypatch, "evt-1", ValueError("model unavailable"))
+    assert event_record.status == models.IngestedEventStatus.FAILED.value
+
+    scheduler = RetryScheduler(max_attempts=2, base_delay_seconds=0.001, max_delay_seconds=0.001)
+    assert scheduler.run_once(db) == 1
+    time.sleep(0.01)
+    assert scheduler.run_once(db) == 1
+
+    db.refresh(event_record)
+    assert event_record.status == models.IngestedEventStatus.DEAD_LETTER.value
+    dead_letter = db.query(models.DeadLetterEvent).one()
+    assert dead_letter.attempts == 2
+    assert scheduler.run_once(db) == 0
+
+    monkeypatch.undo()
+    summary = scheduler.replay_dead_letters(db)
+    assert summary["processed"] == 1
+
+    db.refresh(event_record)
+    assert event_record.status == models.IngestedEventStatus.PROCESSED.value
+    # Rows left by the failed first attempt were replaced, not duplicated.
+    assert db.query(models.EnrichedEventContext).count() == 1
+    assert db.query(models.Transaction).count() == 1
+    assert db.query(models.EventRetry).count() == 0
+
+
+def test_transient_errors_are_never_dead_lettered(db, monkeypatch):
+    locked = OperationalError("UPDATE ingested_events", {}, Exception("database is locked"))
+    event_record = _fail_ingest(db, monkeypatch, "evt-2", locked)
+
+    scheduler = RetryScheduler(max_attempts=1, base_delay_seconds=0.001, max_delay_seconds=0.001)
+    scheduler.run_once(db)
+
+    db.refresh(event_record)
+    assert event_record.status == models.IngestedEventStatus.FAILED.value
+    assert db.query(models.EventRetry).one().attempts == 1
+    assert db.query(models.DeadLetterEvent).count() == 0
+
+
+def test_stale_received_and_processing_events_are_retried_once(db):
+    old = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    stuck = receive_transaction_event(db, _event("evt-3"))
+    stuck.status, stuck.processed_at = models.IngestedEventStatus.PROCESSING.value, old  # worker crashed mid-event
+    unqueued = receive_transaction_event(db, _event("evt-4"))
+    unqueued.received_at = old  # did not fit the queue at startup
+    busy = receive_transaction_event(db, _event("evt-5"))
+    busy.status, busy.processed_at = models.IngestedEventStatus.PROCESSING.value, datetime.datetime.utcnow()
+    db.commit()
+
+    scheduler = RetryScheduler(stale_after_seconds=60)
+    assert scheduler.run_once(db) == 2
+    assert scheduler.stats()["released"] == 2
+
+    db.expire_all()
+    assert [db.get(models.IngestedEvent, record.id).status for record in (stuck, unqueued, busy)] == [
+        "PROCESSED", "PROCESSED", "PROCESSING",
+    ]
+    # Another worker's scheduler finds nothing left to claim.
+    assert RetryScheduler(stale_after_seconds=60).run_once(db) == 0
+    assert db.query(models.Transaction).count() == 2
@@ -0,0 +1,92 @@
+import itertools
+
+from data.rules_config import RULES
+from services.rule_compiler import CompiledRuleSet, compile_rules, rule_columns
+from services.rule_engine import decide_action, decide_actions_batch, evaluate_rules, evaluate_rules_batch
+from tests.rule_interpreter import interpret_rules
+
+EXTRA_RULES = RULES + [
+    {
+        "id": "segment_watch",
+        "name": "Segment Watch",
+        "severity": "low",
+        "action": "CHALLENGE",
+        "conditions": [{"type": "user_segment_in", "value": ["student"]}, {"type": "amount_greater_than", "value": 100}],
+    },
+    {
+        "id": "unknown_condition",
+        "name": "Unknown Condition",
+        "severity": "high",
+        "action": "BLOCK",
+        "conditions": [{"type": "merchant_is", "value": "Makro"}],
+    },
+    {"id": "catch_all", "name": "Catch All", "severity": "low", "action": "ALLOW", "conditions": []},
+]
+
+
+def _events():
+    transactions = [{"amount": amount, "velocity_flag": 1, "device_change": 1} for amount in (50, 500, 1200, 3000, 4000, 5000, 15000)]
+    enrichments = [
+        {
+            "geo_country": country, "ip_risk_score": risk, "ip_reputation": reputation,
+            "derived_features": derived, "signals": {"behavioral": {"segment": "student"}},
+        }
+        for country, risk, reputation, derived in itertools.product(
+            ["uae", "Uzbekistan", None], [0.9, None], ["trusted_partner", None], [{"velocity_flag": 0}, {}],
+        )
+    ]
+    return list(itertools.product(transactions, enrichments))
+
+
+def test_compiled_rules_match_the_interpreter():
+    compiled = compile_rules(EXTRA_RULES)
+    # The candidate index must only skip rules that cannot match, thresholds included.
+    indexed = CompiledRuleSet(EXTRA_RULES, use_index=True)
+    for transaction, enrichment in _events():
+        expected = interpret_rules(transaction, enrichment, EXTRA_RULES)
+        assert compiled.evaluate(transaction, enrichment) == expected
+        assert indexed.evaluate(transaction, enrichment) == expected
+        assert evaluate_rules(transaction, enrichment, EXTRA_RULES) == expected
+
+    # Compiled once per rule list, then reused
+    assert compile_rules(EXTRA_RULES) is compiled
+    assert evaluate_rules({"amount": 15000}, {"geo_country": "Brazil", "ip_risk_score": 0.8})[0]["rule_id"] == "high_amount_risky_geo"
+
+
+def test_batch_hit_matrix_and_decisions_match_single_events():
+    events = _events()
+    hits = evaluate_rules_batch(rule_columns(*zip(*events)), EXTRA_RULES)
+    decisions = decide_actions_batch(hits, EXTRA_RULES)
+
+    assert hits.shape == (len(EXTRA_RULES), len(events))
+    for column, (transaction, enrichment) in enumerate(events):
+        expected = interpret_rules(transaction, enrichment, EXTRA_RULES)
+        assert [EXTRA_RULES[row]["id"] for row in hits[:, column].nonzero()[0]] == [hit["rule_id"] for hit in expected]
+        decision = decide_action(expected)
+        assert decisions["action"][column] == decision["action"]
+        assert decisions["status_override"][column] == decision["status_override"]
+        assert decisions["reason"][column] == decision["reason"]
+
+
+def test_conditions_are_reordered_by_live_selectivity():
+    rules = [{
+        "id": "uae_payment",
+        "name": "UAE Payment",
+        "severity": "medium",
+        "action": "CHALLENGE",
+        "conditions": [{"type": "amount_greater_than", "value": 0}, {"type": "country_in", "value": ["UAE"]}],
+    }]
+    compiled = CompiledRuleSet(rules, profile_every=1)
+    compiled.profile.reorder_every = 100
+    events = [({"amount": 10.0 + i}, {"geo_country": "UAE" if i % 10 == 0 else "Uzbekistan"}) for i in range(200)]
+    for transaction, enrichment in events:
+        assert compiled.evaluate(transaction, enrichment) == interpret_rules(transaction, enrichment, rules)
+
+    # The amount check never rejects, so the country check now runs first, in batches too.
+    stats = compiled.stats()
+    assert stats["sampled_events"] == 200 and stats["reorders"] == 2
+    assert [condition["type"] for condition in stats["rule_conditions"][0]["conditions"]] == ["country_in", "amount_greater_than"]
+    assert stats["condition_types"]["country_in"]["rejection_rate"] == 0.9
+    assert stats["condition_types"]["amount_greater_than"]["rejection_rate"] == 0.0
+    hits = compiled.evaluate_batch(rule_columns(*zip(*events)))
+    assert hits[0].nonzero()[1].tolist() == list(range(0, 200, 10))
@@ -0,0 +1,99 @@
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+import models
+from data.rules_config import RULES
+from database import Base
+from services.rule_engine import evaluate_rules
+from services.rule_store import RuleStore
+
+BIG_PAYMENTS = [{
+    "id": "big_payment",
+    "name": "Big Payment",
+    "severity": "high",
+    "action": "BLOCK",
+    "conditions": [{"type": "amount_greater_than", "value": 1000}],
+}]
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rules.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    opened = []
+
+    def session_factory():
+        opened.append(1)
+        return factory()
+
+    session_factory.opened = opened
+    yield session_factory
+    engine.dispose()
+
+
+def test_activated_rule_set_reaches_other_workers(sessions):
+    admin, worker = RuleStore(0, sessions), RuleStore(0, sessions)
+    assert worker.current().rules is RULES and worker.status()["source"] == "rules_config"
+
+    db = sessions()
+    rule_set = admin.create(db, BIG_PAYMENTS, notes="test", activate=True)
+    assert rule_set.version == 1 and admin.version == 1
+
+    assert [hit["rule_id"] for hit in evaluate_rules({"amount": 5000}, {}, worker.current())] == ["big_payment"]
+    assert worker.version == 1
+
+    # Rollback is re-activating the older version; here, a copy of the built-in rules.
+    previous = admin.create(db, RULES, activate=False)
+    admin.activate(db, previous.version)
+    assert worker.current().rules == RULES and worker.version == previous.version
+    assert db.query(models.RuleSet).filter(models.RuleSet.is_active == 1).count() == 1
+    db.close()
+
+
+def test_bad_rule_set_never_replaces_the_running_version(sessions):
+    store = RuleStore(0, sessions)
+    db = sessions()
+    store.create(db, BIG_PAYMENTS, activate=True)
+
+    with pytest.raises(ValueError):
+        store.create(db, [{**BIG_PAYMENTS[0], "conditions": [{"type": "amount_greater_than", "value": "1000"}]}])
+    assert db.query(models.RuleSet).count() == 1
+
+    # A broken row that bypassed validation is activated directly in the database.
+    broken = models.RuleSet(rules=[{"id": "broken", "conditions": []}], is_active=1)
+    db.query(models.RuleSet).update({models.RuleSet.is_active: 0})
+    db.add(broken)
+    db.commit()
+    assert store.current().rules == BIG_PAYMENTS and store.version == 1
+    assert "version 2" in store.status()["last_error"]
+    db.close()
+
+
+def test_version_is_checked_once_per_interval(sessions):
+    store = RuleStore(3600, sessions)
+    for _ in range(100):
+        store.current()
+    assert len(sessions.opened) == 1
+
+
+def test_only_one_rule_set_can_be_active(sessions):
+    store = RuleStore(0, sessions)
+    db = sessions()
+    store.create(db, BIG_PAYMENTS, activate=True)
+    db.add(models.RuleSet(rules=RULES, is_active=1))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    # A table from before the index may hold several active rows; the newest activation is served.
+    db.execute(text("DROP INDEX ix_rule_sets_single_active"))
+    db.add(models.RuleSet(rules=RULES, is_active=1, activated_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=1)))
+    db.commit()
+    store.refresh_if_stale(force=True)
+    assert store.version == 2 and store.last_error is None
+    db.close()
@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import ml_engine
+from services.scoring_batcher import ScoringBatcher
+
+
+def test_concurrent_calls_are_coalesced(monkeypatch):
+    calls = []
+
+    def predict_batch(transactions):
+        calls.append(len(transactions))
+        return [{"score": t["amount"], "confidence": 1.0, "reason": "test"} for t in transactions]
+
+    monkeypatch.setattr(ml_engine.ml_engine, "predict_batch", predict_batch)
+    batcher = ScoringBatcher(max_batch_size=8, max_wait_ms=50)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda i: batcher.predict({"amount": i}), range(32)))
+
+    assert [result["score"] for result in results] == list(range(32))
+    assert sum(calls) == 32
+    assert max(calls) <= 8 and len(calls) < 32
+    stats = batcher.stats()
+    assert stats["items"] == 32
+    assert sum(stats["batch_size_histogram"].values()) == stats["batches"]
+
+
+def test_failing_item_only_fails_its_caller(monkeypatch):
+    def predict(transaction):
+        if transaction["amount"] < 0:
+            raise ValueError("negative amount")
+        return {"score": 1, "confidence": 1.0, "reason": "test"}
+
+    def predict_batch(transactions):
+        return [predict(t) for t in transactions]
+
+    monkeypatch.setattr(ml_engine.ml_engine, "predict", predict)
+    monkeypatch.setattr(ml_engine.ml_engine, "predict_batch", predict_batch)
+    batcher = ScoringBatcher(max_batch_size=4, max_wait_ms=50)
+    good, bad = batcher.submit({"amount": 1}), batcher.submit({"amount": -1})
+
+    assert good.result(5)["score"] == 1
+    assert isinstance(bad.exception(5), ValueError)
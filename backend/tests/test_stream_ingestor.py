@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from services.stream_ingestor import stream_ingest_ndjson
+
+
+def _line(event_id):
+    return json.dumps({
+        "event_id": event_id,
+        "source_system": "gateway",
+        "transaction": {
+            "transaction_id": f"txn-{event_id}",
+            "user_id": "otabek_saidov_010",
+            "amount": 90.5,
+            "merchant": "Evos",
+            "ip_address": "10.1.2.3",
+            "location": "Samarkand, Uzbekistan",
+            "device_id": "laptop_4321",
+        },
+    })
+
+
+async def _body(payload: bytes, size: int):
+    for start in range(0, len(payload), size):
+        yield payload[start:start + size]
+
+
+def _run(payload: bytes, chunk_size=2, is_disconnected=None):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    async def collect():
+        return [line async for line in stream_ingest_ndjson(
+            _body(payload, 17), Session, chunk_size=chunk_size, is_disconnected=is_disconnected,
+        )]
+
+    return [json.loads(line) for line in asyncio.run(collect())]
+
+
+def test_stream_reports_each_line_and_summary():
+    payload = "\n".join([_line("evt-1"), "{not json", "", _line("evt-2"), _line("evt-3")]).encode()
+
+    results = _run(payload)
+
+    assert [r.get("line") for r in results[:-1]] == [1, 2, 4, 5]
+    assert [r["status"] for r in results[:-1]] == ["PROCESSED", "INVALID", "PROCESSED", "PROCESSED"]
+    assert results[-1]["status"] == "COMPLETED"
+    assert results[-1]["processed"] == 3
+    assert results[-1]["invalid"] == 1
+
+
+def test_stream_stops_when_the_client_disconnects():
+    payload = "\n".join(_line(f"evt-{index}") for index in range(3)).encode()
+    polls = []
+
+    async def is_disconnected():
+        polls.append(True)
+        return True
+
+    results = _run(payload, is_disconnected=is_disconnected)
+
+    # The first chunk is ingested while the body is read; the rest is dropped and no summary is sent.
+    assert [r["line"] for r in results] == [1, 2]
+    assert len(polls) == 1
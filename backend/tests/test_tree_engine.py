@@ -0,0 +1,31 @@
+import numpy as np
+
+import tree_engine
+
+
+def test_exported_ensemble_matches_original_models(trained_model_dir):
+    path = tree_engine.export_ensemble(str(trained_model_dir))
+
+    assert tree_engine.verify_export(str(trained_model_dir), path, n_samples=2000) < 1e-6
+
+    engine = tree_engine.TreeEnsemble.load(path)
+    assert engine.feature_columns == ["amount", "hour_of_day", "location_change_speed", "transaction_frequency"]
+    rows = np.array([[500.0, 12.0, 0.0, 3.0], [900.0, 2.0, 2.5, -10.0]])
+    proba = engine.predict_proba(rows)
+    assert np.allclose(proba["ensemble"], 0.4 * proba["xgb"] + 0.35 * proba["lgb"] + 0.25 * proba["rf"])
+    # Single rows take the same path as batches.
+    assert np.allclose(engine.predict_proba(rows[1:])["ensemble"], proba["ensemble"][1:])
+
+
+def test_float32_path_matches_float64(trained_model_dir):
+    engine = tree_engine.TreeEnsemble.load(tree_engine.export_ensemble(str(trained_model_dir)))
+    rng = np.random.default_rng(1)
+    # Integer-valued columns land exactly on split points, where folding the scaler must not move them.
+    rows = np.column_stack([
+        rng.lognormal(5, 2, 2000), rng.integers(0, 24, 2000), rng.exponential(1, 2000), rng.poisson(5, 2000),
+    ]).astype(np.float32)
+
+    exact = engine.predict_proba(rows.astype(np.float64))
+    reduced = engine.predict_proba(np.ascontiguousarray(rows))
+    for name in ("xgb", "lgb", "rf", "ensemble"):
+        assert np.abs(reduced[name] - exact[name]).max() < 1e-6
@@ -5,6 +5,7 @@ Uses XGBoost, LightGBM, and ensemble methods to achieve 90%+ accuracy
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.tree import DecisionTreeClassifier
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.metrics import classification_report, roc_auc_score, precision_recall_curve
 from sklearn.preprocessing import StandardScaler
@@ -16,6 +17,10 @@ import joblib
 import random
 import logging
 
+from cascade import CASCADE_CONFIG_FILE, DEFAULT_HIGH_BAND, DEFAULT_LOW_BAND, evaluate_cascade, export_stage_one
+from feature_hashing import HASH_SCHEME, MERCHANT_CATEGORY_BUCKETS
+from feature_pipeline import FEATURE_COLUMNS, add_derived_features
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -26,7 +31,9 @@ def generate_advanced_synthetic_data(n_samples=50000):
     random.seed(42)
     
     data = []
+    label_draws = []
     
+    # Raw features are drawn row by row so the random streams stay in their original order
     for _ in range(n_samples):
         # Base features
         amount = np.random.lognormal(5, 2)  # More realistic amount distribution
@@ -38,7 +45,7 @@ def generate_advanced_synthetic_data(n_samples=50000):
         location_change_speed = np.random.exponential(1)  # Speed of location change
         
         # Merchant features
-        merchant_category = random.randint(0, 10)  # Different merchant types
+        merchant_category = random.randint(0, MERCHANT_CATEGORY_BUCKETS - 1)  # Serving buckets merchant names with hash_bucket
         merchant_risk_score = random.random()
         
         # User behavior features
@@ -50,52 +57,6 @@ def generate_advanced_synthetic_data(n_samples=50000):
         device_change = random.choice([0, 1])  # New device?
         ip_change = random.choice([0, 1])  # New IP?
         
-        # Time-based features
-        is_night = 1 if hour_of_day < 6 or hour_of_day > 22 else 0
-        is_weekend = 1 if day_of_week >= 5 else 0
-        
-        # Derived features
-        amount_deviation = abs(amount - avg_transaction_amount) / (avg_transaction_amount + 1)
-        velocity_flag = 1 if transaction_frequency > 10 else 0
-        
-        # Complex fraud patterns
-        fraud = 0
-        fraud_score = 0
-        
-        # Pattern 1: High amount + International + Night time
-        if amount > 5000 and location_risk == 2 and is_night:
-            fraud_score += 0.7
-            
-        # Pattern 2: Rapid location change + Device change
-        if location_change_speed > 3 and device_change:
-            fraud_score += 0.6
-            
-        # Pattern 3: High merchant risk + IP change
-        if merchant_risk_score > 0.7 and ip_change:
-            fraud_score += 0.5
-            
-        # Pattern 4: Unusual amount for user
-        if amount_deviation > 3:
-            fraud_score += 0.4
-            
-        # Pattern 5: High velocity
-        if velocity_flag and amount > 1000:
-            fraud_score += 0.3
-            
-        # Pattern 6: Weekend + Night + High amount
-        if is_weekend and is_night and amount > 3000:
-            fraud_score += 0.4
-            
-        # Determine fraud based on score with some randomness
-        if fraud_score > 0.8:
-            fraud = 1 if random.random() < 0.95 else 0
-        elif fraud_score > 0.5:
-            fraud = 1 if random.random() < 0.7 else 0
-        elif fraud_score > 0.3:
-            fraud = 1 if random.random() < 0.4 else 0
-        else:
-            fraud = 1 if random.random() < 0.02 else 0  # Base fraud rate
-            
         data.append({
             'amount': amount,
             'hour_of_day': hour_of_day,
@@ -109,14 +70,37 @@ def generate_advanced_synthetic_data(n_samples=50000):
             'days_since_last_transaction': days_since_last_transaction,
             'device_change': device_change,
             'ip_change': ip_change,
-            'is_night': is_night,
-            'is_weekend': is_weekend,
-            'amount_deviation': amount_deviation,
-            'velocity_flag': velocity_flag,
-            'is_fraud': fraud
         })
+        label_draws.append(random.random())
+    
+    # Time-based and derived features, shared with serving (feature_pipeline.py)
+    df = add_derived_features(pd.DataFrame(data))
+    
+    # Complex fraud patterns
+    fraud_score = (
+        # Pattern 1: High amount + International + Night time
+        0.7 * ((df['amount'] > 5000) & (df['location_risk'] == 2) & (df['is_night'] == 1))
+        # Pattern 2: Rapid location change + Device change
+        + 0.6 * ((df['location_change_speed'] > 3) & (df['device_change'] == 1))
+        # Pattern 3: High merchant risk + IP change
+        + 0.5 * ((df['merchant_risk_score'] > 0.7) & (df['ip_change'] == 1))
+        # Pattern 4: Unusual amount for user
+        + 0.4 * (df['amount_deviation'] > 3)
+        # Pattern 5: High velocity
+        + 0.3 * ((df['velocity_flag'] == 1) & (df['amount'] > 1000))
+        # Pattern 6: Weekend + Night + High amount
+        + 0.4 * ((df['is_weekend'] == 1) & (df['is_night'] == 1) & (df['amount'] > 3000))
+    )
+    
+    # Determine fraud based on score with some randomness
+    fraud_rate = np.select(
+        [fraud_score > 0.8, fraud_score > 0.5, fraud_score > 0.3],
+        [0.95, 0.7, 0.4],
+        default=0.02,  # Base fraud rate
+    )
+    df['is_fraud'] = (np.array(label_draws) < fraud_rate).astype(int)
     
-    return pd.DataFrame(data)
+    return df[FEATURE_COLUMNS + ['is_fraud']]
 
 def train_ensemble_model():
     """Train an ensemble of models for maximum accuracy"""
@@ -225,6 +209,18 @@ def train_ensemble_model():
     logger.info(classification_report(y_test, ensemble_pred))
     logger.info(f"ROC-AUC: {roc_auc_score(y_test, ensemble_proba):.4f}")
     
+    # Cascade first stage: a shallow tree on raw features that lets confident transactions skip the ensemble
+    logger.info("\n--- CASCADE Stage One (Decision Tree, depth 4) ---")
+    stage_one_model = DecisionTreeClassifier(max_depth=4, min_samples_leaf=200, random_state=42)
+    stage_one_model.fit(X_train_balanced, y_train_balanced)
+    stage_one_proba = stage_one_model.predict_proba(X_test)[:, 1]
+    cascade_evaluation = evaluate_cascade(
+        y_test.to_numpy(), stage_one_proba, ensemble_proba, DEFAULT_LOW_BAND, DEFAULT_HIGH_BAND
+    )
+    logger.info(f"Stage one ROC-AUC: {roc_auc_score(y_test, stage_one_proba):.4f}")
+    logger.info(f"Band [{DEFAULT_LOW_BAND}, {DEFAULT_HIGH_BAND}]: {cascade_evaluation['early_exit_fraction']*100:.1f}% exit early, "
+                f"ROC-AUC {cascade_evaluation['cascade_auc']:.4f} (cost {cascade_evaluation['auc_cost']:.4f})")
+    
     # Save models
     # Save models
     logger.info("\n" + "=" * 60)
@@ -240,16 +236,29 @@ def train_ensemble_model():
     ensemble_config = {
         'xgb_weight': 0.4,
         'lgb_weight': 0.4,
-        'rf_weight': 0.2
+        'rf_weight': 0.2,
+        'hash_scheme': HASH_SCHEME,
     }
     joblib.dump(ensemble_config, "ensemble_config.pkl")
     
+    joblib.dump({
+        "tree": export_stage_one(stage_one_model),
+        "low": DEFAULT_LOW_BAND,
+        "high": DEFAULT_HIGH_BAND,
+        "holdout": {
+            "labels": y_test.to_numpy(),
+            "stage_one_proba": stage_one_proba,
+            "ensemble_proba": ensemble_proba,
+        },
+    }, CASCADE_CONFIG_FILE)
+    
     logger.info("✓ Saved: model_xgboost.pkl")
     logger.info("✓ Saved: model_lightgbm.pkl")
     logger.info("✓ Saved: model_rf.pkl")
     logger.info("✓ Saved: scaler.pkl")
     logger.info("✓ Saved: feature_columns.pkl")
     logger.info("✓ Saved: ensemble_config.pkl")
+    logger.info(f"✓ Saved: {CASCADE_CONFIG_FILE}")
     logger.info("\n" + "=" * 60)
     logger.info("TRAINING COMPLETE!")
     logger.info("=" * 60)
@@ -0,0 +1,463 @@
+"""
+Native inference engine for the fraud detection tree ensemble.
+
+The pickled XGBoost, LightGBM and RandomForest models are compiled into one
+set of flat NumPy node arrays (feature index, threshold, children, leaf
+value) and evaluated by a single vectorized traversal over all trees of all
+three models, followed by the per-model link functions and ensemble weights.
+Scoring then needs neither the three libraries nor their per-call overhead.
+
+Each library's split semantics are preserved per node:
+    XGBoost       float32(x) <  float32 threshold
+    RandomForest  float32(x) <= float64 threshold
+    LightGBM      float64(x) <= float64 threshold
+
+Float32 input takes a reduced-precision path instead: the StandardScaler is
+folded into the thresholds at export time (raw_threshold), so raw float32
+features are compared directly, without a scaling pass, and leaf values
+are summed in float32. Splits agree with the float64 path for every
+float32 input; only the float32 sums and the rounding of non-integer
+inputs to float32 make scores deviate, by about 1e-7.
+
+The export records a fingerprint of the pickles it was compiled from;
+MLEngine serves the pickles instead when they no longer match (a retrain
+without re-export).
+
+Usage:
+    python tree_engine.py --model-dir . --output model_trees.npz
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Tuple
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NATIVE_MODEL_FILE = "model_trees.npz"
+# Pickles an export is compiled from, in fingerprint order
+SOURCE_ARTIFACTS = (
+    "model_xgboost.pkl", "model_lightgbm.pkl", "model_rf.pkl", "scaler.pkl", "feature_columns.pkl", "ensemble_config.pkl",
+)
+
+# How a node treats a missing (NaN) input.
+MISSING_DEFAULT = 0          # NaN follows default_left
+MISSING_AS_ZERO = 1          # NaN is compared as 0.0 (LightGBM missing_type "None")
+MISSING_ZERO_IS_DEFAULT = 2  # NaN and |x| <= 1e-35 follow default_left (LightGBM missing_type "Zero")
+_LGB_ZERO_THRESHOLD = 1e-35
+TRAVERSAL_CHUNK_ROWS = 1024
+
+
+class _NodeArrays:
+    """Accumulates nodes of many trees into flat arrays with absolute child indices"""
+
+    def __init__(self):
+        self.columns: Dict[str, list] = {
+            name: [] for name in ("feature", "threshold", "left", "right", "value", "strict", "float32_input", "missing", "default_left")
+        }
+        self.roots: List[int] = []
+        self.depth = 0
+
+    def __len__(self):
+        return len(self.columns["feature"])
+
+    def add_tree(self, nodes: List[dict], depth: int):
+        """nodes use tree-local child indices; a leaf has left == right == -1"""
+        offset = len(self)
+        self.roots.append(offset)
+        self.depth = max(self.depth, depth)
+        for local_index, node in enumerate(nodes):
+            leaf = node["left"] < 0
+            self.columns["feature"].append(0 if leaf else node["feature"])
+            self.columns["threshold"].append(0.0 if leaf else node["threshold"])
+            # Leaves point at themselves, so extra traversal steps are no-ops.
+            self.columns["left"].append(offset + (local_index if leaf else node["left"]))
+            self.columns["right"].append(offset + (local_index if leaf else node["right"]))
+            self.columns["value"].append(node.get("value", 0.0) if leaf else 0.0)
+            self.columns["strict"].append(node["strict"])
+            self.columns["float32_input"].append(node["float32_input"])
+            self.columns["missing"].append(node.get("missing", MISSING_DEFAULT))
+            self.columns["default_left"].append(node.get("default_left", True))
+
+
+def _tree_depth(nodes: List[dict], root: int = 0) -> int:
+    depth, frontier = 0, [root]
+    while frontier:
+        frontier = [child for index in frontier if nodes[index]["left"] >= 0 for child in (nodes[index]["left"], nodes[index]["right"])]
+        if frontier:
+            depth += 1
+    return depth
+
+
+def _export_xgboost(model, arrays: _NodeArrays) -> Tuple[int, float]:
+    learner = json.loads(model.get_booster().save_raw("json"))["learner"]
+    if learner["objective"]["name"] != "binary:logistic":
+        raise ValueError(f"Unsupported XGBoost objective {learner['objective']['name']}")
+    base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+    base_margin = float(np.log(base_score / (1 - base_score)))
+
+    trees = learner["gradient_booster"]["model"]["trees"]
+    for tree in trees:
+        left, right = tree["left_children"], tree["right_children"]
+        nodes = []
+        for i in range(len(left)):
+            # XGBoost stores the leaf weight in split_conditions for leaves.
+            nodes.append({
+                "feature": tree["split_indices"][i],
+                "threshold": float(np.float32(tree["split_conditions"][i])),
+                "left": left[i],
+                "right": right[i],
+                "value": float(np.float32(tree["split_conditions"][i])),
+                "strict": True,
+                "float32_input": True,
+                "default_left": bool(tree["default_left"][i]),
+            })
+        arrays.add_tree(nodes, _tree_depth(nodes))
+    return len(trees), base_margin
+
+
+def _export_lightgbm(model, arrays: _NodeArrays) -> int:
+    dump = model.booster_.dump_model()
+    if not dump["objective"].startswith("binary") or dump["num_tree_per_iteration"] != 1:
+        raise ValueError(f"Unsupported LightGBM objective {dump['objective']}")
+    missing_modes = {"None": MISSING_AS_ZERO, "Zero": MISSING_ZERO_IS_DEFAULT, "NaN": MISSING_DEFAULT}
+
+    for info in dump["tree_info"]:
+        nodes: List[dict] = []
+
+        def visit(node) -> int:
+            index = len(nodes)
+            nodes.append({})
+            if "leaf_value" in node:
+                nodes[index] = {"left": -1, "right": -1, "value": float(node["leaf_value"]), "strict": False, "float32_input": False}
+                return index
+            if node["decision_type"] != "<=":
+                raise ValueError("Categorical LightGBM splits are not supported")
+            left = visit(node["left_child"])
+            right = visit(node["right_child"])
+            nodes[index] = {
+                "feature": node["split_feature"],
+                "threshold": float(node["threshold"]),
+                "left": left,
+                "right": right,
+                "strict": False,
+                "float32_input": False,
+                "missing": missing_modes[node["missing_type"]],
+                "default_left": bool(node["default_left"]),
+            }
+            return index
+
+        visit(info["tree_structure"])
+        arrays.add_tree(nodes, _tree_depth(nodes))
+    return len(dump["tree_info"])
+
+
+def _export_random_forest(model, arrays: _NodeArrays) -> int:
+    positive = list(model.classes_).index(1)
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        missing_left = getattr(tree, "missing_go_to_left", np.ones(tree.node_count, dtype=bool))
+        # Leaf class fractions; normalized explicitly since older sklearn stores raw counts.
+        proba = tree.value[:, 0, :] / tree.value[:, 0, :].sum(axis=1, keepdims=True)
+        nodes = [
+            {
+                "feature": int(tree.feature[i]),
+                "threshold": float(tree.threshold[i]),
+                "left": int(tree.children_left[i]),
+                "right": int(tree.children_right[i]),
+                "value": float(proba[i, positive]),
+                "strict": False,
+                "float32_input": True,
+                "default_left": bool(missing_left[i]),
+            }
+            for i in range(tree.node_count)
+        ]
+        arrays.add_tree(nodes, int(tree.max_depth))
+    return len(model.estimators_)
+
+
+def _fold_scaler(threshold, strict, float32_input, feature, mean, scale) -> np.ndarray:
+    """
+    Float32 thresholds in raw feature space: for every float32 raw value x,
+    "x <= raw" holds exactly when the node's original comparison on the
+    scaled value holds. Starts from the algebraic fold and moves by single
+    float32 ulps where rounding puts it on the wrong side, which matters
+    because split points often sit exactly on observed (integer) values.
+    """
+    mean, scale = mean[feature], scale[feature]
+
+    def goes_left(raw):
+        scaled = (raw.astype(np.float64) - mean) / scale
+        scaled32 = scaled.astype(np.float32).astype(np.float64)
+        return np.where(
+            float32_input,
+            np.where(strict, scaled32 < threshold, scaled32 <= threshold),
+            scaled <= threshold,
+        )
+
+    raw = (threshold * scale + mean).astype(np.float32)
+    for _ in range(64):
+        too_high = ~goes_left(raw)
+        too_low = goes_left(np.nextafter(raw, np.float32(np.inf)))
+        if not (too_high.any() or too_low.any()):
+            break
+        raw = np.where(too_high, np.nextafter(raw, np.float32(-np.inf)), raw)
+        raw = np.where(too_low & ~too_high, np.nextafter(raw, np.float32(np.inf)), raw)
+    return raw
+
+
+def source_fingerprint(model_dir: str) -> str | None:
+    """SHA-256 over the contents of SOURCE_ARTIFACTS in model_dir; None when any of them is missing"""
+    digest = hashlib.sha256()
+    for name in SOURCE_ARTIFACTS:
+        path = os.path.join(model_dir, name)
+        if not os.path.exists(path):
+            return None
+        digest.update(name.encode())
+        with open(path, "rb") as handle:
+            for block in iter(lambda: handle.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def export_ensemble(model_dir: str, output_path: str | None = None) -> str:
+    """Compiles the pickled ensemble in model_dir into a single .npz file"""
+    xgb_model = joblib.load(os.path.join(model_dir, "model_xgboost.pkl"))
+    lgb_model = joblib.load(os.path.join(model_dir, "model_lightgbm.pkl"))
+    rf_model = joblib.load(os.path.join(model_dir, "model_rf.pkl"))
+    scaler = joblib.load(os.path.join(model_dir, "scaler.pkl"))
+    feature_columns = joblib.load(os.path.join(model_dir, "feature_columns.pkl"))
+    ensemble_config = joblib.load(os.path.join(model_dir, "ensemble_config.pkl"))
+
+    # Trees are stored model by model; depth is tracked per model so shallow
+    # models stop traversing early.
+    arrays = _NodeArrays()
+    model_depths = []
+    n_xgb, xgb_base_margin = _export_xgboost(xgb_model, arrays)
+    model_depths.append(arrays.depth)
+    arrays.depth = 0
+    n_lgb = _export_lightgbm(lgb_model, arrays)
+    model_depths.append(arrays.depth)
+    arrays.depth = 0
+    n_rf = _export_random_forest(rf_model, arrays)
+    model_depths.append(arrays.depth)
+
+    output_path = output_path or os.path.join(model_dir, NATIVE_MODEL_FILE)
+    columns = arrays.columns
+    feature = np.asarray(columns["feature"], dtype=np.int32)
+    threshold = np.asarray(columns["threshold"], dtype=np.float64)
+    np.savez(
+        output_path,
+        feature=feature,
+        threshold=threshold,
+        raw_threshold=_fold_scaler(
+            threshold,
+            np.asarray(columns["strict"], dtype=bool),
+            np.asarray(columns["float32_input"], dtype=bool),
+            feature,
+            scaler.mean_,
+            scaler.scale_,
+        ),
+        left=np.asarray(columns["left"], dtype=np.int32),
+        right=np.asarray(columns["right"], dtype=np.int32),
+        value=np.asarray(columns["value"], dtype=np.float64),
+        strict=np.asarray(columns["strict"], dtype=bool),
+        float32_input=np.asarray(columns["float32_input"], dtype=bool),
+        missing=np.asarray(columns["missing"], dtype=np.int8),
+        default_left=np.asarray(columns["default_left"], dtype=bool),
+        roots=np.asarray(arrays.roots, dtype=np.int32),
+        tree_counts=np.asarray([n_xgb, n_lgb, n_rf], dtype=np.int32),
+        model_depths=np.asarray(model_depths, dtype=np.int32),
+        xgb_base_margin=np.float64(xgb_base_margin),
+        weights=np.asarray([ensemble_config["xgb_weight"], ensemble_config["lgb_weight"], ensemble_config["rf_weight"]]),
+        scaler_mean=np.asarray(scaler.mean_, dtype=np.float64),
+        scaler_scale=np.asarray(scaler.scale_, dtype=np.float64),
+        feature_columns=np.asarray(feature_columns),
+        hash_scheme=np.asarray(ensemble_config.get("hash_scheme", "")),
+        source_fingerprint=np.asarray(source_fingerprint(model_dir)),
+    )
+    logger.info(f"Exported {n_xgb} XGBoost, {n_lgb} LightGBM and {n_rf} RandomForest trees ({len(arrays):,} nodes) to {output_path}")
+    return output_path
+
+
+class TreeEnsemble:
+    """Vectorized evaluation of an exported ensemble over raw (unscaled) feature rows"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        for name in ("feature", "threshold", "left", "right", "value", "strict", "float32_input", "missing", "default_left", "roots", "scaler_mean", "scaler_scale", "weights"):
+            setattr(self, name, arrays[name])
+        self.tree_counts = [int(count) for count in arrays["tree_counts"]]
+        self.model_depths = [int(depth) for depth in arrays["model_depths"]]
+        self.xgb_base_margin = float(arrays["xgb_base_margin"])
+        self.feature_columns = [str(column) for column in arrays["feature_columns"]]
+        self.ensemble_config = dict(zip(("xgb_weight", "lgb_weight", "rf_weight"), (float(w) for w in self.weights)))
+        # Empty, or absent from older exports, when the pickles did not record a scheme
+        hash_scheme = str(arrays["hash_scheme"]) if "hash_scheme" in arrays else ""
+        if hash_scheme:
+            self.ensemble_config["hash_scheme"] = hash_scheme
+        # Absent from exports made before fingerprints were recorded
+        self.source_fingerprint = str(arrays["source_fingerprint"]) if "source_fingerprint" in arrays else None
+        self._has_zero_modes = bool(np.any(self.missing == MISSING_ZERO_IS_DEFAULT))
+
+        # Derived arrays for the fast path. Inputs are laid out as [x64 | x32] per row,
+        # so one gather picks the precision a node compares in; "x < t" is rewritten
+        # as "x <= nextafter(t, -inf)" so every node uses the same comparison; and
+        # both children sit in one array indexed by 2 * node + go_right.
+        n_features = len(self.scaler_mean)
+        self._input_index = (self.feature + n_features * self.float32_input).astype(np.int64)
+        self._threshold_le = np.where(self.strict, np.nextafter(self.threshold, -np.inf), self.threshold)
+        self._children = np.stack([self.left, self.right], axis=1).ravel().astype(np.int64)
+        self._roots64 = self.roots.astype(np.int64)
+
+        # Float32 path: raw-space thresholds (files exported before it existed are folded here)
+        raw_threshold = arrays.get("raw_threshold")
+        if raw_threshold is None:
+            raw_threshold = _fold_scaler(self.threshold, self.strict, self.float32_input, self.feature, self.scaler_mean, self.scaler_scale)
+        self._raw_threshold32 = raw_threshold.astype(np.float32)
+        self._feature64 = self.feature.astype(np.int64)
+        self._value32 = self.value.astype(np.float32)
+
+    @classmethod
+    def load(cls, path: str) -> "TreeEnsemble":
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def _leaf_values(self, scaled: np.ndarray) -> np.ndarray:
+        if self._has_zero_modes or np.isnan(scaled).any():
+            return self._leaf_values_with_missing(scaled)
+        # Row chunks keep the per-step temporaries cache-sized.
+        return np.vstack([
+            self._leaf_values_chunk(scaled[start:start + TRAVERSAL_CHUNK_ROWS])
+            for start in range(0, scaled.shape[0], TRAVERSAL_CHUNK_ROWS)
+        ])
+
+    def _model_slices(self):
+        start = 0
+        for count, depth in zip(self.tree_counts, self.model_depths):
+            yield slice(start, start + count), depth
+            start += count
+
+    def _leaf_values_chunk(self, scaled: np.ndarray) -> np.ndarray:
+        n_rows, n_features = scaled.shape
+        inputs = np.concatenate([scaled, scaled.astype(np.float32).astype(np.float64)], axis=1).ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * 2 * n_features)[:, None]
+        leaves = np.empty((n_rows, len(self.roots)))
+        for trees, depth in self._model_slices():
+            nodes = np.broadcast_to(self._roots64[trees], (n_rows, trees.stop - trees.start)).copy()
+            for _ in range(depth):
+                x = inputs.take(row_offsets + self._input_index.take(nodes))
+                nodes = self._children.take(2 * nodes + (x > self._threshold_le.take(nodes)))
+            leaves[:, trees] = self.value.take(nodes)
+        return leaves
+
+    def _leaf_values_float32(self, features: np.ndarray) -> np.ndarray:
+        return np.vstack([
+            self._leaf_values_float32_chunk(features[start:start + TRAVERSAL_CHUNK_ROWS])
+            for start in range(0, features.shape[0], TRAVERSAL_CHUNK_ROWS)
+        ])
+
+    def _leaf_values_float32_chunk(self, features: np.ndarray) -> np.ndarray:
+        n_rows, n_features = features.shape
+        inputs = features.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        leaves = np.empty((n_rows, len(self.roots)), dtype=np.float32)
+        for trees, depth in self._model_slices():
+            nodes = np.broadcast_to(self._roots64[trees], (n_rows, trees.stop - trees.start)).copy()
+            for _ in range(depth):
+                x = inputs.take(row_offsets + self._feature64.take(nodes))
+                nodes = self._children.take(2 * nodes + (x > self._raw_threshold32.take(nodes)))
+            leaves[:, trees] = self._value32.take(nodes)
+        return leaves
+
+    def _leaf_values_with_missing(self, scaled: np.ndarray) -> np.ndarray:
+        n_rows = scaled.shape[0]
+        scaled32 = scaled.astype(np.float32).astype(np.float64)
+        rows = np.arange(n_rows)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+
+        for _ in range(max(self.model_depths)):
+            features = self.feature[nodes]
+            x = np.where(self.float32_input[nodes], scaled32[rows, features], scaled[rows, features])
+            mode = self.missing[nodes]
+            missing = np.isnan(x)
+            x = np.where(missing & (mode == MISSING_AS_ZERO), 0.0, x)
+            missing = np.where(
+                mode == MISSING_ZERO_IS_DEFAULT,
+                missing | (np.abs(x) <= _LGB_ZERO_THRESHOLD),
+                missing & (mode != MISSING_AS_ZERO),
+            )
+            go_left = np.where(missing, self.default_left[nodes], x <= self._threshold_le[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes]
+
+    def predict_proba(self, features: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Per-model and ensemble fraud probabilities for an (N, n_features) matrix.
+        float32 input takes the reduced-precision path (folded scaler, float32 sums).
+        """
+        features = np.asarray(features)
+        if features.dtype == np.float32 and not (self._has_zero_modes or np.isnan(features).any()):
+            return self._combine(self._leaf_values_float32(np.ascontiguousarray(features)), np.float32)
+        scaled = (features.astype(np.float64) - self.scaler_mean) / self.scaler_scale
+        return self._combine(self._leaf_values(scaled), np.float64)
+
+    def _combine(self, leaves: np.ndarray, dtype) -> Dict[str, np.ndarray]:
+        n_xgb, n_lgb, n_rf = self.tree_counts
+
+        # XGBoost accumulates tree by tree in float32 (cumsum keeps that order) and applies the sigmoid in float32.
+        xgb_terms = np.empty((leaves.shape[0], n_xgb + 1), dtype=np.float32)
+        xgb_terms[:, 0] = self.xgb_base_margin
+        xgb_terms[:, 1:] = leaves[:, :n_xgb]
+        xgb_margin = np.cumsum(xgb_terms, axis=1, dtype=np.float32)[:, -1]
+        xgb_proba = (np.float32(1) / (np.float32(1) + np.exp(-xgb_margin))).astype(dtype)
+        lgb_proba = dtype(1) / (dtype(1) + np.exp(-leaves[:, n_xgb:n_xgb + n_lgb].sum(axis=1, dtype=dtype)))
+        rf_proba = leaves[:, n_xgb + n_lgb:].sum(axis=1, dtype=dtype) / dtype(n_rf)
+
+        weights = self.ensemble_config
+        ensemble = (
+            dtype(weights["xgb_weight"]) * xgb_proba
+            + dtype(weights["lgb_weight"]) * lgb_proba
+            + dtype(weights["rf_weight"]) * rf_proba
+        )
+        return {"xgb": xgb_proba, "lgb": lgb_proba, "rf": rf_proba, "ensemble": ensemble}
+
+
+def verify_export(model_dir: str, path: str, n_samples: int = 5000, tolerance: float = 1e-6) -> float:
+    """Compares the exported engine with the original models on random inputs; returns the max abs error"""
+    scaler = joblib.load(os.path.join(model_dir, "scaler.pkl"))
+    engine = TreeEnsemble.load(path)
+    rng = np.random.default_rng(0)
+    raw = scaler.mean_ + rng.standard_normal((n_samples, len(scaler.mean_))) * scaler.scale_ * 2
+    scaled = (raw - scaler.mean_) / scaler.scale_
+    native = engine.predict_proba(raw)
+
+    max_error = 0.0
+    for name, filename in (("xgb", "model_xgboost.pkl"), ("lgb", "model_lightgbm.pkl"), ("rf", "model_rf.pkl")):
+        reference = joblib.load(os.path.join(model_dir, filename)).predict_proba(scaled)[:, 1]
+        error = float(np.max(np.abs(reference - native[name])))
+        logger.info(f"{name}: max abs error {error:.3g}")
+        max_error = max(max_error, error)
+    if max_error > tolerance:
+        raise AssertionError(f"Native engine differs from the original models by {max_error:.3g}")
+    return max_error
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Compile the pickled ensemble into flat NumPy tree arrays")
+    parser.add_argument("--model-dir", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--output", help=f"Output file (default: <model-dir>/{NATIVE_MODEL_FILE})")
+    parser.add_argument("--skip-verify", action="store_true", help="Do not compare against the original models")
+    args = parser.parse_args(argv)
+
+    path = export_ensemble(args.model_dir, args.output)
+    if not args.skip_verify:
+        verify_export(args.model_dir, path)
+
+
+if __name__ == "__main__":
+    main()